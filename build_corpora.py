@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import argparse
+from datetime import datetime, timezone
+import glob
+import json
+import os
+import unicodedata
+
+import config
+import context
+import download_data
+import features
+import http_client
+import loglevel
+import planner
+
+try:
+    import suffix_array
+except ImportError:
+    # numpy is needed for the suffix array
+    suffix_array = None
+try:
+    import token_corpus
+except ImportError:
+    # numpy is needed for the token index
+    token_corpus = None
+
+# Builds the Europarl corpora of several languages at once. Every language
+# is downloaded, decompressed, normalized and indexed in its own process. A
+# manifest records the version of the remote file and the checksums of what
+# was built, so only languages whose source changed are built again.
+#
+# A language is built into files with .new in their names and they replace
+# the old corpus and indexes only when everything succeeded, so a failed
+# rebuild leaves the old corpus in place.
+#
+# Usage: ./build_corpora.py sv da de
+#        ./build_corpora.py --all
+
+logger = loglevel.get_logger(__name__)
+
+
+def load_manifest():
+    if not os.path.isfile(config.europarl_manifest):
+        return {}
+    with open(config.europarl_manifest, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    tmp_filename = config.europarl_manifest + ".tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_filename, config.europarl_manifest)
+
+
+def get_remote_version(url):
+    """Returns a dictionary with what identifies the remote file"""
+    response = http_client.request("HEAD", url)
+    response.raise_for_status()
+    return dict(
+        etag=response.headers.get("etag"),
+        last_modified=response.headers.get("last-modified"),
+        length=response.headers.get("content-length"),
+    )
+
+
+def normalize(txt_filename):
+    """Normalizes the corpus to NFC with Unix line endings and no trailing
+    whitespace. Lines are only split on \\n and a stray \\r inside a line
+    is replaced with a space, so lines are never added or removed and line
+    numbers stay the same as in Europarl"""
+    tmp_filename = txt_filename + ".tmp"
+    lines = 0
+    with open(txt_filename, 'r', encoding='utf-8', newline='\n') as f:
+        with open(tmp_filename, 'w', encoding='utf-8', newline='\n') as out:
+            for line in f:
+                line = line.rstrip().replace("\r", " ")
+                out.write(unicodedata.normalize("NFC", line) + "\n")
+                lines += 1
+    os.replace(tmp_filename, txt_filename)
+    return lines
+
+
+def new_filename(filename):
+    """Returns the name the file is built under before it replaces
+    filename"""
+    base, extension = os.path.splitext(filename)
+    return f"{base}.new{extension}"
+
+
+def index_filenames(txt_filename):
+    """Returns the filenames of all indexes of the corpus"""
+    filenames = [
+        features.table_filename(txt_filename),
+        planner.frequency_filename(txt_filename),
+    ]
+    if suffix_array is not None:
+        filenames += suffix_array.index_filenames(txt_filename).values()
+    if token_corpus is not None:
+        filenames += token_corpus.index_filenames(txt_filename).values()
+    return filenames
+
+
+def remove_new_files(filename, txt_filename):
+    """Removes what an earlier failed build left behind, including partial
+    downloads that download() would otherwise resume"""
+    leftovers = glob.glob(glob.escape(filename) + ".part*")
+    leftovers += [filename, txt_filename, txt_filename + ".tmp"]
+    leftovers += index_filenames(txt_filename)
+    for leftover in leftovers:
+        if os.path.isfile(leftover):
+            os.remove(leftover)
+
+
+def is_up_to_date(language, entry, remote):
+    return (
+        entry is not None and
+        entry.get("remote") == remote and
+        os.path.isfile(language.data_filename) and
+        os.path.getsize(language.data_filename) == entry.get("size")
+    )
+
+
+def build_language(language, force=False):
+    """Builds the corpus and indexes of one language. Runs in a worker
+    process. Returns the new manifest entry, the old one if nothing changed
+    or a dictionary with an error"""
+    try:
+        url = download_data.source_url(language)
+        entry = load_manifest().get(language.language_code)
+        remote = get_remote_version(url)
+        if not force and is_up_to_date(language, entry, remote):
+            print(f"{language.language} is up to date")
+            return entry
+        print(f"Building {language.language}")
+        filename = download_data.compressed_filename(language)
+        # Start over so a changed source is not mixed with an old download
+        new_compressed = new_filename(filename)
+        new_txt = new_filename(language.data_filename)
+        remove_new_files(new_compressed, new_txt)
+        published = download_data.download(url, new_compressed)
+        checksum = download_data.sha256_of(new_compressed)
+        expected = config.europarl_checksums.get(
+            language.language_code, published
+        )
+        if expected is not None and checksum != expected:
+            os.remove(new_compressed)
+            raise ValueError("The checksum of the download does not match")
+        download_data.decompress(new_compressed, new_txt)
+        lines = normalize(new_txt)
+        indexes = []
+        if features.np is not None:
+            features.build_table(new_txt)
+            indexes.append("features")
+        planner.build_frequencies(new_txt)
+        indexes.append("frequencies")
+        if config.europarl_suffix_array and suffix_array is not None:
+            suffix_array.build(new_txt)
+            indexes.append("suffix_array")
+        if config.europarl_token_index and token_corpus is not None:
+            token_corpus.build(new_txt)
+            indexes.append("token_index")
+        txt_sha256 = download_data.sha256_of(new_txt)
+        size = os.path.getsize(new_txt)
+        # The indexes record the size and mtime of the corpus, which
+        # os.replace keeps. Indexes that were not built this time are removed
+        # so they are not used with the new corpus.
+        for new_index, index in zip(
+                index_filenames(new_txt),
+                index_filenames(language.data_filename)
+        ):
+            if os.path.isfile(new_index):
+                os.replace(new_index, index)
+            elif os.path.isfile(index):
+                os.remove(index)
+        os.replace(new_txt, language.data_filename)
+        os.replace(new_compressed, filename)
+        return dict(
+            url=url,
+            remote=remote,
+            sha256=checksum,
+            txt_sha256=txt_sha256,
+            size=size,
+            lines=lines,
+            indexes=indexes,
+            built=datetime.now(timezone.utc).isoformat(),
+        )
+    except Exception as error:
+        # Exceptions from httpx cannot be pickled back to the main process
+        logger.exception(error)
+        return dict(error=str(error))
+
+
+def build(language_codes, force=False):
+    """Builds the languages in parallel and updates the manifest with the
+    ones that succeeded. Returns the language codes that failed"""
+    results = context.map_languages(build_language, language_codes, force)
+    manifest = load_manifest()
+    failed = []
+    for language_code, entry in results.items():
+        if "error" in entry:
+            print(f"Error. Building {language_code} failed: {entry['error']}")
+            failed.append(language_code)
+        else:
+            manifest[language_code] = entry
+    save_manifest(manifest)
+    print(f"Built {len(language_codes) - len(failed)} of " +
+          f"{len(language_codes)} languages")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download and index Europarl corpora in parallel"
+    )
+    parser.add_argument("language_codes", nargs="*", help="E.g. sv da de")
+    parser.add_argument("--all", action="store_true",
+                        help="Build every Europarl language")
+    parser.add_argument("--force", action="store_true",
+                        help="Build even if the source did not change")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    if args.all:
+        language_codes = list(context.europarl_languages)
+    else:
+        language_codes = args.language_codes
+    if len(language_codes) == 0:
+        parser.error("Give at least one language code or --all")
+    for language_code in language_codes:
+        if language_code not in context.europarl_languages:
+            parser.error(f"Unsupported language code: {language_code}")
+    if build(language_codes, force=args.force):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
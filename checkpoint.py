@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+from datetime import datetime
+
+import config
+import edit_batch
+import loglevel
+from records import Candidate, Form, Sense
+
+# Checkpoints of the interactive session so an interrupted run can resume at
+# the exact form it stopped at without asking WDQS or the sources again.
+# Saved per language:
+#   the forms from WDQS and the shuffled order of the lexemes
+#   the position of the next lexeme, updated after every lexeme
+#   the candidates and senses of the lexeme being worked on
+#   the forms of that lexeme that are finished, updated after every form
+#   the approved usage examples that are queued but not uploaded yet, see
+#   edit_batch. They are queued again when the session is resumed.
+#
+# The entity of the lexeme is not saved. It may have been edited since, e.g.
+# by the upload just before the interruption, so it is fetched again through
+# entity_cache which checks the lastrevid.
+
+logger = loglevel.get_logger(__name__)
+
+schema = """
+CREATE TABLE IF NOT EXISTS sessions (
+    language TEXT PRIMARY KEY,
+    created TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    lids TEXT NOT NULL,
+    forms TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lexemes (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    json TEXT NOT NULL,
+    PRIMARY KEY (language, lid)
+);
+CREATE TABLE IF NOT EXISTS finished_forms (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    form_id TEXT NOT NULL,
+    PRIMARY KEY (language, form_id)
+);
+CREATE TABLE IF NOT EXISTS pending_edits (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    json TEXT NOT NULL,
+    PRIMARY KEY (language, lid)
+);
+"""
+
+# Opened on first use
+connection = None
+
+
+def get_connection():
+    global connection
+    if connection is None:
+        connection = sqlite3.connect(config.session_database)
+        connection.executescript(schema)
+    return connection
+
+
+def save_session(context, forms, lids):
+    """Starts a new session and forgets the previous one"""
+    connection = get_connection()
+    clear(context)
+    connection.execute(
+        "INSERT INTO sessions VALUES (?, ?, 0, ?, ?)", (
+            context.language_code,
+            datetime.now().isoformat(),
+            json.dumps(lids),
+            json.dumps([list(data) for data in forms], ensure_ascii=False),
+        )
+    )
+    connection.commit()
+
+
+def load_session(context):
+    """Returns a tuple with the forms, the order of the lexemes and the
+    position of the next lexeme or None if there is no session to resume"""
+    row = get_connection().execute(
+        "SELECT forms, lids, position, created FROM sessions "
+        "WHERE language = ?", (context.language_code,)
+    ).fetchone()
+    if row is None:
+        return None
+    forms = [Form(*values) for values in json.loads(row[0])]
+    lids = json.loads(row[1])
+    if row[2] >= len(lids):
+        return None
+    logger.info("Found session from %s at %d of %d", row[3], row[2],
+                len(lids))
+    return forms, lids, row[2]
+
+
+def set_position(context, position):
+    connection = get_connection()
+    connection.execute(
+        "UPDATE sessions SET position = ? WHERE language = ?",
+        (position, context.language_code)
+    )
+    connection.commit()
+
+
+def serialize_lexeme(context, lid, records):
+    """Returns what is needed to present the candidates of the lexeme again
+    as JSON"""
+    senses = context.senses_cache.get(lid)
+    data = dict(
+        records={
+            form_id: {
+                sentence: list(candidate)
+                for sentence, candidate in records[form_id].items()
+            }
+            for form_id in records
+        },
+        senses=None if senses is None else {
+            number: list(sense) for number, sense in senses.items()
+        },
+    )
+    return json.dumps(data, ensure_ascii=False)
+
+
+def restore_lexeme(context, lid, text):
+    """Returns the candidates by form_id from serialize_lexeme(). The senses
+    are put back in the cache of the context"""
+    data = json.loads(text)
+    if data["senses"] is not None:
+        # JSON object keys are always strings
+        context.senses_cache[lid] = {
+            int(number): Sense(*values)
+            for number, values in data["senses"].items()
+        }
+    return {
+        form_id: {
+            sentence: Candidate(*values)
+            for sentence, values in data["records"][form_id].items()
+        }
+        for form_id in data["records"]
+    }
+
+
+def save_lexeme(context, lid, records):
+    """Saves the candidates of the lexeme. Only the lexeme being worked on is
+    kept."""
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM lexemes WHERE language = ?", (context.language_code,)
+    )
+    connection.execute(
+        "DELETE FROM finished_forms WHERE language = ?",
+        (context.language_code,)
+    )
+    connection.execute(
+        "INSERT INTO lexemes VALUES (?, ?, ?)",
+        (context.language_code, lid, serialize_lexeme(context, lid, records))
+    )
+    connection.commit()
+
+
+def load_lexeme(context, lid):
+    """Returns the saved candidates by form_id or None"""
+    row = get_connection().execute(
+        "SELECT json FROM lexemes WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    ).fetchone()
+    if row is None:
+        return None
+    print(f"Resuming {lid} with the candidates found earlier")
+    return restore_lexeme(context, lid, row[0])
+
+
+def finish_form(context, lid, form_id):
+    """Call this when the reviewer is done with the form"""
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR IGNORE INTO finished_forms VALUES (?, ?, ?)",
+        (context.language_code, lid, form_id)
+    )
+    connection.commit()
+
+
+def finished_forms(context, lid):
+    """Returns the set of form_ids of the lexeme that are finished"""
+    return set(row[0] for row in get_connection().execute(
+        "SELECT form_id FROM finished_forms WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    ))
+
+
+def save_pending_edits(context, lid):
+    """Saves the queued usage examples of the lexeme. Call this whenever
+    its queue changes"""
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM pending_edits WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
+    batch = context.pending_edits.get(lid)
+    if batch is not None:
+        connection.execute(
+            "INSERT INTO pending_edits VALUES (?, ?, ?)", (
+                context.language_code, lid, json.dumps(dict(
+                    claims=[
+                        claim.get_json_representation()
+                        for claim in batch["claims"]
+                    ],
+                    forms=[
+                        None if data is None else list(data)
+                        for data in batch["forms"]
+                    ],
+                ), ensure_ascii=False)
+            )
+        )
+    connection.commit()
+
+
+def restore_pending_edits(context):
+    """Queues the saved usage examples again. Returns their number"""
+    # Imported here because WikibaseIntegrator loads pandas which makes the
+    # start slow
+    from wikibaseintegrator import wbi_core
+    count = 0
+    for lid, text in get_connection().execute(
+            "SELECT lid, json FROM pending_edits WHERE language = ?",
+            (context.language_code,)
+    ).fetchall():
+        data = json.loads(text)
+        for claim, form in zip(data["claims"], data["forms"]):
+            edit_batch.add(
+                context, lid, wbi_core.MonolingualText.from_json(claim),
+                None if form is None else Form(*form)
+            )
+            count += 1
+    return count
+
+
+def forget_lexeme(context, lid):
+    """Drops the saved candidates of the lexeme, e.g. after it changed"""
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM lexemes WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
+    connection.commit()
+
+
+def clear(context):
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM sessions WHERE language = ?", (context.language_code,)
+    )
+    connection.execute(
+        "DELETE FROM lexemes WHERE language = ?", (context.language_code,)
+    )
+    connection.execute(
+        "DELETE FROM finished_forms WHERE language = ?",
+        (context.language_code,)
+    )
+    connection.execute(
+        "DELETE FROM pending_edits WHERE language = ?",
+        (context.language_code,)
+    )
+    connection.commit()
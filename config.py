@@ -9,13 +9,141 @@ password = os.environ['LEXUSE_PASSWORD']
 sparql_results_size = 1000
 sparql_offset = 1000
 riksdagen_max_results_size = 500  # keep to multiples of 20
+# Download the full text of matched Riksdagen documents to a local store and
+# mine sentences from it instead of only from the short summaries
+riksdagen_full_text = False
+riksdagen_full_text_connections = 10
+riksdagen_document_store = "riksdagen_documents"
 language = "swedish"
 language_code = "sv"
 language_qid = "Q9027"
 min_word_count = 5
 max_word_count = 15
+# Only use sentences that start with an upper case letter and end with a
+# full stop, exclamation mark or question mark
+require_quality_sentences = True
 show_sense_urls = True
 exclude_list = "exclude_list.json"
+# Where lexemes, forms and senses are looked up. "wdqs" for the Wikidata
+# Query Service or "dump" for a local database imported with lexeme_dump.py
+query_backend = "wdqs"
+lexeme_dump_database = "lexemes.sqlite"
+# Fetch lexemes in batches with wbgetentities to get senses and to skip
+# sentences that are already usage examples. Set the database to None to only
+# cache in memory.
+entity_cache = True
+entity_cache_database = "entity_cache.sqlite"
+# Sentence sources to query concurrently and how long to wait for each of them
+# in seconds. The records are shown when all of them have answered or timed
+# out, and the local searches stop when their time is up.
+sources = ["europarl", "riksdagen", "ksamsok"]
+source_timeouts = {"europarl": 300, "riksdagen": 120, "ksamsok": 60}
+# K-samsök is searched in a local store harvested with ksamsok.py. It is only
+# used when the store exists.
+ksamsok_oai_url = "https://kulturarvsdata.se/ksamsok/oaipmh"
+ksamsok_metadata_prefix = "ksamsok-rdf"
+ksamsok_database = "ksamsok.sqlite"
+# Maximum number of records to look at per form
+ksamsok_max_results = 200
+# Cache the records of every word so lexemes that share a form get them
+# without searching again. The newest retrieval_cache_size words are kept in
+# memory. Set the database to None to only cache in memory.
+retrieval_cache = True
+retrieval_cache_size = 10000
+retrieval_cache_database = "retrieval_cache.sqlite"
+# Decide which sources to ask and how many Riksdagen pages to download from
+# the word frequencies of the corpus and the statistics of earlier runs.
+# Riksdagen is skipped for forms where Europarl is expected to give
+# planner_target_candidates accepted sentences. The Riksdagen pages are
+# limited to what is expected to download in planner_max_seconds, and
+# Riksdagen is skipped if not even one page fits while Europarl is expected
+# to give an accepted sentence.
+planner = True
+planner_target_candidates = 3
+planner_max_seconds = 20
+planner_stats = "planner_stats.sqlite"
+# "thread" or "process". Where CPU bound sources like Europarl run
+source_executor = "thread"
+# Europarl sentence files
+europarl_data_url = (
+    "https://github.com/egils-consulting/LexUse-data/raw/master/"
+)
+# Number of parallel ranged segments to download if the server supports it
+download_segments = 4
+# sha256 checksums of the compressed files by language code. The data is
+# only marked as ready if the checksum matches
+europarl_checksums = {}
+# Versions and checksums of the corpora built with build_corpora.py
+europarl_manifest = "europarl_manifest.json"
+# Find Europarl lines with a suffix array built with suffix_array.py instead
+# of scanning the corpus. Matching is case insensitive and boundary aware so
+# sentence initial forms and forms next to punctuation are found too.
+europarl_suffix_array = False
+# Find Europarl lines in the token ids built with token_corpus.py instead of
+# scanning the corpus. Matching is case sensitive like the scan but forms
+# first or last in the line are found too. Tried before the suffix array.
+europarl_token_index = False
+
+# Keep a snapshot of the eligible forms and only update the lexemes changed
+# since the last run with the recent changes API instead of fetching all
+# forms every run
+incremental = False
+snapshot_database = "snapshot.sqlite"
+# Used for the recent changes and the changed lexemes in incremental mode
+mediawiki_api_url = "https://www.wikidata.org/w/api.php"
+# Days. Wikidata keeps 30 days of recent changes so older snapshots are
+# fetched again in full
+recent_changes_max_age = 25
+
+# Path of the sqlite database shared by several reviewers working on the
+# same language, e.g. on a shared volume. None disables the coordination.
+coordination_database = None
+# Seconds a reviewer keeps a lexeme without answering before another
+# reviewer may take it
+coordination_lease = 1800
+# Identifies this reviewer in the shared database. None uses the username and
+# the hostname. Give every session its own id if several run on the same
+# host with the same account.
+coordination_reviewer = None
+
+# Save the progress of the session so an interrupted run can resume at the
+# same lexeme with its candidates without network calls
+checkpoint = True
+session_database = "session.sqlite"
+# Order the candidates with a logistic regression model trained on the
+# yes/no answers instead of by length. Every answer is logged.
+ranker = True
+ranker_database = "decisions.sqlite"
+ranker_learning_rate = 0.1
+ranker_l2 = 0.001
+# Unix socket of the daemon started with daemon.py. swedish.py uses the daemon
+# if it is running. Set to None to never use it.
+daemon_socket = "lexuse.sock"
+# How usage examples are uploaded. "direct" posts only the new statement
+# with wbeditentity and detects edit conflicts with the last revision in the
+# entity cache. "wbi" loads the whole lexeme with WikibaseIntegrator first.
+claim_upload = "direct"
+
+# Approved usage examples of a lexeme are uploaded in one edit when this
+# many are queued, when the first has waited edit_batch_timeout seconds or
+# when the lexeme is done. 1 uploads every example right away.
+edit_batch_size = 5
+edit_batch_timeout = 300
+
+# HTTP
+user_agent = "LexUse (https://www.wikidata.org/wiki/Wikidata:LexUse)"
+http_timeout = 60
+http_retries = 3
+# Seconds to wait after a 429 or 503 without a Retry-After header
+http_retry_delay = 5
+# Requests per second and burst size per host
+http_rate_limits = {
+    "query.wikidata.org": (2, 5),
+    "data.riksdagen.se": (10, 20),
+    "www.wikidata.org": (5, 5),
+}
+# SPARQL queries longer than this are sent with POST
+sparql_post_threshold = 2000
 
 # Debug settings
 debug = False
@@ -25,8 +153,8 @@ debug_exclude_list = False
 debug_json = False
 debug_riksdagen = False
 debug_senses = False
-debug_sentences = True
-debug_summaries = True
+debug_sentences = False
+debug_summaries = False
 
 # Global variables
 login_instance = None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+# Everything that depends on the language being mined lives in a
+# LanguageContext that is passed explicitly through util, europarl, sources
+# and download_data. Several contexts can be used side by side, e.g. one per
+# worker in a process pool, without sharing caches or files.
+
+# Languages of the Europarl corpus with their Wikidata QIDs
+europarl_languages = {
+    "bg": ("bulgarian", "Q7918"),
+    "cs": ("czech", "Q9056"),
+    "da": ("danish", "Q9035"),
+    "de": ("german", "Q188"),
+    "el": ("greek", "Q9129"),
+    "en": ("english", "Q1860"),
+    "es": ("spanish", "Q1321"),
+    "et": ("estonian", "Q9072"),
+    "fi": ("finnish", "Q1412"),
+    "fr": ("french", "Q150"),
+    "hu": ("hungarian", "Q9067"),
+    "it": ("italian", "Q652"),
+    "lt": ("lithuanian", "Q9083"),
+    "lv": ("latvian", "Q9078"),
+    "nl": ("dutch", "Q7411"),
+    "pl": ("polish", "Q809"),
+    "pt": ("portuguese", "Q5146"),
+    "ro": ("romanian", "Q7913"),
+    "sk": ("slovak", "Q9058"),
+    "sl": ("slovene", "Q9063"),
+    "sv": ("swedish", "Q9027"),
+}
+
+
+class LanguageContext:
+    """Runtime state of one language"""
+    def __init__(self, language, language_code, language_qid):
+        self.language = language
+        self.language_code = language_code
+        self.language_qid = language_qid
+        self.login_instance = None
+        # Senses are fetched once per lexeme
+        self.senses_cache = {}
+        # Lexeme entities, see entity_cache
+        self.entity_cache = {}
+        # Approved usage examples waiting to be uploaded, see edit_batch
+        self.pending_edits = {}
+        # daemon.Client when attached to a running daemon
+        self.daemon = None
+
+    def __repr__(self):
+        return f"LanguageContext({self.language_code})"
+
+    def __getstate__(self):
+        # The login session and the caches stay in the process that made
+        # them
+        state = self.__dict__.copy()
+        state["login_instance"] = None
+        state["senses_cache"] = {}
+        state["entity_cache"] = {}
+        state["daemon"] = None
+        state["pending_edits"] = {}
+        return state
+
+    @property
+    def data_filename(self):
+        """The Europarl sentence file"""
+        return f"data_{self.language_code}.txt"
+
+    @property
+    def exclude_list(self):
+        """Each language has its own exclude list so processes don't write
+        to the same file"""
+        if self.language_code == config.language_code:
+            return config.exclude_list
+        return config.exclude_list.replace(
+            ".json", f"_{self.language_code}.json"
+        )
+
+
+def from_config():
+    """Returns the context of the language set in config"""
+    return LanguageContext(
+        config.language, config.language_code, config.language_qid
+    )
+
+
+def for_language(language_code):
+    """Returns the context of a Europarl language"""
+    if language_code not in europarl_languages:
+        raise ValueError(f"Unsupported language code: {language_code}")
+    language, language_qid = europarl_languages[language_code]
+    return LanguageContext(language, language_code, language_qid)
+
+
+def map_languages(function, language_codes, *args):
+    """Calls function(context, *args) for every language in its own process
+    and returns a dictionary with language code as key and the result as
+    value"""
+    with ProcessPoolExecutor() as executor:
+        futures = {
+            language_code: executor.submit(
+                function, for_language(language_code), *args
+            )
+            for language_code in language_codes
+        }
+        return {
+            language_code: futures[language_code].result()
+            for language_code in futures
+        }
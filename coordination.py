@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import socket
+import sqlite3
+import threading
+import time
+
+import checkpoint
+import config
+import loglevel
+
+# Coordination of several reviewers working on the same SPARQL results. They
+# share one sqlite database, e.g. on a shared volume, which
+#   hands out leases on lexemes that expire if a reviewer stops answering
+#   records the lexemes that are done and the forms that got an example, so
+#     nobody uploads the same form twice or reviews it again
+#   shares the candidates found for a lexeme, so a lexeme whose lease expired
+#     is not searched again
+# Every reviewer still goes through the lexemes in its own random order and
+# skips those that are leased or done, so adding reviewers adds throughput.
+#
+# The database uses the default rollback journal because WAL does not work
+# on network file systems. Leases are taken in an immediate transaction so
+# two reviewers cannot get the same lexeme.
+
+logger = loglevel.get_logger(__name__)
+
+schema = """
+CREATE TABLE IF NOT EXISTS leases (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    reviewer TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (language, lid)
+);
+CREATE TABLE IF NOT EXISTS lexemes (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    reviewer TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (language, lid)
+);
+CREATE TABLE IF NOT EXISTS forms (
+    language TEXT NOT NULL,
+    form_id TEXT NOT NULL,
+    reviewer TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (language, form_id)
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    json TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (language, lid)
+);
+"""
+
+# Opened on first use in every thread
+local = threading.local()
+
+
+def reviewer():
+    """Identifies this reviewer in the leases. It stays the same when the
+    reviewer restarts, so a resumed session gets its own lexeme back"""
+    if config.coordination_reviewer is not None:
+        return config.coordination_reviewer
+    return f"{config.username}@{socket.gethostname()}"
+
+
+def enabled():
+    return config.coordination_database is not None
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        # Autocommit so the transactions below are explicit
+        local.connection = sqlite3.connect(
+            config.coordination_database, timeout=30, isolation_level=None
+        )
+        local.connection.executescript(schema)
+    return local.connection
+
+
+def acquire(context, lid):
+    """Returns True if this reviewer got the lease on the lexeme and False if
+    it is done or leased by another reviewer"""
+    connection = get_connection()
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        done = connection.execute(
+            "SELECT reviewer FROM lexemes WHERE language = ? AND lid = ?",
+            (context.language_code, lid)
+        ).fetchone()
+        lease = connection.execute(
+            "SELECT reviewer, expires FROM leases "
+            "WHERE language = ? AND lid = ?",
+            (context.language_code, lid)
+        ).fetchone()
+        if done is not None:
+            logger.info("%s was done by %s", lid, done[0])
+            return False
+        if lease is not None and lease[0] != reviewer() and lease[1] > now:
+            logger.info("%s is leased by %s", lid, lease[0])
+            return False
+        connection.execute(
+            "INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?)",
+            (context.language_code, lid, reviewer(),
+             now + config.coordination_lease)
+        )
+        return True
+    finally:
+        connection.execute("COMMIT")
+
+
+def renew(context, lid):
+    """Extends the lease while the reviewer is working on the lexeme"""
+    get_connection().execute(
+        "UPDATE leases SET expires = ? "
+        "WHERE language = ? AND lid = ? AND reviewer = ?",
+        (time.time() + config.coordination_lease, context.language_code, lid,
+         reviewer())
+    )
+
+
+def release(context, lid):
+    get_connection().execute(
+        "DELETE FROM leases WHERE language = ? AND lid = ? AND reviewer = ?",
+        (context.language_code, lid, reviewer())
+    )
+
+
+def complete(context, lid):
+    """Marks the lexeme as done and releases the lease"""
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute(
+        "INSERT OR REPLACE INTO lexemes VALUES (?, ?, ?, ?)",
+        (context.language_code, lid, reviewer(), time.time())
+    )
+    connection.execute(
+        "DELETE FROM candidates WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
+    connection.execute(
+        "DELETE FROM leases WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
+    connection.execute("COMMIT")
+
+
+def record_form(context, form_id):
+    """Records that the form got a usage example or should be skipped. Call
+    this only after the usage example was uploaded"""
+    get_connection().execute(
+        "INSERT OR IGNORE INTO forms VALUES (?, ?, ?, ?)",
+        (context.language_code, form_id, reviewer(), time.time())
+    )
+
+
+def is_form_done(context, form_id):
+    return get_connection().execute(
+        "SELECT 1 FROM forms WHERE language = ? AND form_id = ?",
+        (context.language_code, form_id)
+    ).fetchone() is not None
+
+
+def save_candidates(context, lid, records):
+    get_connection().execute(
+        "INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?)",
+        (context.language_code, lid,
+         checkpoint.serialize_lexeme(context, lid, records), time.time())
+    )
+
+
+def load_candidates(context, lid):
+    """Returns the candidates another reviewer found by form_id or None.
+    Only the candidates and senses are shared. The entity is fetched again
+    so its lastrevid is checked like for any other lexeme"""
+    row = get_connection().execute(
+        "SELECT json FROM candidates WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    ).fetchone()
+    if row is None:
+        return None
+    print(f"Using the candidates another reviewer found for {lid}")
+    return checkpoint.restore_lexeme(context, lid, row[0])
+
+
+def forget_candidates(context, lid):
+    """Drops the shared candidates of the lexeme, e.g. after it changed"""
+    get_connection().execute(
+        "DELETE FROM candidates WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import config
+import context
+import entity_cache
+import loglevel
+from records import Candidate, Form, Sense
+
+# A long running LexUse service that keeps the corpora, indexes, caches and
+# pooled HTTP connections of every language warm between runs. It answers
+# requests for lexeme forms, candidates and senses over a Unix socket with
+# one JSON object per line:
+#
+#   {"method": "candidates", "params": {"language_code": "sv", ...}}
+#   {"result": ...} or {"error": "..."}
+#
+# Start it with ./daemon.py. swedish.py attaches to it automatically when
+# config.daemon_socket exists and falls back to working on its own.
+
+logger = loglevel.get_logger(__name__)
+
+# Warm state of the daemon by language code
+contexts = {}
+locks = {}
+contexts_lock = threading.Lock()
+
+
+def get_context(language_code):
+    """Returns the context of the language and a lock that serializes the
+    requests for it"""
+    with contexts_lock:
+        if language_code not in contexts:
+            if language_code == config.language_code:
+                contexts[language_code] = context.from_config()
+            else:
+                contexts[language_code] = context.for_language(language_code)
+            locks[language_code] = threading.Lock()
+        return contexts[language_code], locks[language_code]
+
+
+def form_from_json(values):
+    return Form(*values)
+
+
+def handle_request(method, params):
+    """Returns the JSON result of a request"""
+    # Imported here so the client does not need to load the whole pipeline
+    import util
+    if method == "ping":
+        return "pong"
+    language, lock = get_context(params["language_code"])
+    with lock:
+        if method == "lexeme_forms":
+            try:
+                forms = util.fetch_lexeme_forms(language)
+            except SystemExit:
+                # No forms were found. The client tells the reviewer.
+                return []
+            return [list(data) for data in forms]
+        if method == "candidates":
+            forms = [form_from_json(values) for values in params["forms"]]
+            records = util.get_sentences_from_apis(language, forms)
+            return {
+                form_id: {
+                    sentence: list(candidate)
+                    for sentence, candidate in records[form_id].items()
+                }
+                for form_id in records
+            }
+        if method == "senses":
+            senses = util.get_senses(language, params["lid"])
+            return {number: list(sense) for number, sense in senses.items()}
+        if method == "prefetch":
+            entity_cache.prefetch(language, params["lids"])
+            return True
+        if method == "has_usage_example":
+            return entity_cache.has_usage_example(
+                language, params["lid"], params["sentence"]
+            )
+        if method == "invalidate":
+            entity_cache.invalidate(language, params["lid"])
+            language.senses_cache.pop(params["lid"], None)
+            return True
+    raise ValueError(f"Unknown method: {method}")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = dict(result=handle_request(
+                    request["method"], request.get("params", {})
+                ))
+            except Exception as error:
+                logger.exception(error)
+                response = dict(error=str(error))
+            except SystemExit as error:
+                # The pipeline calls exit() in some places. That must not
+                # end the thread of the client.
+                logger.error("A request called exit(%s)", error.code)
+                response = dict(error=f"The request exited with {error.code}")
+            self.wfile.write(
+                json.dumps(response, ensure_ascii=False).encode("utf-8") +
+                b"\n"
+            )
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=None):
+    if socket_path is None:
+        socket_path = config.daemon_socket
+    if os.path.exists(socket_path):
+        # Left over from a daemon that did not shut down cleanly
+        os.remove(socket_path)
+    with Server(socket_path, RequestHandler) as server:
+        print(f"LexUse daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopping the LexUse daemon")
+        finally:
+            os.remove(socket_path)
+
+
+class Client:
+    """Connection to a running daemon"""
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile("rwb")
+
+    def call(self, method, **params):
+        self.file.write(json.dumps(
+            dict(method=method, params=params), ensure_ascii=False
+        ).encode("utf-8") + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise RuntimeError(f"LexUse daemon: {response['error']}")
+        return response["result"]
+
+    def fetch_lexeme_forms(self, context):
+        return [
+            form_from_json(values) for values in self.call(
+                "lexeme_forms", language_code=context.language_code
+            )
+        ]
+
+    def get_records(self, context, forms):
+        records = self.call(
+            "candidates", language_code=context.language_code,
+            forms=[list(data) for data in forms]
+        )
+        return {
+            form_id: {
+                sentence: Candidate(*values)
+                for sentence, values in records[form_id].items()
+            }
+            for form_id in records
+        }
+
+    def get_senses(self, context, lid):
+        senses = self.call(
+            "senses", language_code=context.language_code, lid=lid
+        )
+        # JSON object keys are always strings
+        return {int(number): Sense(*values) for number, values in
+                senses.items()}
+
+    def prefetch(self, context, lids):
+        return self.call(
+            "prefetch", language_code=context.language_code, lids=lids
+        )
+
+    def has_usage_example(self, context, lid, sentence):
+        return self.call(
+            "has_usage_example", language_code=context.language_code,
+            lid=lid, sentence=sentence
+        )
+
+    def invalidate(self, context, lid):
+        return self.call(
+            "invalidate", language_code=context.language_code, lid=lid
+        )
+
+
+def connect(socket_path=None):
+    """Returns a Client or None if no daemon is running"""
+    if socket_path is None:
+        socket_path = config.daemon_socket
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    try:
+        client = Client(socket_path)
+        client.call("ping")
+    except OSError:
+        logger.warning("No daemon answered on %s", socket_path)
+        return None
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep LexUse running in the background"
+    )
+    parser.add_argument("--socket", help="Path of the Unix socket")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    if config.loglevel is None:
+        loglevel.set_loglevel()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import asyncio
+from datetime import datetime
+import hashlib
+import lzma
+import os.path
+import sqlite3
+import threading
+
+
+import config
+import http_client
+import loglevel
+
+# Content addressed store of full document texts. Each text is compressed
+# and saved once under its sha256 no matter how many document ids point to
+# it. An sqlite index maps document ids to hashes.
+#
+# riksdagen_documents/
+#   index.sqlite
+#   objects/ab/abcdef...xz
+
+logger = loglevel.get_logger(__name__)
+
+# Opened on first use in every thread, e.g. the request threads of the
+# daemon, because sqlite connections cannot be shared between threads
+local = threading.local()
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        os.makedirs(config.riksdagen_document_store, exist_ok=True)
+        local.connection = sqlite3.connect(
+            os.path.join(config.riksdagen_document_store, "index.sqlite")
+        )
+        local.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, "
+            "sha256 TEXT NOT NULL, "
+            "fetched TEXT NOT NULL)"
+        )
+    return local.connection
+
+
+def object_path(sha256):
+    return os.path.join(
+        config.riksdagen_document_store, "objects", sha256[:2], sha256 + ".xz"
+    )
+
+
+def has_text(document_id):
+    row = get_connection().execute(
+        "SELECT 1 FROM documents WHERE document_id = ?", (document_id,)
+    ).fetchone()
+    return row is not None
+
+
+def get_text(document_id):
+    """Returns the text of the document or None if it is not in the store"""
+    row = get_connection().execute(
+        "SELECT sha256 FROM documents WHERE document_id = ?", (document_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    with lzma.open(object_path(row[0]), 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def put_text(document_id, text):
+    """Saves the text. Identical texts are only stored once"""
+    sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    path = object_path(sha256)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a crash does not leave a
+        # truncated object behind. Threads that save the same text use their
+        # own temporary files.
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with lzma.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+        (document_id, sha256, datetime.now().isoformat())
+    )
+    connection.commit()
+
+
+def missing_texts(document_ids):
+    """Returns the sorted ids of the documents that are not in the store"""
+    return sorted(set(
+        document_id for document_id in document_ids
+        if not has_text(document_id)
+    ))
+
+
+async def fetch_texts(document_ids, baseurl):
+    """Downloads the full text of the documents that are not in the store
+    yet. The sqlite and lzma work runs in the default executor so it does not
+    block the event loop"""
+    loop = asyncio.get_running_loop()
+    missing = await loop.run_in_executor(None, missing_texts, document_ids)
+    if len(missing) == 0:
+        return
+    print(f"Downloading the full text of {len(missing)} documents...")
+    semaphore = asyncio.Semaphore(config.riksdagen_full_text_connections)
+
+    async def get(document_id):
+        async with semaphore:
+            response = await http_client.async_get(
+                f"{baseurl}{document_id}.text"
+            )
+        if response.status_code == 200:
+            await loop.run_in_executor(
+                None, put_text, document_id, response.text
+            )
+        else:
+            logger.info("Could not get the text of %s: %d",
+                        document_id, response.status_code)
+
+    await asyncio.gather(*[get(document_id) for document_id in missing])
@@ -1,53 +1,257 @@
 #!/usr/bin/env python3
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os.path
+import re
 import sys
 import lzma
-
-import requests
+import threading
 
 import config
+import http_client
+import loglevel
+
+# Language codes for which the data is downloaded, verified and decompressed
+# in this process. This avoids hitting the disk for every lexeme.
+data_ready = set()
+
+# A download is verified three ways:
+#   its size must match the Content-Length of the server
+#   its sha256 must match config.europarl_checksums or else the digest the
+#   server publishes in a Repr-Digest or Digest header, if there is one
+#   decompress() fails if the integrity check of the xz container fails
+
+chunk_size = 64 * 1024
+
+logger = loglevel.get_logger(__name__)
+
+
+class Progress:
+    """Thread safe progress bar shared by all download segments"""
+    def __init__(self, total_length, done=0):
+        self.total_length = total_length
+        self.dl = done
+        self.lock = threading.Lock()
+
+    def update(self, length):
+        with self.lock:
+            self.dl += length
+            if self.total_length:
+                done = int(50 * self.dl / self.total_length)
+                sys.stdout.write(
+                    "\r[%s%s]" % ('=' * done, ' ' * (50-done))
+                )
+                sys.stdout.flush()
+
+
+def published_sha256(headers):
+    """Returns the hex sha256 from a Repr-Digest (RFC 9530) or Digest
+    (RFC 3230) header or None"""
+    for name in ("repr-digest", "digest"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        match = re.search(
+            r"sha-256=:?([A-Za-z0-9+/=]+):?", value, re.IGNORECASE
+        )
+        if match is not None:
+            return base64.b64decode(match.group(1)).hex()
+    return None
+
+
+def get_remote_info(url):
+    """Returns a tuple with the content length (or None), whether the
+    server accepts range requests and the published sha256 (or None)"""
+    response = http_client.request("HEAD", url)
+    response.raise_for_status()
+    total_length = response.headers.get('content-length')
+    if total_length is not None:
+        total_length = int(total_length)
+    accepts_ranges = response.headers.get('accept-ranges') == "bytes"
+    return total_length, accepts_ranges, published_sha256(response.headers)
+
+
+def download_range(url, filename, start=0, end=None, progress=None):
+    """Downloads bytes start-end (inclusive) of url to filename. Resumes from
+    what is already in filename if the server supports HTTP Range"""
+    done = 0
+    if os.path.isfile(filename):
+        done = os.path.getsize(filename)
+    if end is not None and start + done > end:
+        # This segment is already complete
+        return
+    headers = {}
+    if start + done > 0 or end is not None:
+        headers["Range"] = f"bytes={start + done}-"
+        if end is not None:
+            headers["Range"] += str(end)
+    with http_client.stream("GET", url, headers=headers) as response:
+        if response.status_code == 416 and end is None:
+            # Nothing left to download if the file is already complete
+            content_range = response.headers.get("content-range", "")
+            if content_range == f"bytes */{start + done}":
+                return
+        response.raise_for_status()
+        if headers and response.status_code != 206:
+            if start > 0 or end is not None:
+                raise ValueError("The server does not support HTTP Range")
+            # The server ignored the range so we start over
+            done = 0
+        if progress is not None:
+            progress.update(done)
+        with open(filename, 'ab' if done > 0 else 'wb') as output_file:
+            for data in response.iter_bytes(chunk_size=chunk_size):
+                output_file.write(data)
+                if progress is not None:
+                    progress.update(len(data))
 
 
-def fetch():
+def download(url, filename):
+    """Downloads url to filename via a .part file that is kept if the
+    download is interrupted so the next run can resume it. Returns the
+    published sha256 or None"""
+    part_filename = filename + ".part"
+    total_length, accepts_ranges, sha256 = get_remote_info(url)
+    segments = config.download_segments
+    if (
+            total_length is None or not accepts_ranges or segments < 2
+            or os.path.isfile(part_filename)
+    ):
+        # Single stream, possibly resuming an earlier download
+        download_range(url, part_filename, progress=Progress(total_length))
+    else:
+        # Parallel ranged segments that are joined when all are done
+        progress = Progress(total_length)
+        segment_length = -(-total_length // segments)
+        ranges = []
+        for number in range(segments):
+            start = number * segment_length
+            end = min(start + segment_length, total_length) - 1
+            ranges.append((f"{part_filename}{number}", start, end))
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [
+                executor.submit(
+                    download_range, url, segment_filename, start, end,
+                    progress
+                )
+                for segment_filename, start, end in ranges
+            ]
+            for future in futures:
+                future.result()
+        with open(part_filename, 'wb') as output_file:
+            for segment_filename, start, end in ranges:
+                with open(segment_filename, 'rb') as segment_file:
+                    while True:
+                        data = segment_file.read(chunk_size)
+                        if not data:
+                            break
+                        output_file.write(data)
+        for segment_filename, start, end in ranges:
+            os.remove(segment_filename)
+    if (
+            total_length is not None and
+            os.path.getsize(part_filename) != total_length
+    ):
+        raise ValueError("Download incomplete. Run again to resume it.")
+    os.replace(part_filename, filename)
+    print('\nDownload Completed!!!')
+    return sha256
+
+
+def sha256_of(filename):
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+def verify(filename, checksum):
+    """Raises ValueError if the sha256 of the file does not match the
+    checksum"""
+    actual = sha256_of(filename)
+    if actual != checksum:
+        raise ValueError(
+            f"The sha256 of {filename} is {actual} but {checksum} was "
+            "expected"
+        )
+
+
+def decompress(filename, txt_filename):
+    """Decompresses to a temporary file first so an interrupted run does not
+    leave a truncated corpus behind"""
+    print("Decompressing file")
+    tmp_filename = txt_filename + ".tmp"
+    try:
+        # f is now the uncompressed object
+        with lzma.open(filename, 'rb') as f:
+            with open(tmp_filename, 'wb') as out:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    out.write(data)
+    except (lzma.LZMAError, EOFError):
+        os.remove(tmp_filename)
+        raise
+    os.replace(tmp_filename, txt_filename)
+
+
+def source_url(context):
     # for now we only support europarl data from
     # https://github.com/egils-consulting/LexUse-data
-    # download choosen language file
-    url = ("https://github.com/egils-consulting/LexUse-data/raw/master/" +
-           f"{config.language_code}.xz")
+    return config.europarl_data_url + f"{context.language_code}.xz"
+
+
+def compressed_filename(context):
     # inspired by http://stackoverflow.com/questions/15644964/ddg#15645088
     # this will take only -1 splitted part of the url
-    filename = "data_" + url.split('/')[-1]
-    txt_filename = filename.replace("xz", "txt")
+    return "data_" + source_url(context).split('/')[-1]
+
+
+def fetch(context):
+    """Downloads, verifies and decompresses the corpus unless that is already
+    done. Raises ValueError if that fails. It runs in the executor of the
+    sources, so it must not call exit()"""
+    if context.language_code in data_ready:
+        return
+    url = source_url(context)
+    filename = compressed_filename(context)
+    txt_filename = context.data_filename
     if os.path.isfile(txt_filename):
-        print(f"Data for {config.language} has already been downloaded.")
+        print(f"Data for {context.language} has already been downloaded.")
     else:
-        print(f"Downloading Europarl sentence file for {config.language}")
-        with open(filename, 'wb') as output_file:
-            response = requests.get(url, stream=True)
-            total_length = response.headers.get('content-length')
-            if total_length is None:
-                # no content length header
-                output_file.write(response.content)
-            else:
-                dl = 0
-                total_length = int(total_length)
-                for data in response.iter_content(chunk_size=4096):
-                    dl += len(data)
-                    output_file.write(data)
-                    done = int(50 * dl / total_length)
-                    sys.stdout.write(
-                        "\r[%s%s]" % ('=' * done, ' ' * (50-done))
-                    )
-                    sys.stdout.flush()
-
-        print('\nDownload Completed!!!')
-
-        if os.path.isfile(filename):
-            print("Decompressing file")
-            with lzma.open(filename, 'rb') as f:
-                # f is now the uncompressed object
-                # write it to
-                with open(txt_filename, 'wb') as out:
-                    out.write(f.read())
+        published = None
+        if not os.path.isfile(filename):
+            print("Downloading Europarl sentence file for " +
+                  f"{context.language}")
+            published = download(url, filename)
+        checksum = config.europarl_checksums.get(context.language_code)
+        if checksum is None:
+            checksum = published
+        if checksum is None:
+            logger.warning("No sha256 is known for %s. Relying on the size "
+                           "and the xz integrity check", filename)
         else:
-            print("Error. Download failed. Report this bug.")
+            try:
+                verify(filename, checksum)
+            except ValueError:
+                os.remove(filename)
+                raise ValueError(
+                    "The checksum of the downloaded file does not match. " +
+                    "Run again to download it again."
+                )
+        try:
+            decompress(filename, txt_filename)
+        except (lzma.LZMAError, EOFError):
+            # The file is corrupt or truncated
+            os.remove(filename)
+            raise ValueError(
+                "Could not decompress the downloaded file. " +
+                "Run again to download it again."
+            )
+    data_ready.add(context.language_code)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import time
+
+import config
+import loglevel
+
+# Queue of approved usage examples per lexeme. Every edit makes a new revision
+# of the lexeme, is rate limited and shows up in the watchlists, so the
+# examples approved for the forms of one lexeme are uploaded together in one
+# wbeditentity call instead of one edit each. The queue lives on the
+# LanguageContext and util.flush_edits() uploads it. The claims stay queued
+# until the upload succeeded, so a failed upload is tried again with the next
+# flush. Their forms are only put on the exclude list and finished in the
+# checkpoint after the upload. util.flush_expired_edits() runs before every
+# prompt so a batch is never kept much longer than edit_batch_timeout.
+
+logger = loglevel.get_logger(__name__)
+
+
+def add(context, lid, claim, data=None):
+    """Queues the claim for the Form. Returns True if the batch of the
+    lexeme should be uploaded now"""
+    if lid not in context.pending_edits:
+        context.pending_edits[lid] = dict(
+            claims=[], forms=[], started=time.time()
+        )
+    batch = context.pending_edits[lid]
+    batch["claims"].append(claim)
+    batch["forms"].append(data)
+    logger.debug("%d usage examples queued for %s",
+                 len(batch["claims"]), lid)
+    return (
+        len(batch["claims"]) >= config.edit_batch_size or
+        time.time() - batch["started"] >= config.edit_batch_timeout
+    )
+
+
+def count(context, lid):
+    batch = context.pending_edits.get(lid)
+    return 0 if batch is None else len(batch["claims"])
+
+
+def form_ids(context, lid):
+    """Returns the set of form_ids of the lexeme with a queued claim"""
+    batch = context.pending_edits.get(lid)
+    if batch is None:
+        return set()
+    return set(data.form_id for data in batch["forms"] if data is not None)
+
+
+def claims(context, lid):
+    """Returns the queued claims of the lexeme"""
+    batch = context.pending_edits.get(lid)
+    return [] if batch is None else list(batch["claims"])
+
+
+def remove(context, lid, uploaded):
+    """Removes the uploaded claims from the queue of the lexeme. Returns the
+    Forms they were queued for"""
+    batch = context.pending_edits.get(lid)
+    if batch is None:
+        return []
+    # Claims are only ever appended so the uploaded ones come first
+    forms = batch["forms"][:len(uploaded)]
+    batch["claims"] = batch["claims"][len(uploaded):]
+    batch["forms"] = batch["forms"][len(uploaded):]
+    if len(batch["claims"]) == 0:
+        del context.pending_edits[lid]
+    return [data for data in forms if data is not None]
+
+
+def postpone(context, lid):
+    """Waits another edit_batch_timeout seconds before the batch of the
+    lexeme expires again. Call this after a failed upload"""
+    batch = context.pending_edits.get(lid)
+    if batch is not None:
+        batch["started"] = time.time()
+
+
+def expired(context):
+    """Returns the lids of the batches that have waited edit_batch_timeout
+    seconds"""
+    now = time.time()
+    return [
+        lid for lid, batch in context.pending_edits.items()
+        if now - batch["started"] >= config.edit_batch_timeout
+    ]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+import threading
+
+import config
+import http_client
+import loglevel
+from records import Sense
+
+# Local cache of lexeme entities fetched in batches of up to 50 with
+# wbgetentities. Only the parts LexUse needs are kept: the last revision id,
+# the texts of the usage examples and the senses. Entries are kept in memory
+# in the LanguageContext and optionally on disk. Entries from disk are checked
+# against the current lastrevid before they are used.
+
+logger = loglevel.get_logger(__name__)
+
+api_url = "https://www.wikidata.org/w/api.php"
+# Maximum number of ids per call for normal users
+batch_size = 50
+
+# Opened on first use in every thread, e.g. the request threads of the
+# daemon, because sqlite connections cannot be shared between threads
+local = threading.local()
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        local.connection = sqlite3.connect(config.entity_cache_database)
+        local.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            "lid TEXT PRIMARY KEY, "
+            "lastrevid INTEGER NOT NULL, "
+            "json TEXT NOT NULL)"
+        )
+    return local.connection
+
+
+def trim_entity(entity):
+    """Returns a dictionary with only what LexUse uses"""
+    examples = []
+    for claim in entity.get("claims", {}).get("P5831", []):
+        datavalue = claim["mainsnak"].get("datavalue")
+        if datavalue is not None:
+            examples.append(datavalue["value"]["text"])
+    senses = []
+    for sense in entity.get("senses", []):
+        senses.append(dict(
+            id=sense["id"],
+            glosses={
+                language: gloss["value"]
+                for language, gloss in sense["glosses"].items()
+            },
+            p5137="P5137" in sense.get("claims", {}),
+        ))
+    return dict(
+        lid=entity["id"],
+        lastrevid=entity["lastrevid"],
+        examples=examples,
+        senses=senses,
+    )
+
+
+def batches(lids):
+    for i in range(0, len(lids), batch_size):
+        yield lids[i:i + batch_size]
+
+
+def fetch_entities(lids):
+    """Returns a dictionary with lid as key and the trimmed entity as
+    value"""
+    entities = {}
+    for batch in batches(lids):
+        logger.info("Fetching %d entities", len(batch))
+        response = http_client.get(api_url, params=dict(
+            action="wbgetentities",
+            ids="|".join(batch),
+            format="json",
+        ))
+        data = response.json()
+        for lid, entity in data.get("entities", {}).items():
+            if "missing" not in entity:
+                entities[lid] = trim_entity(entity)
+    return entities
+
+
+def fetch_lastrevids(lids):
+    """Returns a dictionary with lid as key and the current lastrevid as
+    value"""
+    lastrevids = {}
+    for batch in batches(lids):
+        response = http_client.get(api_url, params=dict(
+            action="query",
+            prop="info",
+            titles="|".join(f"Lexeme:{lid}" for lid in batch),
+            format="json",
+            formatversion="2",
+        ))
+        for page in response.json()["query"]["pages"]:
+            if "missing" not in page:
+                lid = page["title"].replace("Lexeme:", "")
+                lastrevids[lid] = page["lastrevid"]
+    return lastrevids
+
+
+def load_from_disk(lids):
+    entities = {}
+    if not config.entity_cache_database:
+        return entities
+    connection = get_connection()
+    for batch in batches(lids):
+        placeholders = ", ".join(["?"] * len(batch))
+        rows = connection.execute(
+            f"SELECT json FROM entities WHERE lid IN ({placeholders})", batch
+        )
+        for row in rows:
+            entity = json.loads(row[0])
+            entities[entity["lid"]] = entity
+    return entities
+
+
+def save_to_disk(entities):
+    if not config.entity_cache_database or len(entities) == 0:
+        return
+    connection = get_connection()
+    connection.executemany(
+        "INSERT OR REPLACE INTO entities VALUES (?, ?, ?)",
+        [
+            (lid, entity["lastrevid"], json.dumps(entity, ensure_ascii=False))
+            for lid, entity in entities.items()
+        ]
+    )
+    connection.commit()
+
+
+def prefetch(context, lids):
+    """Makes sure the entities are in the cache with as few API calls as
+    possible"""
+    missing = [lid for lid in lids if lid not in context.entity_cache]
+    if len(missing) == 0:
+        return
+    stored = load_from_disk(missing)
+    if len(stored) > 0:
+        # Only use stored entities that have not been edited since
+        lastrevids = fetch_lastrevids(list(stored))
+        for lid, entity in stored.items():
+            if lastrevids.get(lid) == entity["lastrevid"]:
+                context.entity_cache[lid] = entity
+    missing = [lid for lid in missing if lid not in context.entity_cache]
+    if len(missing) > 0:
+        fetched = fetch_entities(missing)
+        context.entity_cache.update(fetched)
+        save_to_disk(fetched)
+
+
+def get_entity(context, lid):
+    prefetch(context, [lid])
+    return context.entity_cache.get(lid)
+
+
+def invalidate(context, lid):
+    """Call this after editing the lexeme"""
+    context.entity_cache.pop(lid, None)
+
+
+def has_usage_example(context, lid, sentence):
+    """Returns True if the lexeme already has this usage example"""
+    entity = get_entity(context, lid)
+    if entity is None:
+        return False
+    return sentence.strip() in [
+        example.strip() for example in entity["examples"]
+    ]
+
+
+def get_senses(context, lid):
+    """Returns dictionary with numbers as keys and a Sense as value. Same
+    result as util.fetch_senses()"""
+    entity = get_entity(context, lid)
+    senses = {}
+    if entity is None:
+        return senses
+    number = 1
+    for sense in entity["senses"]:
+        gloss = sense["glosses"].get(context.language_code)
+        if sense["p5137"] and gloss is not None:
+            senses[number] = Sense(sense_id=sense["id"], gloss=gloss)
+            number += 1
+    return senses
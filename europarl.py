@@ -1,41 +1,147 @@
 #!/usr/bin/env python3
 import logging
+import time
 
 import config
+import features
 import loglevel
+from records import EUROPARL, Candidate
 
+try:
+    import suffix_array
+except ImportError:
+    # numpy is needed for the suffix array
+    suffix_array = None
+try:
+    import token_corpus
+except ImportError:
+    # numpy is needed for the token index
+    token_corpus = None
 
 # TODO move common code to common swedish module
-logger = logging.getLogger(__name__)
-if config.loglevel is None:
-    # Set loglevel
-    print("Setting loglevel in config")
-    loglevel.set_loglevel()
-logger.setLevel(config.loglevel)
-logger.level = logger.getEffectiveLevel()
-file_handler = logging.FileHandler("europarl.log")
-logger.addHandler(file_handler)
+logger = loglevel.get_logger(__name__)
 
 
-def find_lines(word):
-    """Returns a dictionary with line as
-    key and linenumber as value"""
+def check_deadline(deadline):
+    """Raises TimeoutError after the deadline (seconds since the epoch, so
+    it can be passed to other processes). Nobody waits for the records of a
+    source that timed out so the search stops instead of running on in the
+    background"""
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError("Europarl search stopped at the deadline")
+
+
+def find_lines_with_index(index, filename, words, deadline=None):
+    """Same as find_lines() but looks up the lines in the suffix array
+    instead of scanning the corpus"""
+    table = features.load_table(filename)
+    eligible = features.eligible_mask(table)
     records = {}
-    print(f"Looking for {word} in the Europarl corpus...")
-    with open(f'data_{config.language_code}.txt', 'r') as searchfile:
+    for word in words:
+        check_deadline(deadline)
+        line_numbers = [
+            number for number in index.line_numbers(word)
+            if eligible[number - 1]
+        ]
+        logger.info("%d eligible lines with %s", len(line_numbers), word)
+        records[word] = {
+            line: Candidate(source=EUROPARL, line=number)
+            for number, line in index.read_lines(line_numbers).items()
+        }
+    return records
+
+
+def find_lines_with_tokens(corpus, filename, words, deadline=None):
+    """Same as find_lines() but searches the token ids of the corpus for all
+    words at once"""
+    table = features.load_table(filename)
+    eligible = features.eligible_mask(table)
+    line_numbers_by_word = corpus.search(
+        words,
+        min_tokens=config.min_word_count,
+        max_tokens=config.max_word_count,
+    )
+    records = {}
+    for word, line_numbers in line_numbers_by_word.items():
+        check_deadline(deadline)
+        # The excluded words and quality filters
+        line_numbers = line_numbers[eligible[line_numbers - 1]]
+        logger.info("%d eligible lines with %s", len(line_numbers), word)
+        records[word] = {
+            line: Candidate(source=EUROPARL, line=number)
+            for number, line in corpus.read_lines(line_numbers).items()
+        }
+    return records
+
+
+def find_lines(context, words, deadline=None):
+    """Returns a dictionary with word as key and a dictionary with line as
+    key and Candidate as value. All words are matched in one pass over the
+    corpus. Raises TimeoutError if the deadline passes"""
+    words = set(words)
+    filename = context.data_filename
+    if config.europarl_token_index and token_corpus is not None:
+        corpus = token_corpus.load(filename)
+        if corpus is not None:
+            print(f"Looking up {', '.join(sorted(words))} in the " +
+                  "Europarl token index...")
+            records = find_lines_with_tokens(
+                corpus, filename, words, deadline=deadline
+            )
+            for word in sorted(words):
+                print(f"Found {len(records[word])} sentences for {word}")
+            return records
+        logger.warning("No token index found for %s. Build it with "
+                       "token_corpus.py", filename)
+    if config.europarl_suffix_array and suffix_array is not None:
+        index = suffix_array.load(filename)
+        if index is not None:
+            print(f"Looking up {', '.join(sorted(words))} in the " +
+                  "Europarl suffix array...")
+            records = find_lines_with_index(
+                index, filename, words, deadline=deadline
+            )
+            for word in sorted(words):
+                print(f"Found {len(records[word])} sentences for {word}")
+            return records
+        logger.warning("No suffix array found for %s. Build it with "
+                       "suffix_array.py", filename)
+    records = {word: {} for word in words}
+    # Words with spaces (e.g. "i och med") cannot be matched on tokens
+    multi_words = [word for word in words if " " in word]
+    print(f"Looking for {', '.join(sorted(words))} in the Europarl corpus...")
+    # Checked once so the loop does not pay for disabled debug logging
+    debug = logger.isEnabledFor(logging.DEBUG)
+    # Lines that fail the length, excluded words or quality filters are
+    # skipped with a lookup in the precomputed feature table
+    table = features.load_table(filename)
+    if table is not None:
+        eligible = features.eligible_mask(table).tolist()
+    else:
+        eligible = []
+    # Lines are split on \n only, like in the feature table, so a stray \r
+    # does not shift the line numbers
+    with open(filename, 'r', encoding='utf-8', newline='\n') as searchfile:
         number = 1
         for line in searchfile:
             if number % 50000 == 0:
-                logger.info(number)
-            if f" {word} " in line:
-                logger.debug(f"matching line:{line}")
-                records[line] = dict(
+                logger.info("line %d", number)
+                check_deadline(deadline)
+            if number <= len(eligible) and not eligible[number - 1]:
+                number += 1
+                continue
+            # Every token except the first and the last one is surrounded by
+            # spaces so this is equivalent to f" {word} " in line
+            matches = words.intersection(line.split(" ")[1:-1])
+            for word in multi_words:
+                if f" {word} " in line:
+                    matches.add(word)
+            for word in matches:
+                if debug:
+                    logger.debug("matching line:%s", line)
+                records[word][line] = Candidate(
+                    source=EUROPARL,
                     line=number,
-                    document_id=None,
-                    date=None,
-                    source="europarl",
-                    language_style="formal",
-                    type_of_reference="written"
                 )
             # if line.split(" ")[0] == word:
             #     print("Found in beginning of line")
@@ -44,16 +150,22 @@ def find_lines(word):
             #     print("Found in end of line")
             #     records[line] = number
             number += 1
-    logger.debug(f"records:{records}")
-    print(f"Found {len(records)} sentences")
+    if debug and config.debug_json:
+        logger.debug("records:%s", records)
+    for word in sorted(words):
+        print(f"Found {len(records[word])} sentences for {word}")
     return records
 
 
-def get_records(data):
-    word = data["word"]
+def get_records(context, forms, deadline=None):
+    """Returns a dictionary with form_id as key and the records found for the
+    word of that form as value"""
+    lines = find_lines(
+        context, [data.word for data in forms], deadline=deadline
+    )
     # The lines are already split in sentences in the corpus. so we just return
     # them as is
-    return find_lines(word)
+    return {data.form_id: lines[data.word] for data in forms}
 
     # TODO check len of records
     # if records is not None:
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import os.path
+import re
+
+import config
+import loglevel
+
+try:
+    import numpy as np
+except ImportError:
+    # Without numpy sentences are checked one by one in Python
+    np = None
+
+# Per sentence features used to filter candidates. For the Europarl corpus
+# they are computed once for every line and saved as a columnar table next to
+# the corpus so filtering becomes an array lookup. Short lists of sentences,
+# e.g. from Riksdagen, are checked in one vectorized pass with
+# eligible_sentences().
+#
+# Columns:
+#   word_count   words separated by space like util.count_words()
+#   char_length  length in characters without the newline
+#   excluded     True if one of the excluded words is present
+#   quality      True if it starts with an upper case letter in any
+#                alphabet and ends with a full stop, exclamation mark or
+#                question mark
+
+logger = loglevel.get_logger(__name__)
+
+# Sentences with these are not suitable as usage examples
+excluded_words = [
+    "SAMMANFATTNING",
+    "BETÄNKANDE",
+    "UTSKOTT",
+    "MOTION",
+    " EG ",
+    " EU ",
+    "RIKSDAGEN",
+]
+
+# Lines are processed in chunks of this many bytes to keep the memory use of
+# the intermediate arrays down
+chunk_size = 16 * 1024 * 1024
+
+# Sorted UTF-8 sequences of every upper case character (str.isupper()) as
+# big-endian integers. Built on first use.
+upper_case_keys = None
+
+# Loaded tables by corpus filename with the size and mtime of the corpus
+tables = {}
+
+
+def excluded_words_pattern():
+    """Returns a bytes regex matching the excluded words in any case. We
+    cannot use re.IGNORECASE because it only handles ASCII in bytes"""
+    words = []
+    for word in excluded_words:
+        word_pattern = b""
+        for char in word:
+            alternatives = set([
+                char.lower().encode("utf-8"), char.upper().encode("utf-8")
+            ])
+            word_pattern += (
+                b"(?:" + b"|".join(re.escape(a) for a in alternatives) + b")"
+            )
+        words.append(word_pattern)
+    return re.compile(b"|".join(words))
+
+
+def get_upper_case_keys():
+    global upper_case_keys
+    if upper_case_keys is None:
+        upper_case_keys = np.array(sorted(
+            int.from_bytes(chr(code).encode("utf-8"), "big")
+            for code in range(0x110000)
+            # Surrogates cannot be encoded
+            if not 0xD800 <= code <= 0xDFFF and chr(code).isupper()
+        ), dtype=np.uint32)
+    return upper_case_keys
+
+
+def first_character_keys(array, starts):
+    """Returns the UTF-8 sequence of the character at each start as a
+    big-endian integer comparable with get_upper_case_keys()"""
+    first = array[starts]
+    # Bytes in the sequence, from the lead byte
+    length = (
+        1 + (first >= 0xC0).astype(np.int64) + (first >= 0xE0) +
+        (first >= 0xF0)
+    )
+    keys = np.zeros(len(starts), dtype=np.uint32)
+    for i in range(4):
+        byte = array[np.minimum(starts + i, len(array) - 1)]
+        keys = np.where(i < length, (keys << 8) | byte, keys)
+    return keys
+
+
+def table_filename(txt_filename):
+    return txt_filename.replace(".txt", ".features.npz")
+
+
+def compute_chunk(data):
+    """Returns the columns for a chunk of whole lines"""
+    array = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(array == ord("\n"))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Characters are all bytes except UTF-8 continuation bytes
+    characters = np.concatenate(
+        ([0], np.cumsum((array & 0xC0) != 0x80, dtype=np.int64))
+    )
+    spaces = np.concatenate(
+        ([0], np.cumsum(array == ord(" "), dtype=np.int64))
+    )
+    char_length = characters[ends] - characters[starts]
+    word_count = spaces[ends] - spaces[starts] + 1
+    # Line index of every excluded word match
+    excluded = np.zeros(len(ends), dtype=bool)
+    positions = [
+        match.start()
+        for match in excluded_words_pattern().finditer(data)
+    ]
+    if len(positions) > 0:
+        excluded[np.searchsorted(ends, positions)] = True
+    not_empty = ends > starts
+    # Upper case in any alphabet like ranker.is_quality()
+    first = first_character_keys(array, starts[not_empty])
+    last = array[ends[not_empty] - 1]
+    quality = np.zeros(len(ends), dtype=bool)
+    quality[not_empty] = (
+        np.isin(first, get_upper_case_keys()) &
+        np.isin(last, [ord("."), ord("!"), ord("?")])
+    )
+    return dict(
+        word_count=np.minimum(word_count, 65535).astype(np.uint16),
+        char_length=char_length.astype(np.uint32),
+        excluded=excluded,
+        quality=quality,
+    )
+
+
+def build_table(txt_filename):
+    """Computes the features of every line in the corpus and saves them"""
+    print(f"Computing sentence features for {txt_filename}")
+    columns = []
+    rest = b""
+    with open(txt_filename, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            # Only whole lines. Lines end at \n only and the readers of the
+            # corpus open it with newline='\n' to number them the same way
+            cut = data.rfind(b"\n") + 1
+            rest = data[cut:]
+            if cut > 0:
+                columns.append(compute_chunk(data[:cut]))
+    if len(rest) > 0:
+        # Last line without a newline
+        columns.append(compute_chunk(rest + b"\n"))
+    table = {
+        name: np.concatenate([chunk[name] for chunk in columns])
+        for name in ("word_count", "char_length", "excluded", "quality")
+    }
+    stat = os.stat(txt_filename)
+    np.savez(
+        table_filename(txt_filename),
+        source=np.array([stat.st_size, int(stat.st_mtime)], dtype=np.int64),
+        **table
+    )
+    logger.info("Computed features of %d lines", len(table["word_count"]))
+    return table
+
+
+def load_table(txt_filename):
+    """Returns the feature table of the corpus and builds it if it is
+    missing or older than the corpus. Returns None without numpy."""
+    if np is None:
+        return None
+    stat = os.stat(txt_filename)
+    source = [stat.st_size, int(stat.st_mtime)]
+    # Kept in memory for later searches, e.g. in the daemon
+    if txt_filename in tables and tables[txt_filename][0] == source:
+        return tables[txt_filename][1]
+    filename = table_filename(txt_filename)
+    table = None
+    if os.path.isfile(filename):
+        stored = np.load(filename)
+        if list(stored["source"]) == source:
+            table = {name: stored[name] for name in stored.files}
+    if table is None:
+        table = build_table(txt_filename)
+    tables[txt_filename] = (source, table)
+    return table
+
+
+def eligible_mask(table):
+    """Returns a boolean array with True for the lines that pass all
+    filters"""
+    mask = (
+        (table["word_count"] >= config.min_word_count) &
+        (table["word_count"] <= config.max_word_count) &
+        ~table["excluded"]
+    )
+    if config.require_quality_sentences:
+        mask &= table["quality"]
+    return mask
+
+
+def eligible_sentences(sentences):
+    """Returns a list of booleans telling which sentences pass the length and
+    excluded words filters"""
+    if len(sentences) == 0:
+        return []
+    if np is None:
+        eligible = []
+        for sentence in sentences:
+            word_count = len(sentence.strip().split(" "))
+            upper = sentence.upper()
+            eligible.append(
+                config.min_word_count <= word_count <= config.max_word_count
+                and not any(word in upper for word in excluded_words)
+            )
+        return eligible
+    array = np.array(sentences, dtype=str)
+    word_count = np.char.count(np.char.strip(array), " ") + 1
+    upper = np.char.upper(array)
+    excluded = np.zeros(len(sentences), dtype=bool)
+    for word in excluded_words:
+        excluded |= np.char.find(upper, word) != -1
+    return (
+        (word_count >= config.min_word_count) &
+        (word_count <= config.max_word_count) &
+        ~excluded
+    ).tolist()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import asyncio
+import contextlib
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+import loglevel
+
+# One pooled HTTP layer used for all outbound calls. Connections are kept
+# alive between requests, responses are gzipped, every host has its own token
+# bucket and 429/503 answers are retried after Retry-After.
+#
+# Async code runs on one event loop in a background thread so the
+# AsyncClient and its connections survive between lexemes. Use run() to call
+# a coroutine from synchronous code.
+
+logger = loglevel.get_logger(__name__)
+
+try:
+    import h2  # noqa: F401
+    http2 = True
+except ImportError:
+    # HTTP/2 needs the optional h2 package
+    http2 = False
+
+headers = {
+    "User-Agent": config.user_agent,
+    "Accept-Encoding": "gzip, deflate",
+}
+
+
+class TokenBucket:
+    """Allows rate requests per second on average with bursts of up to
+    burst requests. Thread safe."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns the number of seconds to wait before it
+        can be used"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def async_acquire(self):
+        await asyncio.sleep(self.reserve())
+
+
+buckets = {}
+buckets_lock = threading.Lock()
+
+
+def get_bucket(url):
+    """Returns the token bucket of the host or None if it is not limited"""
+    host = urlsplit(str(url)).hostname
+    if host not in config.http_rate_limits:
+        return None
+    with buckets_lock:
+        if host not in buckets:
+            rate, burst = config.http_rate_limits[host]
+            buckets[host] = TokenBucket(rate, burst)
+        return buckets[host]
+
+
+def retry_after(response):
+    """Returns the number of seconds the server asked us to wait or None"""
+    if response.status_code not in (429, 503):
+        return None
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return config.http_retry_delay
+    try:
+        return max(0, int(value))
+    except ValueError:
+        # HTTP date
+        date = parsedate_to_datetime(value)
+        return max(0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+client = None
+client_lock = threading.Lock()
+
+
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            client = httpx.Client(
+                http2=http2,
+                headers=headers,
+                timeout=config.http_timeout,
+                follow_redirects=True,
+            )
+    return client
+
+
+def request(method, url, **kwargs):
+    """Like httpx.request() but pooled, rate limited and retried"""
+    bucket = get_bucket(url)
+    for attempt in range(config.http_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        response = get_client().request(method, url, **kwargs)
+        delay = retry_after(response)
+        if delay is None or attempt == config.http_retries:
+            return response
+        logger.info("Got %d from %s. Retrying in %s seconds",
+                    response.status_code, url, delay)
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def stream(method, url, **kwargs):
+    """Returns a context manager with a streamed response. It is rate limited
+    but not retried."""
+    bucket = get_bucket(url)
+    if bucket is not None:
+        bucket.acquire()
+    return get_client().stream(method, url, **kwargs)
+
+
+loop = None
+loop_lock = threading.Lock()
+async_client = None
+
+
+def get_loop():
+    """Returns the event loop running in the background thread"""
+    global loop
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="http_client", daemon=True
+            ).start()
+    return loop
+
+
+def run(coroutine):
+    """Runs the coroutine on the background event loop and returns its
+    result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+
+def get_async_client():
+    # Only called from the background loop so no lock is needed
+    global async_client
+    if async_client is None:
+        async_client = httpx.AsyncClient(
+            http2=http2,
+            headers=headers,
+            timeout=config.http_timeout,
+            follow_redirects=True,
+        )
+    return async_client
+
+
+async def async_request(method, url, **kwargs):
+    """Like request() but for the background event loop"""
+    bucket = get_bucket(url)
+    for attempt in range(config.http_retries + 1):
+        if bucket is not None:
+            await bucket.async_acquire()
+        response = await get_async_client().request(method, url, **kwargs)
+        delay = retry_after(response)
+        if delay is None or attempt == config.http_retries:
+            return response
+        logger.info("Got %d from %s. Retrying in %s seconds",
+                    response.status_code, url, delay)
+        await asyncio.sleep(delay)
+
+
+@contextlib.asynccontextmanager
+async def async_stream(method, url, **kwargs):
+    """Like stream() but for the background event loop"""
+    bucket = get_bucket(url)
+    if bucket is not None:
+        await bucket.async_acquire()
+    async with get_async_client().stream(method, url, **kwargs) as response:
+        yield response
+
+
+async def async_get(url, **kwargs):
+    return await async_request("GET", url, **kwargs)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import argparse
+from datetime import datetime, timedelta, timezone
+import sqlite3
+
+import checkpoint
+import config
+import context
+import coordination
+import entity_cache
+import http_client
+import lexeme_dump
+import loglevel
+import util
+from records import Form
+
+# Incremental mode. A local snapshot of the eligible forms is kept per
+# language, and later runs only ask the recent changes API which lexemes were
+# edited, created or deleted since the last run. Only those lexemes are
+# fetched again with wbgetentities and their forms in the snapshot replaced,
+# and only their cached entities, senses and candidates are dropped, also in
+# the daemon and in the store shared with other reviewers. The whole window
+# is fetched from WDQS (or the lexeme dump) only the first time and when the
+# snapshot is older than the recent changes the wiki keeps. Lexemes that
+# become eligible are added even if they were outside the
+# sparql_results_size window of the first fetch.
+#
+# The API URL is config.mediawiki_api_url so a local stand-in can be used.
+#
+# Usage: ./incremental.py sv to refresh the snapshot without reviewing
+
+logger = loglevel.get_logger(__name__)
+
+# Namespace of the lexemes on Wikidata
+lexeme_namespace = 146
+# Changes this close to the last run are fetched again in case they were not
+# visible in the API yet
+overlap = timedelta(minutes=5)
+timestamp_format = "%Y-%m-%dT%H:%M:%SZ"
+
+schema = """
+CREATE TABLE IF NOT EXISTS forms (
+    language TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    form_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS forms_lid ON forms (language, lid);
+CREATE TABLE IF NOT EXISTS state (
+    language TEXT PRIMARY KEY,
+    last_run TEXT NOT NULL
+);
+"""
+
+# Opened on first use
+connection = None
+
+
+def get_connection():
+    global connection
+    if connection is None:
+        connection = sqlite3.connect(config.snapshot_database)
+        connection.executescript(schema)
+    return connection
+
+
+def get_last_run(context):
+    """Returns the UTC datetime of the last refresh or None"""
+    row = get_connection().execute(
+        "SELECT last_run FROM state WHERE language = ?",
+        (context.language_code,)
+    ).fetchone()
+    if row is None:
+        return None
+    return datetime.strptime(row[0], timestamp_format).replace(
+        tzinfo=timezone.utc
+    )
+
+
+def set_last_run(context, last_run):
+    get_connection().execute(
+        "INSERT OR REPLACE INTO state VALUES (?, ?)",
+        (context.language_code, last_run.strftime(timestamp_format))
+    )
+
+
+def load_forms(context):
+    """Returns the forms in the snapshot as a list of Form"""
+    rows = get_connection().execute(
+        "SELECT lid, form_id, word, category FROM forms "
+        "WHERE language = ? ORDER BY lid, form_id", (context.language_code,)
+    )
+    return [
+        Form(lid=lid, form_id=form_id, word=word, category=category)
+        for lid, form_id, word, category in rows
+    ]
+
+
+def replace_forms(context, lid, forms):
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM forms WHERE language = ? AND lid = ?",
+        (context.language_code, lid)
+    )
+    connection.executemany(
+        "INSERT INTO forms VALUES (?, ?, ?, ?, ?)", [
+            (context.language_code, data.lid, data.form_id, data.word,
+             data.category)
+            for data in forms
+        ]
+    )
+
+
+def full_refresh(context):
+    """Replaces the snapshot with the forms from WDQS or the lexeme dump"""
+    started = datetime.now(timezone.utc)
+    forms = util.fetch_lexeme_forms(context)
+    connection = get_connection()
+    connection.execute(
+        "DELETE FROM forms WHERE language = ?", (context.language_code,)
+    )
+    connection.executemany(
+        "INSERT INTO forms VALUES (?, ?, ?, ?, ?)", [
+            (context.language_code, data.lid, data.form_id, data.word,
+             data.category)
+            for data in forms
+        ]
+    )
+    set_last_run(context, started)
+    connection.commit()
+    print(f"Saved a snapshot of {len(forms)} forms")
+
+
+def changed_lexemes(since):
+    """Returns the set of lids of the lexemes changed since the datetime
+    according to the recent changes API"""
+    lids = set()
+    params = dict(
+        action="query",
+        list="recentchanges",
+        rcnamespace=lexeme_namespace,
+        rcstart=since.strftime(timestamp_format),
+        rcdir="newer",
+        # Log entries cover deletions, merges are edits
+        rctype="edit|new|log",
+        rcprop="title",
+        rclimit="max",
+        format="json",
+        formatversion="2",
+    )
+    while True:
+        response = http_client.get(config.mediawiki_api_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            raise ValueError(f"Recent changes API error: {data['error']}")
+        for change in data["query"]["recentchanges"]:
+            lids.add(change["title"].replace("Lexeme:", ""))
+        if "continue" not in data:
+            break
+        params.update(data["continue"])
+    return lids
+
+
+def fetch_lexemes(lids):
+    """Returns a dictionary with lid as key and the full entity or None if
+    it was deleted as value"""
+    entities = {}
+    for batch in entity_cache.batches(lids):
+        response = http_client.get(config.mediawiki_api_url, params=dict(
+            action="wbgetentities",
+            ids="|".join(batch),
+            format="json",
+        ))
+        response.raise_for_status()
+        data = response.json()
+        for lid in batch:
+            entity = data.get("entities", {}).get(lid)
+            if entity is None or "missing" in entity:
+                entities[lid] = None
+            else:
+                entities[lid] = entity
+    return entities
+
+
+def eligible_forms(context, entity):
+    """Returns the forms of the entity that the query of
+    util.fetch_lexeme_forms() would return as a list of Form"""
+    rows = lexeme_dump.entity_rows(entity)
+    lid, language, category, excluded, has_example, lastrevid = (
+        rows["lexemes"][0]
+    )
+    if (
+            language != context.language_qid or excluded or has_example or
+            not any(has_p5137 for _, _, has_p5137 in rows["senses"])
+    ):
+        return []
+    with_features = set(form_id for form_id, _ in rows["grammatical_features"])
+    forms = []
+    for form_id, _, _, word in rows["representations"]:
+        if form_id in with_features:
+            forms.append(Form(
+                lid=lid,
+                form_id=form_id,
+                word=word,
+                category=lexeme_dump.category_labels.get(category, category),
+            ))
+    return forms
+
+
+def invalidate(context, lid):
+    """Drops what is cached about the lexeme"""
+    entity_cache.invalidate(context, lid)
+    context.senses_cache.pop(lid, None)
+    if context.daemon is not None:
+        context.daemon.invalidate(context, lid)
+    if config.checkpoint:
+        checkpoint.forget_lexeme(context, lid)
+    if coordination.enabled():
+        coordination.forget_candidates(context, lid)
+
+
+def refresh(context):
+    """Updates the snapshot with the lexemes changed since the last run.
+    Returns the number of changed lexemes"""
+    started = datetime.now(timezone.utc)
+    lids = sorted(changed_lexemes(get_last_run(context) - overlap))
+    print(f"{len(lids)} lexemes changed since the last run")
+    entities = fetch_lexemes(lids)
+    for lid in lids:
+        forms = []
+        if entities[lid] is not None:
+            forms = eligible_forms(context, entities[lid])
+        logger.debug("%s has %d eligible forms", lid, len(forms))
+        replace_forms(context, lid, forms)
+        invalidate(context, lid)
+    set_last_run(context, started)
+    get_connection().commit()
+    return len(lids)
+
+
+def fetch_lexeme_forms(context):
+    """Returns a list of Form from the snapshot after updating it"""
+    last_run = get_last_run(context)
+    max_age = timedelta(days=config.recent_changes_max_age)
+    if last_run is None or datetime.now(timezone.utc) - last_run > max_age:
+        print("Fetching all lexeme forms for a new snapshot")
+        full_refresh(context)
+    else:
+        refresh(context)
+    forms = load_forms(context)
+    if len(forms) == 0:
+        print(f"No {context.language} lexemes containing " +
+              "both a sense, forms with " +
+              "grammatical features and missing a usage example was found")
+        exit(0)
+    return forms
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Update the snapshot of the eligible lexeme forms"
+    )
+    parser.add_argument("language_code", help="E.g. sv")
+    parser.add_argument("--full", action="store_true",
+                        help="Fetch all forms again")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    language = context.for_language(args.language_code)
+    if args.full:
+        full_refresh(language)
+    else:
+        fetch_lexeme_forms(language)
+    print(f"{len(load_forms(language))} forms in the snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import codecs
+import json
+import re
+
+try:
+    # Incremental parser with a fast C backend
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Incremental parsing of the large JSON responses from WDQS and Riksdagen.
+# iterate_items() yields the entries of one array in the response one at a
+# time while the rest of the response is still being downloaded, so the whole
+# document is never held as nested dicts. async_iterate_items() does the same
+# for the streamed responses of the async client. ijson is used when it is
+# installed, otherwise a scanner built on json.JSONDecoder.raw_decode().
+
+
+def loads(data):
+    """json.loads() with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ChunkReader:
+    """File-like object over an iterator of bytes for ijson"""
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class AsyncChunkReader:
+    """Asynchronous file-like object over an async iterator of bytes for
+    ijson"""
+    def __init__(self, chunks):
+        self.chunks = chunks.__aiter__()
+        self.buffer = b""
+
+    async def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                chunk = await self.chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class ItemScanner:
+    """Finds the entries of the first array that is the value of key in the
+    chunks of bytes it is fed"""
+    def __init__(self, key):
+        self.key = key
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.start_pattern = re.compile(
+            r'"' + re.escape(key) + r'"\s*:\s*\['
+        )
+        self.whitespace = re.compile(r'[\s,]*')
+        self.buffer = ""
+        self.started = False
+        self.done = False
+
+    def feed(self, chunk):
+        """Returns a list of the entries that are complete now"""
+        if self.done:
+            return []
+        if not self.started:
+            # Keep enough to find a key cut in two by the chunk boundary
+            self.buffer = (
+                self.buffer[-len(self.key) - 16:] +
+                self.text_decoder.decode(chunk)
+            )
+            match = self.start_pattern.search(self.buffer)
+            if match is None:
+                return []
+            self.buffer = self.buffer[match.end():]
+            self.started = True
+        else:
+            self.buffer += self.text_decoder.decode(chunk)
+        items = []
+        position = 0
+        while True:
+            position = self.whitespace.match(self.buffer, position).end()
+            if position == len(self.buffer):
+                break
+            if self.buffer[position] == "]":
+                self.done = True
+                break
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, position)
+            except ValueError:
+                # JSONDecodeError is a ValueError. The entry is incomplete.
+                break
+            items.append(item)
+            position = end
+        self.buffer = self.buffer[position:]
+        return items
+
+    def close(self):
+        """Call this after the last chunk. The key missing from the response
+        is fine, e.g. no hits, but a cut off array is not"""
+        if self.started and not self.done:
+            raise ValueError(f"Truncated JSON in the {self.key} array")
+
+
+def scan_items(chunks, key):
+    """Yields the entries of the first array that is the value of key"""
+    scanner = ItemScanner(key)
+    for chunk in chunks:
+        yield from scanner.feed(chunk)
+        if scanner.done:
+            return
+    scanner.close()
+
+
+async def async_scan_items(chunks, key):
+    """Like scan_items() but for an async iterator of bytes"""
+    scanner = ItemScanner(key)
+    async for chunk in chunks:
+        for item in scanner.feed(chunk):
+            yield item
+        if scanner.done:
+            return
+    scanner.close()
+
+
+def iterate_items(chunks, path, trim=None):
+    """Yields the entries of the array at path, e.g. ("results", "bindings"),
+    in the JSON document that chunks of bytes make up. trim is called on
+    every entry to keep only what is used"""
+    if ijson is not None:
+        items = ijson.items(
+            ChunkReader(chunks), ".".join(path) + ".item", use_float=True
+        )
+    else:
+        # The last key is enough to find the array in the responses we parse
+        items = scan_items(chunks, path[-1])
+    for item in items:
+        yield item if trim is None else trim(item)
+
+
+async def async_iterate_items(chunks, path, trim=None):
+    """Like iterate_items() but for an async iterator of bytes, e.g.
+    aiter_bytes() of a streamed httpx response, so the entries are parsed
+    while the rest of the response is still being downloaded"""
+    if ijson is not None:
+        items = ijson.items_async(
+            AsyncChunkReader(chunks), ".".join(path) + ".item",
+            use_float=True
+        )
+    else:
+        items = async_scan_items(chunks, path[-1])
+    async for item in items:
+        yield item if trim is None else trim(item)
+
+
+def keep_fields(fields):
+    """Returns a trim function that keeps only the fields of an entry"""
+    def trim(item):
+        return {field: item[field] for field in fields if field in item}
+    return trim
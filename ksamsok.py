@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import argparse
+import os.path
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+import zlib
+
+import config
+import http_client
+import loglevel
+import riksdagen
+from records import KSAMSOK, Candidate
+
+# Local sentence store of the CC0 descriptions in K-samsök, the Swedish
+# cultural heritage aggregator. Searching the live API for every word would be
+# even slower than Riksdagen so the records are harvested in bulk with
+# OAI-PMH. Every page is committed together with its resumption token, so an
+# interrupted harvest continues where it stopped.
+#
+# The descriptions are compressed with zlib (lzma has too much overhead for
+# short texts) and indexed with a contentless sqlite FTS5 table, so the text
+# is only stored once. The tokenizer keeps the diacritics because å, ä and ö
+# are letters of their own in Swedish, e.g. "år" is not "ar".
+#
+# Usage: ./ksamsok.py to harvest or continue harvesting
+
+logger = loglevel.get_logger(__name__)
+
+oai = "{http://www.openarchives.org/OAI/2.0/}"
+rdf = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+chunk_size = 64 * 1024
+
+tokenizer = "unicode61 remove_diacritics 0"
+
+schema = f"""
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    uri TEXT UNIQUE NOT NULL,
+    text BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS descriptions USING fts5(
+    text, content='', tokenize='{tokenizer}'
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def connect(database=None):
+    if database is None:
+        database = config.ksamsok_database
+    connection = sqlite3.connect(database)
+    connection.executescript(schema)
+    row = connection.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'descriptions'"
+    ).fetchone()
+    if tokenizer not in row[0]:
+        reindex(connection)
+    return connection
+
+
+def reindex(connection):
+    """Rebuilds the index of a store harvested with another tokenizer"""
+    print("Rebuilding the K-samsök index")
+    connection.execute("DROP TABLE descriptions")
+    connection.executescript(schema)
+    for rowid, text in connection.execute("SELECT id, text FROM records"):
+        connection.execute(
+            "INSERT INTO descriptions (rowid, text) VALUES (?, ?)",
+            (rowid, zlib.decompress(text).decode("utf-8"))
+        )
+    connection.commit()
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def is_cc0(license_uri):
+    return license_uri is not None and (
+        license_uri.lower().endswith("#cc0") or
+        "publicdomain/zero" in license_uri
+    )
+
+
+def extract_record(element):
+    """Returns a tuple with the URI and the description of an OAI record or
+    None if it is deleted, not CC0 or has no description"""
+    header = element.find(f"{oai}header")
+    if header is None or header.get("status") == "deleted":
+        return None
+    uri = None
+    license_uri = None
+    descriptions = []
+    for child in element.iter():
+        name = local_name(child.tag)
+        if uri is None and child.get(f"{rdf}about") is not None:
+            uri = child.get(f"{rdf}about")
+        if name == "itemLicense":
+            license_uri = child.get(f"{rdf}resource")
+        elif name == "desc" and child.text and child.text.strip():
+            descriptions.append(child.text.strip())
+    if uri is None:
+        uri = header.findtext(f"{oai}identifier")
+    if not is_cc0(license_uri) or len(descriptions) == 0 or uri is None:
+        return None
+    return uri, "\n\n".join(descriptions)
+
+
+def parse_page(response):
+    """Yields the extracted records of one streamed ListRecords response and
+    finally the resumption token (or None) as ("token", value)"""
+    parser = ET.XMLPullParser(events=("end",))
+    token = None
+    for data in response.iter_bytes(chunk_size=chunk_size):
+        parser.feed(data)
+        for event, element in parser.read_events():
+            if element.tag == f"{oai}record":
+                record = extract_record(element)
+                # Keep the memory use flat
+                element.clear()
+                if record is not None:
+                    yield record
+            elif element.tag == f"{oai}resumptionToken":
+                token = (element.text or "").strip() or None
+            elif element.tag == f"{oai}error":
+                raise ValueError(
+                    f"OAI-PMH error {element.get('code')}: {element.text}"
+                )
+    parser.close()
+    yield "token", token
+
+
+def save_records(connection, records):
+    for uri, text in records:
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO records (uri, text) VALUES (?, ?)",
+            (uri, zlib.compress(text.encode("utf-8")))
+        )
+        if cursor.rowcount == 1:
+            connection.execute(
+                "INSERT INTO descriptions (rowid, text) VALUES (?, ?)",
+                (cursor.lastrowid, text)
+            )
+
+
+def get_state(connection, key):
+    row = connection.execute(
+        "SELECT value FROM state WHERE key = ?", (key,)
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def set_state(connection, key, value):
+    connection.execute(
+        "INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value)
+    )
+
+
+def harvest(url=None, database=None, restart=False):
+    """Harvests the records page by page and returns the number of records
+    in the store"""
+    if url is None:
+        url = config.ksamsok_oai_url
+    connection = connect(database)
+    if restart:
+        set_state(connection, "token", None)
+        set_state(connection, "done", None)
+        connection.commit()
+    if get_state(connection, "done"):
+        print("K-samsök has already been harvested. Use --restart to " +
+              "harvest again.")
+    token = get_state(connection, "token")
+    while not get_state(connection, "done"):
+        if token is None:
+            params = dict(
+                verb="ListRecords",
+                metadataPrefix=config.ksamsok_metadata_prefix,
+            )
+        else:
+            print("Continuing the harvest")
+            params = dict(verb="ListRecords", resumptionToken=token)
+        records = []
+        with http_client.stream("GET", url, params=params) as response:
+            response.raise_for_status()
+            for record in parse_page(response):
+                if record[0] == "token":
+                    token = record[1]
+                else:
+                    records.append(record)
+        # The page and the token are committed together
+        save_records(connection, records)
+        set_state(connection, "token", token)
+        if token is None:
+            set_state(connection, "done", "1")
+        connection.commit()
+        count = connection.execute("SELECT COUNT(*) FROM records").fetchone()
+        print(f"Harvested {len(records)} CC0 records. " +
+              f"{count[0]} in the store")
+    count = connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+    connection.close()
+    return count
+
+
+def exists():
+    return os.path.isfile(config.ksamsok_database)
+
+
+def version():
+    """Changes whenever records are added or the index is built with another
+    tokenizer"""
+    connection = connect()
+    row = connection.execute("SELECT MAX(id) FROM records").fetchone()
+    connection.close()
+    return f"{row[0]}-{tokenizer}"
+
+
+def search(word, limit=None):
+    """Returns a list of tuples with URI and description of the records with
+    the word"""
+    if limit is None:
+        limit = config.ksamsok_max_results
+    # Quote the word so it is searched as a phrase
+    query = '"' + word.replace('"', '""') + '"'
+    # Opened per search because it runs in the executor threads
+    connection = connect()
+    rows = connection.execute(
+        "SELECT r.uri, r.text FROM descriptions d "
+        "JOIN records r ON r.id = d.rowid "
+        "WHERE descriptions MATCH ? LIMIT ?", (query, limit)
+    ).fetchall()
+    connection.close()
+    return [
+        (uri, zlib.decompress(text).decode("utf-8")) for uri, text in rows
+    ]
+
+
+def get_records(context, forms, deadline=None):
+    """Returns a dictionary with form_id as key and a dictionary with
+    sentences as key and Candidate as value. Raises TimeoutError if the
+    deadline (seconds since the epoch) passes"""
+    sentences_by_form = {}
+    for data in forms:
+        sentences = {}
+        for uri, text in search(data.word):
+            # Stop instead of searching on after the source timed out
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError("K-samsök search stopped at the deadline")
+            result_data = Candidate(source=KSAMSOK, document_id=uri)
+            for paragraph in text.split("\n\n"):
+                for sentence in riksdagen.find_usage_examples_from_summary(
+                        word_spaces=data.word_spaces,
+                        summary=paragraph
+                ):
+                    sentences[sentence] = result_data
+        logger.info("Found %d sentences in K-samsök for the form '%s'",
+                    len(sentences), data.word)
+        sentences_by_form[data.form_id] = sentences
+    return sentences_by_form
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Harvest CC0 descriptions from K-samsök"
+    )
+    parser.add_argument("--url", help="OAI-PMH endpoint")
+    parser.add_argument("--restart", action="store_true",
+                        help="Start over from the first page")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    harvest(url=args.url, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
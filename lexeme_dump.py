@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import argparse
+import bz2
+import json
+import os.path
+import sqlite3
+import threading
+
+import config
+import loglevel
+from records import Form, Sense
+
+# Local alternative to the Wikidata Query Service for the lexeme queries.
+# import_dump() streams the lexemes JSON dump from
+# https://dumps.wikimedia.org/wikidatawiki/entities/latest-lexemes.json.bz2
+# into an indexed sqlite database that the functions below query. Enable it
+# by setting query_backend = "dump" in config.
+#
+# Usage: ./lexeme_dump.py latest-lexemes.json.bz2
+
+logger = loglevel.get_logger(__name__)
+
+# Lexical categories are stored as QIDs. These are the English labels WDQS
+# returns for the most common ones. Other categories are shown as their QID.
+category_labels = {
+    "Q1084": "noun",
+    "Q24905": "verb",
+    "Q34698": "adjective",
+    "Q380057": "adverb",
+    "Q4833830": "preposition",
+    "Q36224": "pronoun",
+    "Q36484": "conjunction",
+    "Q63116": "numeral",
+    "Q147276": "proper noun",
+    "Q83034": "interjection",
+    "Q576271": "determiner",
+    "Q187931": "phrase",
+}
+
+# Lexemes that are instances of these are excluded just like in the SPARQL
+# query
+excluded_instances = {
+    "Q62155",  # affix
+    "Q134830",  # prefix
+    "Q102047",  # suffix
+    "Q1153504",  # interfix
+}
+
+schema = """
+CREATE TABLE lexemes (
+    lid TEXT PRIMARY KEY,
+    language TEXT NOT NULL,
+    category TEXT NOT NULL,
+    excluded INTEGER NOT NULL,
+    has_example INTEGER NOT NULL,
+    lastrevid INTEGER
+);
+CREATE TABLE representations (
+    form_id TEXT NOT NULL,
+    lid TEXT NOT NULL,
+    language TEXT NOT NULL,
+    word TEXT NOT NULL
+);
+CREATE TABLE grammatical_features (
+    form_id TEXT NOT NULL,
+    feature TEXT NOT NULL
+);
+CREATE TABLE senses (
+    sense_id TEXT PRIMARY KEY,
+    lid TEXT NOT NULL,
+    has_p5137 INTEGER NOT NULL
+);
+CREATE TABLE glosses (
+    sense_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    gloss TEXT NOT NULL
+);
+"""
+
+indexes = """
+CREATE INDEX lexemes_language ON lexemes (language);
+CREATE INDEX representations_lid ON representations (lid);
+CREATE INDEX grammatical_features_form_id ON grammatical_features (form_id);
+CREATE INDEX senses_lid ON senses (lid);
+CREATE INDEX glosses_sense_id ON glosses (sense_id);
+"""
+
+
+def iterate_dump(filename):
+    """Yields one entity at a time. The dump is a JSON array with one entity
+    per line so we never have to parse the whole file"""
+    opener = bz2.open if filename.endswith(".bz2") else open
+    with opener(filename, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line in ("[", "]", ""):
+                continue
+            yield json.loads(line)
+
+
+def claim_values(claims, prop):
+    """Returns the entity ids of the values of the property"""
+    values = []
+    for claim in claims.get(prop, []):
+        datavalue = claim["mainsnak"].get("datavalue")
+        if datavalue is not None and isinstance(datavalue["value"], dict):
+            values.append(datavalue["value"].get("id"))
+    return values
+
+
+def entity_rows(entity):
+    """Returns a dictionary with table name as key and a list of rows as
+    value"""
+    lid = entity["id"]
+    claims = entity.get("claims", {})
+    rows = dict(
+        lexemes=[(
+            lid,
+            entity["language"],
+            entity["lexicalCategory"],
+            int(len(excluded_instances.intersection(
+                claim_values(claims, "P31")
+            )) > 0),
+            int("P5831" in claims),
+            entity.get("lastrevid"),
+        )],
+        representations=[],
+        grammatical_features=[],
+        senses=[],
+        glosses=[],
+    )
+    for form in entity.get("forms", []):
+        for representation in form["representations"].values():
+            rows["representations"].append((
+                form["id"], lid, representation["language"],
+                representation["value"]
+            ))
+        for feature in form["grammaticalFeatures"]:
+            rows["grammatical_features"].append((form["id"], feature))
+    for sense in entity.get("senses", []):
+        rows["senses"].append((
+            sense["id"], lid, int("P5137" in sense.get("claims", {}))
+        ))
+        for gloss in sense["glosses"].values():
+            rows["glosses"].append(
+                (sense["id"], gloss["language"], gloss["value"])
+            )
+    return rows
+
+
+def import_dump(filename, database=None, batch_size=10000):
+    """Builds the database from the dump. The new database replaces the old
+    one only when the import is complete"""
+    if database is None:
+        database = config.lexeme_dump_database
+    tmp_database = database + ".tmp"
+    if os.path.isfile(tmp_database):
+        os.remove(tmp_database)
+    connection = sqlite3.connect(tmp_database)
+    connection.executescript(schema)
+    columns = dict(
+        lexemes=6, representations=4, grammatical_features=2, senses=3,
+        glosses=3
+    )
+    batch = {table: [] for table in columns}
+    count = 0
+
+    def flush():
+        for table in batch:
+            placeholders = ", ".join(["?"] * columns[table])
+            connection.executemany(
+                f"INSERT INTO {table} VALUES ({placeholders})", batch[table]
+            )
+            batch[table] = []
+        connection.commit()
+
+    print(f"Importing lexemes from {filename}")
+    for entity in iterate_dump(filename):
+        if entity.get("type") != "lexeme":
+            continue
+        rows = entity_rows(entity)
+        for table in rows:
+            batch[table].extend(rows[table])
+        count += 1
+        if count % batch_size == 0:
+            flush()
+            logger.info("Imported %d lexemes", count)
+    flush()
+    print("Building indexes")
+    connection.executescript(indexes)
+    connection.close()
+    os.replace(tmp_database, database)
+    print(f"Imported {count} lexemes into {database}")
+    return count
+
+
+# Opened on first use in every thread, e.g. the request threads of the
+# daemon, because sqlite connections cannot be shared between threads
+local = threading.local()
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        if not os.path.isfile(config.lexeme_dump_database):
+            print(f"Error. {config.lexeme_dump_database} was not found. " +
+                  "Import a lexeme dump with lexeme_dump.py first.")
+            exit(1)
+        local.connection = sqlite3.connect(config.lexeme_dump_database)
+    return local.connection
+
+
+def fetch_lexeme_forms(context):
+    """Returns a list of Form. Same result as util.fetch_lexeme_forms()"""
+    rows = get_connection().execute("""
+    SELECT DISTINCT l.lid, r.form_id, r.word, l.category
+    FROM lexemes l
+    JOIN representations r ON r.lid = l.lid
+    WHERE l.language = ?
+    AND l.excluded = 0
+    -- This remove all lexemes with at least one example which is not ideal
+    AND l.has_example = 0
+    AND EXISTS (
+        SELECT 1 FROM senses s WHERE s.lid = l.lid AND s.has_p5137 = 1
+    )
+    AND EXISTS (
+        SELECT 1 FROM grammatical_features g WHERE g.form_id = r.form_id
+    )
+    ORDER BY l.lid, r.form_id
+    LIMIT ? OFFSET ?
+    """, (
+        context.language_qid, config.sparql_results_size, config.sparql_offset
+    ))
+    return [
+        Form(
+            lid=lid,
+            form_id=form_id,
+            word=word,
+            category=category_labels.get(category, category)
+        )
+        for lid, form_id, word, category in rows
+    ]
+
+
+def fetch_senses(context, lid):
+    """Returns dictionary with numbers as keys and a Sense as value"""
+    rows = get_connection().execute("""
+    SELECT s.sense_id, g.gloss
+    FROM senses s
+    JOIN glosses g ON g.sense_id = s.sense_id
+    WHERE s.lid = ? AND s.has_p5137 = 1 AND g.language = ?
+    ORDER BY s.sense_id
+    """, (lid, context.language_code))
+    senses = {}
+    number = 1
+    for sense_id, gloss in rows:
+        senses[number] = Sense(sense_id=sense_id, gloss=gloss)
+        number += 1
+    return senses
+
+
+def count_number_of_senses_with_P5137(context, lid):
+    """Returns the number of senses with P5137 and a gloss in the language of
+    the context"""
+    row = get_connection().execute("""
+    SELECT COUNT(DISTINCT s.sense_id)
+    FROM senses s
+    JOIN glosses g ON g.sense_id = s.sense_id
+    WHERE s.lid = ? AND s.has_p5137 = 1 AND g.language = ?
+    """, (lid, context.language_code)).fetchone()
+    return row[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import a Wikidata lexemes JSON dump"
+    )
+    parser.add_argument("dump", help="Path to latest-lexemes.json.bz2")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    import_dump(args.dump)
+
+
+if __name__ == "__main__":
+    main()
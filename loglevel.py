@@ -1,26 +1,99 @@
 #!/usr/bin/env python3
 import argparse
+import atexit
 import logging
+import logging.handlers
+import queue
 
 import config
 
+# All modules log through one QueueHandler. A QueueListener thread does the
+# slow file writing so logging never blocks the scan and cleaning loops.
+log_queue = queue.Queue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+listener = None
+
 
 def set_loglevel():
-    parser = argparse.ArgumentParser()
+    # Without help so --help reaches the parser of the script
+    parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument(
         "-l",
         "--log",
         help="Loglevel",
     )
-    args = parser.parse_args()
+    # Scripts with their own arguments parse them themselves
+    args, unknown = parser.parse_known_args()
     loglevel = args.log
     if loglevel:
-        numeric_level = getattr(logging, loglevel.upper(), None)
-        if not isinstance(numeric_level, int):
-            raise ValueError('Invalid log level: %s' % loglevel)
-        config.loglevel = numeric_level
-        print(f"Config loglevel set to {numeric_level}")
+        config.loglevel = numeric_level(loglevel)
+        print(f"Config loglevel set to {config.loglevel}")
     else:
         # default to warning
         print("Setting loglevel to 40 in config")
         config.loglevel = 40
+
+
+def numeric_level(loglevel):
+    """Returns the number of a level name like debug"""
+    level = getattr(logging, loglevel.upper(), None)
+    if not isinstance(level, int):
+        raise ValueError('Invalid log level: %s' % loglevel)
+    return level
+
+
+def set_level(loglevel):
+    """Sets the level in config and on every logger that is already
+    created. Scripts call this with the level they parsed"""
+    config.loglevel = numeric_level(loglevel)
+    for logger in logging.Logger.manager.loggerDict.values():
+        if (
+                isinstance(logger, logging.Logger) and
+                queue_handler in logger.handlers
+        ):
+            logger.setLevel(config.loglevel)
+
+
+class ModuleFileHandler(logging.Handler):
+    """Writes the records of each module to <module>.log like the per module
+    FileHandlers did before. Only used from the listener thread."""
+    def __init__(self):
+        super().__init__()
+        self.file_handlers = {}
+
+    def emit(self, record):
+        name = record.name.split(".")[0]
+        if name not in self.file_handlers:
+            self.file_handlers[name] = logging.FileHandler(f"{name}.log")
+        self.file_handlers[name].emit(record)
+
+    def close(self):
+        for file_handler in self.file_handlers.values():
+            file_handler.close()
+        super().close()
+
+
+def start_listener():
+    global listener
+    if listener is None:
+        listener = logging.handlers.QueueListener(
+            log_queue, ModuleFileHandler()
+        )
+        listener.start()
+        # Flush what is left in the queue when the script ends
+        atexit.register(listener.stop)
+
+
+def get_logger(name):
+    """Returns a logger that writes to <name>.log via the shared queue. Use
+    %-style arguments so messages are only formatted if they are logged"""
+    if config.loglevel is None:
+        # Set loglevel
+        print("Setting loglevel in config")
+        set_loglevel()
+    start_listener()
+    logger = logging.getLogger(name)
+    logger.setLevel(config.loglevel)
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
+    return logger
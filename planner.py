@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import json
+import math
+import os.path
+import sqlite3
+import threading
+from collections import Counter
+
+import config
+import loglevel
+
+# Decides which sources to ask for which forms and how many Riksdagen result
+# pages to download. The local Europarl corpus is cheap to search but only
+# useful for words that occur in it. Riksdagen is slow, so it is only asked
+# for forms where Europarl is not expected to give enough good candidates,
+# and only for as many pages as are expected to download in
+# config.planner_max_seconds so the first good candidate is not kept waiting.
+#
+# The decision uses
+#   a word frequency table of the corpus: the number of eligible lines every
+#   word occurs in, saved next to the corpus
+#   statistics of every source: candidates returned, pages fetched, seconds
+#   spent, and how many of the presented sentences were accepted, saved in
+#   the sqlite database config.planner_stats
+#
+# The frequency table is built by build_corpora.py. plan() builds it if it is
+# missing, so it is run in a thread and not on the event loop.
+
+logger = loglevel.get_logger(__name__)
+
+# Used until a source has returned anything
+default_candidates_per_page = 2
+riksdagen_page_size = 20
+
+# Loaded frequency tables by corpus filename
+frequencies = {}
+# Opened on first use in every thread
+local = threading.local()
+
+
+def frequency_filename(txt_filename):
+    return txt_filename.replace(".txt", ".frequencies.json")
+
+
+def build_frequencies(txt_filename):
+    """Counts the eligible lines every word occurs in. Words are split like
+    in europarl.find_lines()"""
+    # Imported here so a client of the daemon does not load numpy
+    import features
+    print(f"Counting word frequencies in {txt_filename}")
+    table = features.load_table(txt_filename)
+    eligible = None
+    if table is not None:
+        eligible = features.eligible_mask(table).tolist()
+    counts = Counter()
+    # Split on \n only so the numbers match the feature table
+    with open(txt_filename, 'r', encoding='utf-8', newline='\n') as f:
+        for number, line in enumerate(f):
+            if eligible is not None and not eligible[number]:
+                continue
+            counts.update(set(line.split(" ")[1:-1]))
+    stat = os.stat(txt_filename)
+    with open(frequency_filename(txt_filename), 'w', encoding='utf-8') as f:
+        json.dump(dict(
+            source=[stat.st_size, int(stat.st_mtime)],
+            counts=counts,
+        ), f, ensure_ascii=False)
+    logger.info("Counted %d words", len(counts))
+    return counts
+
+
+def get_frequencies(txt_filename):
+    """Returns the frequency table of the corpus or None if the corpus has
+    not been downloaded yet. The table is rebuilt when the corpus changes"""
+    if txt_filename in frequencies:
+        return frequencies[txt_filename]
+    if not os.path.isfile(txt_filename):
+        return None
+    filename = frequency_filename(txt_filename)
+    stat = os.stat(txt_filename)
+    counts = None
+    if os.path.isfile(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data["source"] == [stat.st_size, int(stat.st_mtime)]:
+            counts = data["counts"]
+    if counts is None:
+        counts = build_frequencies(txt_filename)
+    frequencies[txt_filename] = counts
+    return counts
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        local.connection = sqlite3.connect(config.planner_stats, timeout=30)
+        local.connection.row_factory = sqlite3.Row
+        local.connection.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "source TEXT PRIMARY KEY, "
+            "queries INTEGER NOT NULL DEFAULT 0, "
+            "pages INTEGER NOT NULL DEFAULT 0, "
+            "candidates INTEGER NOT NULL DEFAULT 0, "
+            "seconds REAL NOT NULL DEFAULT 0, "
+            "presented INTEGER NOT NULL DEFAULT 0, "
+            "accepted INTEGER NOT NULL DEFAULT 0)"
+        )
+    return local.connection
+
+
+def source_stats(name):
+    """Returns a dictionary with the statistics of the source"""
+    row = get_connection().execute(
+        "SELECT * FROM stats WHERE source = ?", (name,)
+    ).fetchone()
+    if row is None:
+        return dict(
+            queries=0, pages=0, candidates=0, seconds=0.0, presented=0,
+            accepted=0,
+        )
+    return {key: row[key] for key in row.keys() if key != "source"}
+
+
+def add_stats(name, **increments):
+    """Adds to the counters in the database, so the daemon and its clients
+    can all record statistics without overwriting each other"""
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR IGNORE INTO stats (source) VALUES (?)", (name,)
+    )
+    connection.execute(
+        "UPDATE stats SET " +
+        ", ".join(f"{column} = {column} + ?" for column in increments) +
+        " WHERE source = ?", (*increments.values(), name)
+    )
+    connection.commit()
+
+
+def record_query(name, seconds, candidates, pages=None):
+    """Call this after a source answered"""
+    add_stats(
+        name, queries=1, seconds=seconds, candidates=candidates,
+        pages=pages or 0,
+    )
+
+
+def record_review(name, accepted):
+    """Call this after a sentence from the source was presented"""
+    add_stats(name, presented=1, accepted=int(accepted))
+
+
+def acceptance_rate(name):
+    """Share of presented sentences that were accepted with a prior of one
+    accepted out of two"""
+    entry = source_stats(name)
+    return (entry["accepted"] + 1) / (entry["presented"] + 2)
+
+
+def candidates_per_page(name):
+    entry = source_stats(name)
+    if entry["pages"] == 0:
+        return default_candidates_per_page
+    return max(entry["candidates"] / entry["pages"], 0.1)
+
+
+def seconds_per_page(name):
+    """Returns the average seconds of a page or None before the first"""
+    entry = source_stats(name)
+    if entry["pages"] == 0:
+        return None
+    return entry["seconds"] / entry["pages"]
+
+
+def riksdagen_pages(missing, europarl_expected):
+    """Returns the number of pages to download to get missing accepted
+    sentences within the time budget when Europarl is expected to give
+    europarl_expected of them. 0 means skip Riksdagen"""
+    name = "riksdagen"
+    pages = math.ceil(
+        missing / (acceptance_rate(name) * candidates_per_page(name))
+    )
+    latency = seconds_per_page(name)
+    if latency is not None and latency > 0:
+        affordable = math.floor(config.planner_max_seconds / latency)
+        if affordable == 0 and europarl_expected >= 1:
+            # Europarl is faster and expected to give a good candidate
+            return 0
+        # Always at least one page if nothing else is expected
+        pages = min(pages, max(affordable, 1))
+    return pages
+
+
+def plan(context, forms, source_names):
+    """Returns a dictionary with source name as key and a tuple with the
+    forms to ask the source for and the maximum number of pages (or None) as
+    value. Sources that are not needed are left out"""
+    if not config.planner:
+        return {name: (forms, None) for name in source_names}
+    target = config.planner_target_candidates
+    counts = None
+    if "europarl" in source_names:
+        counts = get_frequencies(context.data_filename)
+    # The table only counts the words between spaces. The indexes also find
+    # forms first in a line or next to punctuation, and the suffix array
+    # ignores case, so a word that is not in the table may still be found.
+    indexed = config.europarl_suffix_array or config.europarl_token_index
+    expected = {}
+    for data in forms:
+        if "europarl" not in source_names:
+            expected[data.form_id] = 0
+        elif (
+                counts is None or " " in data.word or
+                (indexed and counts.get(data.word, 0) == 0)
+        ):
+            # Unknown, so Europarl is asked but not counted on and
+            # Riksdagen is asked for the whole target
+            expected[data.form_id] = None
+        else:
+            expected[data.form_id] = (
+                counts.get(data.word, 0) * acceptance_rate("europarl")
+            )
+    plans = {}
+    for name in source_names:
+        if name == "europarl":
+            needed = [
+                data for data in forms if expected[data.form_id] != 0
+            ]
+            if len(needed) > 0:
+                plans[name] = (needed, None)
+        elif name == "riksdagen":
+            pages = 0
+            needed = []
+            for data in forms:
+                missing = target - (expected[data.form_id] or 0)
+                if missing <= 0:
+                    continue
+                form_pages = riksdagen_pages(
+                    missing, expected[data.form_id] or 0
+                )
+                if form_pages == 0:
+                    continue
+                needed.append(data)
+                pages = max(pages, form_pages)
+            maximum = math.ceil(
+                config.riksdagen_max_results_size / riksdagen_page_size
+            )
+            if len(needed) > 0:
+                plans[name] = (needed, min(pages, maximum))
+        else:
+            plans[name] = (forms, None)
+    for name in source_names:
+        if name in plans:
+            logger.info("Asking %s for %d forms with %s pages", name,
+                        len(plans[name][0]), plans[name][1])
+        else:
+            logger.info("Skipping %s", name)
+    return plans
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import sys
+from typing import NamedTuple, Optional
+
+# Compact record types used through the whole pipeline instead of dicts.
+# NamedTuples have no per instance __dict__ so they are much smaller than the
+# nested JSON dicts returned by the APIs.
+
+# Constants are interned so every record points to the same string object
+EUROPARL = sys.intern("europarl")
+RIKSDAGEN = sys.intern("riksdagen")
+KSAMSOK = sys.intern("ksamsok")
+FORMAL = sys.intern("formal")
+INFORMAL = sys.intern("informal")
+WRITTEN = sys.intern("written")
+ORAL = sys.intern("oral")
+# Riksdagen documents are found at this URL followed by the document id
+RIKSDAGEN_DOCUMENT_URL = "https://data.riksdagen.se/dokument/"
+
+
+class Form(NamedTuple):
+    """A lexeme form to find usage examples for"""
+    lid: str
+    form_id: str
+    word: str
+    category: str
+
+    @property
+    def word_spaces(self):
+        return " " + self.word + " "
+
+    @property
+    def word_angle_parens(self):
+        return ">" + self.word + "<"
+
+
+class Sense(NamedTuple):
+    sense_id: str
+    gloss: str
+
+
+class Candidate(NamedTuple):
+    """Metadata about where a candidate sentence was found"""
+    source: str
+    language_style: str = FORMAL
+    type_of_reference: str = WRITTEN
+    line: Optional[int] = None
+    document_id: Optional[str] = None
+    date: Optional[str] = None
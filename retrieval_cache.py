@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import config
+import loglevel
+from records import Candidate
+
+# The candidates a source finds only depend on the word and not on the
+# lexeme, so homographs and forms shared by several lexemes only have to be
+# searched once. Results are cached by (language, word, source, version)
+# where the version is given by the source, e.g. the size and modification
+# time of the corpus, so a new corpus makes the old entries unused. The most
+# recently used words are kept in memory and optionally in an sqlite
+# database that survives restarts.
+
+logger = loglevel.get_logger(__name__)
+
+# Least recently used first
+memory = OrderedDict()
+
+# Opened on first use in every thread, e.g. the request threads of the
+# daemon, because sqlite connections cannot be shared between threads
+local = threading.local()
+
+
+def get_connection():
+    if getattr(local, "connection", None) is None:
+        local.connection = sqlite3.connect(config.retrieval_cache_database)
+        local.connection.execute(
+            "CREATE TABLE IF NOT EXISTS retrievals ("
+            "language TEXT NOT NULL, "
+            "word TEXT NOT NULL, "
+            "source TEXT NOT NULL, "
+            "version TEXT NOT NULL, "
+            "json TEXT NOT NULL, "
+            "PRIMARY KEY (language, word, source, version))"
+        )
+    return local.connection
+
+
+def remember(key, records):
+    memory[key] = records
+    memory.move_to_end(key)
+    while len(memory) > config.retrieval_cache_size:
+        memory.popitem(last=False)
+
+
+def get(key):
+    """Returns the cached dictionary with sentences as key and Candidate as
+    value or None"""
+    if key in memory:
+        memory.move_to_end(key)
+        return memory[key]
+    if not config.retrieval_cache_database:
+        return None
+    row = get_connection().execute(
+        "SELECT json FROM retrievals WHERE language = ? AND word = ? AND "
+        "source = ? AND version = ?", key
+    ).fetchone()
+    if row is None:
+        return None
+    records = {
+        sentence: Candidate(*values)
+        for sentence, values in json.loads(row[0]).items()
+    }
+    remember(key, records)
+    return records
+
+
+def put(key, records):
+    remember(key, records)
+    if not config.retrieval_cache_database:
+        return
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR REPLACE INTO retrievals VALUES (?, ?, ?, ?, ?)",
+        key + (json.dumps(
+            {sentence: list(records[sentence]) for sentence in records},
+            ensure_ascii=False
+        ),)
+    )
+    connection.commit()
+
+
+def lookup(context, source, version, forms):
+    """Returns a tuple with the cached records by form_id and a list of the
+    forms that have to be searched"""
+    records = {}
+    missing = []
+    for data in forms:
+        cached = get((context.language_code, data.word, source, version))
+        if cached is None:
+            missing.append(data)
+        else:
+            records[data.form_id] = cached
+    if len(records) > 0:
+        logger.info("Got %d forms from the %s retrieval cache", len(records),
+                    source)
+    return records, missing
+
+
+def store(context, source, version, forms, records):
+    """Caches the records by form_id that the source returned for the
+    forms"""
+    for data in forms:
+        if data.form_id in records:
+            put(
+                (context.language_code, data.word, source, version),
+                records[data.form_id]
+            )
@@ -1,82 +1,103 @@
 #!/usr/bin/env python3
 import asyncio
 import logging
+import math
 import re
-import httpx
 
 import config
+import docstore
+import features
+import http_client
+import json_stream
 import loglevel
-import util
+from records import RIKSDAGEN, RIKSDAGEN_DOCUMENT_URL, Candidate
 
-logger = logging.getLogger(__name__)
-if config.loglevel is None:
-    # Set loglevel
-    loglevel.set_loglevel()
-logger.setLevel(config.loglevel)
-logger.level = logger.getEffectiveLevel()
-file_handler = logging.FileHandler("riksdagen.log")
-logger.addHandler(file_handler)
+logger = loglevel.get_logger(__name__)
 
 # Constants
-baseurl = "https://data.riksdagen.se/dokument/"
+baseurl = RIKSDAGEN_DOCUMENT_URL
 
 
-def get_result_count(word):
+def build_query(words):
+    """Returns a search string matching any of the words"""
+    return " OR ".join(sorted(set(words)))
+
+
+async def get_result_count(query):
     # First find out the number of results
-    url = (f"http://data.riksdagen.se/dokumentlista/?sok={word}" +
+    url = (f"http://data.riksdagen.se/dokumentlista/?sok={query}" +
            "&sort=rel&sortorder=desc&utformat=json&a=s&p=1")
-    r = httpx.get(url)
-    data = r.json()
+    r = await http_client.async_get(url)
+    data = json_stream.loads(r.content)
     results = int(data["dokumentlista"]["@traffar"])
-    logging.info(f"results:{results}")
+    logger.info("results:%d", results)
     return results
 
 
-async def async_fetch(word):
-    # This function is called for every task.
-    async def get(url, session):
-        """Accepts a url and a httpx session"""
-        response = await session.get(url)
-        return response
+# The fields of the dokument entries that are used
+record_fields = json_stream.keep_fields(["id", "summary", "datum"])
+
+
+async def fetch_page(url):
+    """Returns the records of one result page. Only the fields we use are
+    kept of every dokument entry and they are parsed while the page is
+    still being downloaded"""
+    for attempt in range(config.http_retries + 1):
+        async with http_client.async_stream("GET", url) as response:
+            delay = http_client.retry_after(response)
+            if delay is not None and attempt < config.http_retries:
+                logger.info("Riksdagen is busy. Retrying in %s seconds",
+                            delay)
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code != 200:
+                logger.warning("Got %d from %s", response.status_code, url)
+                return []
+            # Pages without hits have no dokument list
+            return [
+                record async for record in json_stream.async_iterate_items(
+                    response.aiter_bytes(), ("dokumentlista", "dokument"),
+                    trim=record_fields
+                )
+            ]
 
+
+async def async_fetch(query, pages=None):
+    """Returns a list with the records of every result page"""
     # Get total results count
-    results = get_result_count(word)
+    results = await get_result_count(query)
     # Generate the urls
     if results > config.riksdagen_max_results_size:
         results = config.riksdagen_max_results_size
+    if pages is not None and results > pages * 20:
+        results = pages * 20
     # generate urls
     urls = []
     # divide by 20 to know how many requests to send
-    for i in range(1, int(results / 20)):
-        urls.append(f"http://data.riksdagen.se/dokumentlista/?sok={word}" +
+    for i in range(1, math.ceil(results / 20) + 1):
+        urls.append(f"http://data.riksdagen.se/dokumentlista/?sok={query}" +
                     f"&sort=rel&sortorder=desc&utformat=json&a=s&p={i}")
-    logging.debug(f"urls:{urls}")
-    # get urls asynchroniously
-    # inspired by https://trio.readthedocs.io/en/stable/tutorial.html
-    async with httpx.AsyncClient() as session:
-        logger.info("Gathering tasks.")
-        # inspired by https://stackoverflow.com/questions/56161595/
-        # how-to-use-async-for-in-python
-        results = await asyncio.gather(*[get(url, session) for url in urls])
-        logger.info(f"All {len(results)} tasks done")
-        return results
+    logger.debug("urls:%s", urls)
+    # get urls asynchroniously on the pooled client which also rate limits
+    # them
+    logger.info("Gathering tasks.")
+    # inspired by https://stackoverflow.com/questions/56161595/
+    # how-to-use-async-for-in-python
+    results = await asyncio.gather(*[fetch_page(url) for url in urls])
+    logger.info("All %d tasks done", len(results))
+    return results
 
 
-def process_async_responses(word):
+async def process_async_responses(query, pages=None):
     print("Downloading from the Riksdagen API...")
-    results = asyncio.run(async_fetch(word))
+    results = await async_fetch(query, pages=pages)
     records = []
-    for response in results:
-        data = response.json()
-        # check if dokument is in the list
-        key_list = list(data["dokumentlista"].keys())
-        if "dokument" in key_list:
-            for item in data["dokumentlista"]["dokument"]:
-                records.append(item)
+    for page in results:
+        records.extend(page)
     print("Download done")
-    logger.info(f"Got {len(records)} records from the Riksdagen API")
+    logger.info("Got %d records from the Riksdagen API", len(records))
     if config.debug_json:
-        logger.debug(f"records:{records}")
+        logger.debug("records:%s", records)
     return records
 
 
@@ -147,44 +168,21 @@ def find_usage_examples_from_summary(
         print("Sentences after duplicate removal " +
               f"{sentences_without_duplicates}")
     suitable_sentences = []
-    for sentence in sentences_without_duplicates:
-        exclude_this_sentence = False
-        # Exclude based on lenght of the sentence
-        word_count = util.count_words(sentence)
-        if (
-                word_count > config.max_word_count or word_count <
-                config.min_word_count
-        ):
-            exclude_this_sentence = True
-            # Exclude by breaking out of the iteration early
-            break
-        else:
-            # Exclude based on weird words
-            excluded_words = [
-                "SAMMANFATTNING",
-                "BETÄNKANDE",
-                "UTSKOTT",
-                "MOTION",
-                " EG ",
-                " EU ",
-                "RIKSDAGEN",
-            ]
-            for excluded_word in excluded_words:
-                result = sentence.upper().find(excluded_word)
-                if result != -1:
-                    if config.debug_excludes:
-                        sentence = (sentence
-                                    .replace("\n", "")
-                                    .replace("-", "")
-                                    .replace(ellipsis, ""))
-                        logging.debug(
-                            f"Found excluded word {excluded_word} " +
-                            f"in {sentence}. Skipping",
-                        )
-                    exclude_this_sentence = True
-                    break
+    # Exclude based on lenght of the sentence and weird words in one
+    # vectorized pass
+    eligible = features.eligible_sentences(sentences_without_duplicates)
+    for sentence, exclude_this_sentence in zip(
+            sentences_without_duplicates, [not e for e in eligible]
+    ):
+        if exclude_this_sentence:
+            if config.debug_excludes and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Found excluded word or wrong length in %s. Skipping",
+                    sentence.replace("\n", "")
+                )
+            continue
         # Add space to match better
-        if word_spaces in sentence and exclude_this_sentence is False:
+        if word_spaces in sentence:
             # restore the t.ex.
             sentence = sentence.replace("xxx", "t.ex.")
             sentence = sentence.replace("yyy", "m.m")
@@ -199,7 +197,7 @@ def find_usage_examples_from_summary(
                         .replace(ellipsis, "")
                         .replace("  ", " "))
             if config.debug_sentences:
-                logging.debug(f"suitable_sentence:{sentence}")
+                logger.debug("suitable_sentence:%s", sentence)
             suitable_sentences.append(sentence)
     return suitable_sentences
 
@@ -207,16 +205,16 @@ def find_usage_examples_from_summary(
 def extract_summaries_from_records(records, data):
     # TODO look for more examples from riksdagen if none in the first set of
     # results fit our purpose
-    word_spaces = data["word_spaces"]
-    word_angle_parens = data["word_angle_parens"]
-    word = data["word"]
+    word_spaces = data.word_spaces
+    word_angle_parens = data.word_angle_parens
+    word = data.word
     count_inexact_hits = 1
     count_exact_hits = 1
     count_summary = 1
     summaries = {}
     for record in records:
         if config.debug_summaries:
-            logging.info(f"Working of record number {count_summary}")
+            logger.info("Working of record number %d", count_summary)
         summary = record["summary"]
         # This is needed by present_sentence() and add_usage_example()
         # downstream
@@ -233,9 +231,12 @@ def extract_summaries_from_records(records, data):
             print(
                 f"Found in https://data.riksdagen.se/dokument/{document_id}"
             )
-        record_data = {}
-        record_data["document_id"] = document_id
-        record_data["date"] = date
+        # Every sentence of this summary shares the same Candidate
+        record_data = Candidate(
+            source=RIKSDAGEN,
+            document_id=document_id,
+            date=date,
+        )
         # match only the exact word
         added = False
         if word in summary:
@@ -244,14 +245,14 @@ def extract_summaries_from_records(records, data):
                 count_exact_hits += 1
                 # add to dictionary
                 if config.debug_summaries:
-                    logging.debug(
-                        f"found word_spaces or word_angle_parens in {summary}"
+                    logger.debug(
+                        "found word_spaces or word_angle_parens in %s", summary
                     )
                 summaries[summary] = record_data
                 added = True
             else:
                 if config.debug_summaries:
-                    logging.info("No exact hit in summary. Skipping.")
+                    logger.info("No exact hit in summary. Skipping.")
         else:
             if config.debug_summaries and added is False:
                 print(f"'{word}' not found as part of a word or a " +
@@ -261,38 +262,121 @@ def extract_summaries_from_records(records, data):
     #     logging.debug(f"summaries:{summaries}")
     print(f"Processed {count_summary} records and found " +
           f"{count_exact_hits} exact hits for the form '{word}'")
-    logging.info(f"among {count_inexact_hits} where the lexeme was present.")
+    logger.info("among %d where the lexeme was present.", count_inexact_hits)
     return summaries
 
 
-def get_records(data):
-    word = data["word"]
-    records = process_async_responses(word)
+def get_records(forms):
+    """Returns a dictionary with form_id as key and a dictionary with
+    sentences as key and result data as value. The words are looked up
+    concurrently"""
+    return http_client.run(async_get_records(forms))
+
+
+async def async_get_records(forms, pages=None):
+    """Coroutine version of get_records() used by the sources module. At
+    most pages of 20 results are downloaded per word if given. Every word has
+    its own query so its records do not depend on the other words and can be
+    cached per word"""
+    words = sorted(set(data.word for data in forms))
+    results = await asyncio.gather(*[
+        process_async_responses(build_query([word]), pages=pages)
+        for word in words
+    ])
+    records_by_word = dict(zip(words, results))
+    sentences_by_form = {}
+    for data in forms:
+        sentences_by_form[data.form_id] = get_sentences_from_records(
+            records_by_word[data.word], data
+        )
+    if config.riksdagen_full_text:
+        # A document found for several words is only fetched and
+        # decompressed once
+        records = list({
+            record["id"]: record for word in words
+            for record in records_by_word[word]
+        }.values())
+        # Documents fetched once are reused for every later lexeme
+        await docstore.fetch_texts(
+            [record["id"] for record in records], baseurl
+        )
+        # Decompressing and searching the full texts would block the event
+        # loop
+        loop = asyncio.get_running_loop()
+        from_documents = await loop.run_in_executor(
+            None, get_sentences_from_documents, records, forms
+        )
+        for data in forms:
+            # Only the documents found for the word itself
+            document_ids = set(
+                record["id"] for record in records_by_word[data.word]
+            )
+            for sentence, result_data in (
+                    from_documents[data.form_id].items()
+            ):
+                if result_data.document_id in document_ids:
+                    sentences_by_form[data.form_id][sentence] = result_data
+    return sentences_by_form
+
+
+def get_sentences_from_records(records, data):
+    """Returns a dictionary with sentences as key and Candidate as value"""
+    unsorted_sentences = {}
     if records is not None:
         if config.debug:
             print("Looping through records from Riksdagen")
         summaries = extract_summaries_from_records(records, data)
-        unsorted_sentences = {}
         # Iterate through the dictionary
         for summary in summaries:
-            # Get result_data
+            # Get result_data which already has information about the source
+            # (written,oral) and (formal,informal)
             result_data = summaries[summary]
-            # Add information about the source (written,oral) and
-            # (formal,informal)
-            result_data["language_style"] = "formal"
-            result_data["type_of_reference"] = "written"
-            result_data["line"] = None
-            result_data["source"] = "riksdagen"
             # document_id = result_data["document_id"]
             # if config.debug_summaries:
             #     print(f"Got back summary {summary} with the " +
             #           f"correct document_id: {document_id}?")
             suitable_sentences = find_usage_examples_from_summary(
-                word_spaces=data["word_spaces"],
+                word_spaces=data.word_spaces,
                 summary=summary
             )
             if len(suitable_sentences) > 0:
                 for sentence in suitable_sentences:
                     # Make sure the riksdagen_document_id follows
                     unsorted_sentences[sentence] = result_data
-        return unsorted_sentences
+    return unsorted_sentences
+
+
+def get_sentences_from_documents(records, forms):
+    """Returns a dictionary with form_id as key and a dictionary with
+    sentences from the full text of the documents as key and Candidate as
+    value. Every text is decompressed once and searched for all the forms"""
+    sentences_by_form = {data.form_id: {} for data in forms}
+    for record in records:
+        text = docstore.get_text(record["id"])
+        if text is None:
+            continue
+        result_data = Candidate(
+            source=RIKSDAGEN,
+            document_id=record["id"],
+            date=record["datum"],
+        )
+        paragraphs = None
+        for data in forms:
+            if data.word_spaces not in text:
+                continue
+            if paragraphs is None:
+                paragraphs = text.split("\n\n")
+            # Only clean the paragraphs where the word is present. Full texts
+            # can be very long.
+            for paragraph in paragraphs:
+                if data.word_spaces not in paragraph:
+                    continue
+                for sentence in find_usage_examples_from_summary(
+                        word_spaces=data.word_spaces,
+                        summary=paragraph
+                ):
+                    sentences_by_form[data.form_id][sentence] = result_data
+    for data in forms:
+        logger.info("Found %d sentences in full texts for the form '%s'",
+                    len(sentences_by_form[data.form_id]), data.word)
+    return sentences_by_form
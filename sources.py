@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import asyncio
+import datetime
+import os.path
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import config
+from context import europarl_languages
+import download_data
+import europarl
+import http_client
+import ksamsok
+import loglevel
+import planner
+import retrieval_cache
+import riksdagen
+
+# Sentence sources all share the same interface so they can be run
+# concurrently. To add a new source subclass Source, implement get_records()
+# and add an instance to the sources dictionary at the end of this file.
+#
+# The records of all sources are returned together once every source has
+# answered or timed out, so a fast source waits for the slowest one. Sources
+# that run in the executor get a deadline and stop at it since the executor
+# cannot cancel work that has started.
+
+logger = loglevel.get_logger(__name__)
+
+# Created on first use and kept for the whole session
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        if config.source_executor == "process":
+            executor = ProcessPoolExecutor()
+        else:
+            executor = ThreadPoolExecutor()
+    return executor
+
+
+def sentence_settings():
+    """Returns a string with the settings that decide which sentences are
+    eligible, for the versions of the sources that filter with them"""
+    return (
+        f"{config.min_word_count}-{config.max_word_count}-" +
+        f"{config.require_quality_sentences}"
+    )
+
+
+class Source:
+    """Base class of all sentence sources"""
+    name = None
+    # Language codes supported by this source
+    languages = []
+
+    def enabled(self, context):
+        return (
+            self.name in config.sources and
+            context.language_code in self.languages
+        )
+
+    def timeout(self):
+        return config.source_timeouts.get(self.name)
+
+    def deadline(self):
+        """Returns the time (seconds since the epoch, so it works in other
+        processes) when work in the executor should stop or None"""
+        timeout = self.timeout()
+        if timeout is None:
+            return None
+        return time.time() + timeout
+
+    def version(self, context, forms):
+        """Returns a string that changes when the source can return other
+        records for the same word or None if the records should not be
+        cached. It has to cover every setting that changes the records"""
+        return None
+
+    async def get_records(self, context, forms, pages=None):
+        """Returns a dictionary with form_id as key and a dictionary with
+        sentences as key and Candidate as value. Sources that download
+        results in pages fetch at most pages of them"""
+        raise NotImplementedError
+
+
+def get_europarl_records(context, forms, deadline=None):
+    # This runs in the executor so it has to be a module level function
+    download_data.fetch(context)
+    return europarl.get_records(context, forms, deadline=deadline)
+
+
+class EuroparlSource(Source):
+    """Scans the local Europarl corpus. This is CPU bound so we offload it
+    to the executor to keep the event loop free for the API sources"""
+    name = "europarl"
+    # Build the corpora of other languages with build_corpora.py
+    languages = list(europarl_languages)
+
+    def version(self, context, forms):
+        # The corpus is only known after it has been downloaded
+        if not os.path.isfile(context.data_filename):
+            return None
+        stat = os.stat(context.data_filename)
+        return (
+            f"{stat.st_size}-{int(stat.st_mtime)}-{sentence_settings()}-" +
+            f"{config.europarl_suffix_array}-{config.europarl_token_index}"
+        )
+
+    async def get_records(self, context, forms, pages=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), get_europarl_records, context, forms,
+            self.deadline()
+        )
+
+
+class RiksdagenSource(Source):
+    name = "riksdagen"
+    languages = ["sv"]
+
+    def version(self, context, forms):
+        # Every word is searched with its own query, so the same form of
+        # another lexeme reuses its records. New documents are added every
+        # day.
+        return (
+            f"{datetime.date.today().isoformat()}-" +
+            f"{config.riksdagen_full_text}-{sentence_settings()}"
+        )
+
+    async def get_records(self, context, forms, pages=None):
+        return await riksdagen.async_get_records(forms, pages=pages)
+
+
+class KsamsokSource(Source):
+    """Searches the local store harvested with ksamsok.py"""
+    name = "ksamsok"
+    languages = ["sv"]
+
+    def enabled(self, context):
+        return super().enabled(context) and ksamsok.exists()
+
+    def version(self, context, forms):
+        return ksamsok.version()
+
+    async def get_records(self, context, forms, pages=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), ksamsok.get_records, context, forms,
+            self.deadline()
+        )
+
+
+async def run_source(source, context, forms, pages=None):
+    """Returns a tuple with the source and its records. Words that have been
+    searched before are taken from the retrieval cache. A source that fails
+    or times out returns no records"""
+    version = None
+    if config.retrieval_cache:
+        version = source.version(context, forms)
+    if version is not None and pages is not None:
+        version += f"-{pages}"
+    if version is not None:
+        records, forms = retrieval_cache.lookup(
+            context, source.name, version, forms
+        )
+        if len(forms) == 0:
+            return source, records
+    else:
+        records = {}
+    start = time.monotonic()
+    try:
+        fetched = await asyncio.wait_for(
+            source.get_records(context, forms, pages=pages),
+            timeout=source.timeout()
+        )
+    except asyncio.TimeoutError:
+        print(f"{source.name.title()} did not answer within " +
+              f"{source.timeout()} seconds. Skipping it for these forms.")
+        return source, records
+    except Exception as error:
+        print(f"Error. {source.name.title()} failed with: {error}")
+        logger.exception(error)
+        return source, records
+    planner.record_query(
+        source.name, time.monotonic() - start,
+        sum(len(fetched[form_id]) for form_id in fetched), pages=pages
+    )
+    if version is not None:
+        retrieval_cache.store(context, source.name, version, forms, fetched)
+    records.update(fetched)
+    return source, records
+
+
+async def gather_records(context, forms):
+    """Runs all enabled sources concurrently and merges the records as they
+    arrive. Returns a dictionary with form_id as key and a dictionary with
+    sentences as key and Candidate as value. The records are returned all at
+    once after every source has answered or timed out"""
+    records = {data.form_id: {} for data in forms}
+    # Reading or building the frequency table would block the event loop
+    loop = asyncio.get_running_loop()
+    plans = await loop.run_in_executor(None, planner.plan, context, forms, [
+        source.name for source in sources.values() if source.enabled(context)
+    ])
+    tasks = [
+        run_source(sources[name], context, plan_forms, pages=pages)
+        for name, (plan_forms, pages) in plans.items()
+    ]
+    for future in asyncio.as_completed(tasks):
+        source, source_records = await future
+        count = 0
+        for form_id in source_records:
+            records[form_id].update(source_records[form_id])
+            count += len(source_records[form_id])
+        logger.info("Got %d records from %s", count, source.name)
+    return records
+
+
+def get_records(context, forms):
+    # The sources run on the event loop of the pooled HTTP client
+    return http_client.run(gather_records(context, forms))
+
+
+sources = {
+    EuroparlSource.name: EuroparlSource(),
+    RiksdagenSource.name: RiksdagenSource(),
+    KsamsokSource.name: KsamsokSource(),
+}
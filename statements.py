@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import json
+
+import config
+import http_client
+import loglevel
+
+# Direct upload of new statements with wbeditentity. WBI's ItemEngine
+# fetches and parses the whole lexeme before it appends a claim. Here the
+# claims built with WBI are serialized with get_json_representation() and
+# only they are posted in one edit, so the statements are the same as the
+# ones ItemEngine writes.
+# With baserevid the API refuses the edit if the lexeme was changed in a
+# conflicting way since we fetched it.
+
+logger = loglevel.get_logger(__name__)
+
+api_url = "https://www.wikidata.org/w/api.php"
+edit_summary = "Added usage example with [[Wikidata:LexUse]]"
+
+
+def get_edit_summary(claims):
+    if len(claims) == 1:
+        return edit_summary
+    return f"Added {len(claims)} usage examples with [[Wikidata:LexUse]]"
+
+
+def edit_data(claims):
+    """Returns the data parameter of wbeditentity that adds the claims"""
+    return dict(claims=[claim.get_json_representation() for claim in claims])
+
+
+def add_claims(context, lid, claims, baserevid=None):
+    """Returns the lid if the claims were added and False otherwise"""
+    # The edit token belongs to the session of the WBI login so its cookies
+    # are sent along via the pooled client
+    session = context.login_instance.get_session()
+    cookies = "; ".join(
+        f"{name}={value}" for name, value in session.cookies.items()
+    )
+    params = dict(
+        action="wbeditentity",
+        id=lid,
+        data=json.dumps(edit_data(claims), ensure_ascii=False),
+        summary=get_edit_summary(claims),
+        token=context.login_instance.get_edit_token(),
+        format="json",
+    )
+    if baserevid is not None:
+        params["baserevid"] = baserevid
+    response = http_client.post(
+        api_url, data=params, headers={"Cookie": cookies}
+    )
+    result = response.json()
+    if config.debug_json:
+        logger.debug("result from wbeditentity:%s", result)
+    if "error" in result:
+        error = result["error"]
+        if error.get("code") == "editconflict":
+            print(f"Error. {lid} was edited by someone else in the " +
+                  "meantime. The usage example was not added.")
+        else:
+            print(f"Error. Could not add the usage example to {lid}: " +
+                  f"{error.get('info')}")
+        logger.error("wbeditentity failed for %s: %s", lid, error)
+        return False
+    return lid
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+import argparse
+import mmap
+import os.path
+
+import numpy as np
+
+import context
+import loglevel
+
+# Optional suffix array over the normalized (lower cased) Europarl corpus.
+# It answers exact phrase queries in O(m log n) so multi-word lexemes like
+# "i och med", sentence initial forms and forms next to punctuation are
+# found without scanning the corpus. Everything is saved in a compact binary
+# format that is memory-mapped instead of loaded:
+#
+#   data_sv.sa.text         the normalized corpus (UTF-8)
+#   data_sv.sa.npy          the suffix array (uint32 or uint64)
+#   data_sv.sa.newlines.npy positions of the newlines in the normalized text
+#   data_sv.sa.offsets.npy  byte offset of every line in the original corpus
+#
+# Build it with: ./suffix_array.py sv
+
+logger = loglevel.get_logger(__name__)
+
+
+def normalize(text):
+    return text.lower()
+
+
+def index_filenames(txt_filename):
+    base = txt_filename.replace(".txt", ".sa")
+    return dict(
+        text=base + ".text",
+        suffix_array=base + ".npy",
+        newlines=base + ".newlines.npy",
+        offsets=base + ".offsets.npy",
+    )
+
+
+# Number of suffixes that are sorted at a time, which bounds the temporary
+# memory of every round
+sort_chunk_size = 2**22
+
+
+def sort_groups(data, suffix_array, rank, head, k, start, end):
+    """Sorts the suffixes in suffix_array[start:end] that share their first k
+    bytes with another suffix on their next k bytes. start and end are group
+    boundaries. The ranks of the suffixes are updated in place"""
+    n = len(data)
+    # Suffixes that are alone in their group are already in place
+    alone = head[start:end].copy()
+    alone[:-1] &= head[start + 1:end]
+    if end < n:
+        alone[-1] &= head[end]
+    indexes = np.flatnonzero(~alone)
+    if len(indexes) == 0:
+        return
+    indexes += start
+    positions = suffix_array[indexes]
+    # The rank of the suffix k bytes later or -1 past the end
+    later = positions.astype(np.int64) + k
+    second = rank[np.minimum(later, n - 1)]
+    second[later >= n] = -1
+    first = rank[positions]
+    order = np.lexsort((second, first))
+    suffix_array[indexes] = positions[order]
+    first = first[order]
+    second = second[order]
+    new_group = np.empty(len(indexes), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+    head[indexes] = new_group
+    # The rank of a suffix is the index of the first suffix of its group
+    group_starts = np.where(new_group, indexes, 0)
+    np.maximum.accumulate(group_starts, out=group_starts)
+    rank[suffix_array[indexes]] = group_starts
+
+
+def build_suffix_array(data):
+    """Returns the suffix array of a uint8 array using prefix doubling. Only
+    the groups of suffixes that are still tied are sorted again in every
+    round, a chunk at a time and with 32 bit ranks when they fit, so the
+    memory use stays close to the size of the result"""
+    n = len(data)
+    dtype = np.int32 if n < 2**31 else np.int64
+    suffix_array = np.argsort(data, kind="stable").astype(dtype)
+    sorted_data = data[suffix_array]
+    head = np.empty(n, dtype=bool)
+    head[0] = True
+    head[1:] = sorted_data[1:] != sorted_data[:-1]
+    del sorted_data
+    rank = np.empty(n, dtype=dtype)
+    group_starts = np.where(head, np.arange(n, dtype=dtype), 0)
+    np.maximum.accumulate(group_starts, out=group_starts)
+    rank[suffix_array] = group_starts
+    del group_starts
+    k = 1
+    while k < n:
+        start = 0
+        while start < n:
+            # Extend the chunk to the next group boundary
+            end = min(start + sort_chunk_size, n)
+            if end < n and not head[end]:
+                following = np.flatnonzero(head[end:])
+                end = end + int(following[0]) if len(following) > 0 else n
+            sort_groups(data, suffix_array, rank, head, k, start, end)
+            start = end
+        logger.info("Sorted on %d bytes", 2 * k)
+        if head.all():
+            break
+        k *= 2
+    return suffix_array.astype(np.uint32 if n < 2**32 else np.uint64)
+
+
+def build(txt_filename):
+    """Builds and saves the index of the corpus"""
+    filenames = index_filenames(txt_filename)
+    print(f"Building suffix array for {txt_filename}")
+    offsets = [0]
+    with open(txt_filename, 'rb') as f:
+        for line in f:
+            offsets.append(offsets[-1] + len(line))
+    # Without newline translation a stray \r stays part of its line, like in
+    # the offsets and the feature table
+    with open(txt_filename, 'r', encoding='utf-8', newline='\n') as f:
+        text = normalize(f.read()).encode("utf-8")
+    if not text.endswith(b"\n"):
+        text += b"\n"
+    data = np.frombuffer(text, dtype=np.uint8)
+    np.save(filenames["offsets"], np.array(offsets[:-1], dtype=np.uint64))
+    np.save(filenames["newlines"], np.flatnonzero(data == ord("\n")))
+    np.save(filenames["suffix_array"], build_suffix_array(data))
+    # The text is written last so a complete index can be detected by it
+    with open(filenames["text"], 'wb') as f:
+        f.write(text)
+    print("Suffix array done")
+
+
+def is_word_byte(byte):
+    """Bytes of letters and digits. All non-ASCII bytes are treated as parts
+    of letters like å, ä and ö"""
+    return (
+        byte >= 0x80 or 48 <= byte <= 57 or 65 <= byte <= 90 or
+        97 <= byte <= 122
+    )
+
+
+# is_word_byte() of every byte value for vectorized lookups
+word_bytes = np.array([is_word_byte(byte) for byte in range(256)])
+
+
+class SuffixArray:
+    """Memory-mapped suffix array of one corpus"""
+    def __init__(self, txt_filename):
+        filenames = index_filenames(txt_filename)
+        self.txt_filename = txt_filename
+        with open(filenames["text"], 'rb') as f:
+            self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The same bytes without a copy
+        self.data = np.frombuffer(self.text, dtype=np.uint8)
+        self.suffix_array = np.load(filenames["suffix_array"], mmap_mode="r")
+        self.newlines = np.load(filenames["newlines"], mmap_mode="r")
+        self.offsets = np.load(filenames["offsets"], mmap_mode="r")
+
+    def bound(self, pattern, upper):
+        """Binary search for the first suffix that is greater than (upper)
+        or greater than or equal to the pattern"""
+        low, high = 0, len(self.suffix_array)
+        m = len(pattern)
+        while low < high:
+            middle = (low + high) // 2
+            start = int(self.suffix_array[middle])
+            prefix = self.text[start:start + m]
+            if prefix < pattern or (upper and prefix == pattern):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, phrase):
+        """Returns the sorted positions of all occurrences of the phrase"""
+        pattern = normalize(phrase).encode("utf-8")
+        if len(pattern) == 0:
+            return np.array([], dtype=np.int64)
+        first = self.bound(pattern, upper=False)
+        last = self.bound(pattern, upper=True)
+        return np.sort(self.suffix_array[first:last].astype(np.int64))
+
+    def occurrences(self, phrase, boundary=True):
+        """Returns the positions of the phrase. With boundary only those that
+        are not part of a longer word"""
+        positions = self.find(phrase)
+        if not boundary or len(positions) == 0:
+            return positions
+        length = len(normalize(phrase).encode("utf-8"))
+        n = len(self.data)
+        before = word_bytes[self.data[np.maximum(positions - 1, 0)]]
+        before[positions == 0] = False
+        after_positions = positions + length
+        after = word_bytes[self.data[np.minimum(after_positions, n - 1)]]
+        after[after_positions >= n] = False
+        return positions[~before & ~after]
+
+    def count(self, phrase, boundary=True):
+        return len(self.occurrences(phrase, boundary=boundary))
+
+    def line_numbers(self, phrase, boundary=True):
+        """Returns the sorted unique line numbers (starting at 1) where the
+        phrase occurs"""
+        positions = self.occurrences(phrase, boundary=boundary)
+        return np.unique(np.searchsorted(self.newlines, positions)) + 1
+
+    def read_lines(self, line_numbers):
+        """Returns a dictionary with line number as key and the original line
+        as value"""
+        lines = {}
+        with open(self.txt_filename, 'rb') as f:
+            for number in line_numbers:
+                f.seek(int(self.offsets[number - 1]))
+                lines[int(number)] = f.readline().decode("utf-8")
+        return lines
+
+
+def exists(txt_filename):
+    return os.path.isfile(index_filenames(txt_filename)["text"])
+
+
+# Loaded indexes by corpus filename
+indexes = {}
+
+
+def load(txt_filename):
+    """Returns the SuffixArray of the corpus or None if it is not built"""
+    if txt_filename not in indexes:
+        if not exists(txt_filename):
+            return None
+        indexes[txt_filename] = SuffixArray(txt_filename)
+    return indexes[txt_filename]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a suffix array over a Europarl corpus"
+    )
+    parser.add_argument("language_code", help="E.g. sv")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    build(context.for_language(args.language_code).data_filename)
+
+
+if __name__ == "__main__":
+    main()
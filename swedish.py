@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import logging
 
+import checkpoint
 import config
+import context
+import daemon
+import incremental
 import loglevel
-import riksdagen
 import util
 
 # This script enables finding example sentences via the Riksdagen API where
@@ -25,9 +28,28 @@ def main():
     # logger.addHandler(file_handler)
     begin = util.introduction()
     if begin:
-        print("Fetching lexeme forms to work on")
-        results = util.fetch_lexeme_forms()
-        util.process_lexeme_data(results)
+        language = context.from_config()
+        # Use the warm state of a running daemon if there is one
+        language.daemon = daemon.connect()
+        if language.daemon is not None:
+            print("Attached to the LexUse daemon")
+        session = None
+        if config.checkpoint:
+            session = checkpoint.load_session(language)
+        if session is not None and util.yes_no_question(
+                "Resume the interrupted session?"
+        ):
+            forms, lids, position = session
+            util.process_lexeme_data(
+                language, forms, lids=lids, position=position
+            )
+        else:
+            print("Fetching lexeme forms to work on")
+            if config.incremental:
+                results = incremental.fetch_lexeme_forms(language)
+            else:
+                results = util.fetch_lexeme_forms(language)
+            util.process_lexeme_data(language, results)
 
 
 if __name__ == "__main__":
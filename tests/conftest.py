@@ -0,0 +1,104 @@
+import http.server
+import os
+import re
+import sys
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+# config.py reads the credentials from the environment
+os.environ.setdefault("LEXUSE_USERNAME", "test")
+os.environ.setdefault("LEXUSE_PASSWORD", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+# Keep loglevel.py from parsing the arguments of pytest
+config.loglevel = 40
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves the files and JSON callbacks of a LocalServer. Files support
+    HTTP Range like a CDN"""
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server.local_server
+        url = urlsplit(self.path)
+        query = {
+            key: values[0] for key, values in parse_qs(url.query).items()
+        }
+        server.requests.append(dict(
+            method=self.command, path=url.path, query=query,
+            headers=dict(self.headers),
+        ))
+        if url.path in server.callbacks:
+            status, body = server.callbacks[url.path](query)
+            self.send_body(
+                status, body, {"Content-Type": "application/json"}
+            )
+            return
+        if url.path not in server.files:
+            self.send_body(404, b"", {})
+            return
+        data = server.files[url.path]
+        headers = {"Accept-Ranges": "bytes"}
+        headers.update(server.headers.get(url.path, {}))
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match is None:
+            self.send_body(200, data, headers)
+            return
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(data) - 1
+        if start >= len(data):
+            headers["Content-Range"] = f"bytes */{len(data)}"
+            self.send_body(416, b"", headers)
+            return
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        self.send_body(206, data[start:end + 1], headers)
+
+
+class LocalServer:
+    """HTTP server on localhost that stands in for the remote services"""
+    def __init__(self):
+        # Path to bytes
+        self.files = {}
+        # Path to extra response headers
+        self.headers = {}
+        # Path to a function of the query that returns (status, body)
+        self.callbacks = {}
+        self.requests = []
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), Handler
+        )
+        self.server.local_server = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def local_server():
+    server = LocalServer()
+    yield server
+    server.close()
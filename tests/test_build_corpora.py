@@ -0,0 +1,60 @@
+import lzma
+import os
+
+import pytest
+
+import build_corpora
+import config
+import context
+
+corpus = "".join(
+    f"Detta är mening nummer {i} med\r ett vagnretur .\r\n" for i in range(50)
+)
+compressed = lzma.compress(corpus.encode("utf-8"))
+
+
+@pytest.fixture
+def europarl(local_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "europarl_data_url", local_server.url + "/")
+    monkeypatch.setattr(config, "europarl_checksums", {})
+    monkeypatch.setattr(config, "europarl_manifest", "manifest.json")
+    monkeypatch.setattr(config, "europarl_suffix_array", False)
+    monkeypatch.setattr(config, "europarl_token_index", False)
+    local_server.files["/sv.xz"] = compressed
+    return local_server
+
+
+def test_normalize_keeps_line_numbers(europarl):
+    language = context.for_language("sv")
+    entry = build_corpora.build_language(language, force=True)
+    assert "error" not in entry
+    assert entry["lines"] == 50
+    with open(language.data_filename, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    assert lines[3] == "Detta är mening nummer 3 med  ett vagnretur ."
+    assert not any(name.startswith("data_sv.new") for name in os.listdir())
+
+
+def test_stale_partial_download_is_removed(europarl):
+    language = context.for_language("sv")
+    with open("data_sv.new.xz.part", "wb") as f:
+        f.write(b"old version of the file")
+    with open("data_sv.new.xz.part1", "wb") as f:
+        f.write(b"old segment")
+    entry = build_corpora.build_language(language, force=True)
+    assert "error" not in entry
+    with open("data_sv.xz", "rb") as f:
+        assert f.read() == compressed
+    assert not os.path.exists("data_sv.new.xz.part1")
+
+
+def test_failed_rebuild_keeps_old_corpus(europarl):
+    language = context.for_language("sv")
+    with open(language.data_filename, "w", encoding="utf-8") as f:
+        f.write("Den gamla korpusen .\n")
+    europarl.files["/sv.xz"] = compressed[:-10]
+    entry = build_corpora.build_language(language, force=True)
+    assert "error" in entry
+    with open(language.data_filename, "r", encoding="utf-8") as f:
+        assert f.read() == "Den gamla korpusen .\n"
@@ -0,0 +1,49 @@
+import pytest
+
+import checkpoint
+import config
+import context
+import edit_batch
+import util
+from records import EUROPARL, FORMAL, WRITTEN, Form
+
+pytest.importorskip("wikibaseintegrator")
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "checkpoint", True)
+    monkeypatch.setattr(
+        config, "session_database", str(tmp_path / "session.sqlite")
+    )
+    monkeypatch.setattr(checkpoint, "connection", None)
+    monkeypatch.chdir(tmp_path)
+
+
+def swedish():
+    return context.LanguageContext("swedish", "sv", "Q9027")
+
+
+def test_queued_examples_survive_a_kill(session):
+    language = swedish()
+    data = Form("L1", "L1-F1", "hus", "noun")
+    claim = util.build_usage_example_claim(
+        context=language, sentence="Ett hus .", form_id=data.form_id,
+        sense_id="L1-S1", language_style=FORMAL, type_of_reference=WRITTEN,
+        source=EUROPARL, line=7,
+    )
+    edit_batch.add(language, "L1", claim, data)
+    checkpoint.save_pending_edits(language, "L1")
+    # A new process after a hard kill
+    checkpoint.connection = None
+    resumed = swedish()
+    assert checkpoint.restore_pending_edits(resumed) == 1
+    assert edit_batch.form_ids(resumed, "L1") == {"L1-F1"}
+    assert [
+        claim.get_json_representation()
+        for claim in edit_batch.claims(resumed, "L1")
+    ] == [claim.get_json_representation()]
+    # Nothing is left to save after the upload
+    edit_batch.remove(resumed, "L1", edit_batch.claims(resumed, "L1"))
+    checkpoint.save_pending_edits(resumed, "L1")
+    assert checkpoint.restore_pending_edits(swedish()) == 0
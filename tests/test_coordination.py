@@ -0,0 +1,108 @@
+import multiprocessing
+import threading
+
+import pytest
+
+import config
+import context
+import coordination
+import edit_batch
+import entity_cache
+import util
+from records import Form
+
+lids = [f"L{number}" for number in range(40)]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "coordination_database", str(tmp_path / "shared.sqlite")
+    )
+    monkeypatch.setattr(config, "coordination_lease", 1800)
+    monkeypatch.setattr(config, "coordination_reviewer", "alice")
+    # Every test gets its own database
+    monkeypatch.setattr(coordination, "local", threading.local())
+    return config.coordination_database
+
+
+def swedish():
+    return context.LanguageContext("swedish", "sv", "Q9027")
+
+
+def test_lease_keeps_others_out(database, monkeypatch):
+    assert coordination.acquire(swedish(), "L1")
+    monkeypatch.setattr(config, "coordination_reviewer", "bob")
+    assert not coordination.acquire(swedish(), "L1")
+
+
+def test_restarted_reviewer_gets_its_lexeme_back(database, monkeypatch):
+    assert coordination.acquire(swedish(), "L1")
+    # A restart opens a new connection with the same reviewer id
+    monkeypatch.setattr(coordination, "local", threading.local())
+    assert coordination.acquire(swedish(), "L1")
+
+
+def test_expired_lease(database, monkeypatch):
+    monkeypatch.setattr(config, "coordination_lease", -1)
+    assert coordination.acquire(swedish(), "L1")
+    monkeypatch.setattr(config, "coordination_reviewer", "bob")
+    assert coordination.acquire(swedish(), "L1")
+
+
+def test_completed_lexeme(database, monkeypatch):
+    assert coordination.acquire(swedish(), "L1")
+    coordination.complete(swedish(), "L1")
+    assert not coordination.acquire(swedish(), "L1")
+    monkeypatch.setattr(config, "coordination_reviewer", "bob")
+    assert not coordination.acquire(swedish(), "L1")
+
+
+def acquire_all(name, queue):
+    config.coordination_reviewer = name
+    coordination.local.connection = None
+    queue.put([lid for lid in lids if coordination.acquire(swedish(), lid)])
+
+
+def test_concurrent_reviewers(database):
+    coordination.get_connection()
+    processes_context = multiprocessing.get_context("fork")
+    queue = processes_context.Queue()
+    processes = [
+        processes_context.Process(
+            target=acquire_all, args=(f"reviewer{number}", queue)
+        )
+        for number in range(4)
+    ]
+    for process in processes:
+        process.start()
+    acquired = [queue.get(timeout=60) for process in processes]
+    for process in processes:
+        process.join()
+    taken = [lid for lexemes in acquired for lid in lexemes]
+    assert sorted(taken) == sorted(lids)
+
+
+def test_form_is_recorded_after_upload(database, tmp_path, monkeypatch):
+    class Claim:
+        def get_value(self):
+            return "En mening .", "sv"
+
+    uploaded = []
+    monkeypatch.setattr(
+        util, "write_usage_examples",
+        lambda language, lid, claims: uploaded and lid
+    )
+    monkeypatch.setattr(util, "add_to_watchlist", lambda language, lid: None)
+    monkeypatch.setattr(entity_cache, "invalidate",
+                        lambda language, lid: None)
+    monkeypatch.setattr(config, "checkpoint", False)
+    monkeypatch.chdir(tmp_path)
+    language = swedish()
+    edit_batch.add(language, "L1", Claim(),
+                   Form("L1", "L1-F1", "hus", "noun"))
+    assert not util.flush_edits(language, "L1")
+    assert not coordination.is_form_done(language, "L1-F1")
+    uploaded.append(True)
+    assert util.flush_edits(language, "L1") == "L1"
+    assert coordination.is_form_done(language, "L1-F1")
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+import config
+import docstore
+import http_client
+import riksdagen
+from records import Form
+
+texts = {
+    "H1": (
+        "Inledning utan ordet.\n\n"
+        "Regeringen vill bygga ett hus i varje kommun under året.\n\n"
+        "Alla husen ska vara klara innan nästa val hålls i landet."
+    ),
+    "H2": "Det här dokumentet handlar om något helt annat i riksdagen.",
+}
+records = [
+    dict(id="H1", summary="", datum="2020-01-01"),
+    dict(id="H2", summary="", datum="2020-02-01"),
+    dict(id="H3", summary="", datum="2020-03-01"),
+]
+forms = [
+    Form("L1", "L1-F1", "hus", "noun"),
+    Form("L1", "L1-F2", "husen", "noun"),
+]
+
+
+@pytest.fixture
+def store(local_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "riksdagen_document_store", str(tmp_path / "documents")
+    )
+    monkeypatch.setattr(docstore, "local", threading.local())
+    for document_id, text in texts.items():
+        local_server.files[f"/dokument/{document_id}.text"] = (
+            text.encode("utf-8")
+        )
+    http_client.run(docstore.fetch_texts(
+        [record["id"] for record in records], local_server.url + "/dokument/"
+    ))
+    return local_server
+
+
+def test_fetch_texts(store):
+    assert docstore.get_text("H1") == texts["H1"]
+    assert docstore.get_text("H3") is None
+    store.requests.clear()
+    http_client.run(docstore.fetch_texts(
+        ["H1", "H2"], store.url + "/dokument/"
+    ))
+    assert store.requests == []
+
+
+def test_every_text_is_decompressed_once(store, monkeypatch):
+    read = []
+    get_text = docstore.get_text
+
+    def counting_get_text(document_id):
+        read.append(document_id)
+        return get_text(document_id)
+
+    monkeypatch.setattr(docstore, "get_text", counting_get_text)
+    sentences = riksdagen.get_sentences_from_documents(records, forms)
+    assert sorted(read) == ["H1", "H2", "H3"]
+    assert list(sentences["L1-F1"]) == [
+        "Regeringen vill bygga ett hus i varje kommun under året."
+    ]
+    assert list(sentences["L1-F2"]) == [
+        "Alla husen ska vara klara innan nästa val hålls i landet."
+    ]
+    assert sentences["L1-F2"][
+        "Alla husen ska vara klara innan nästa val hålls i landet."
+    ].document_id == "H1"
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import lzma
+import os
+
+import pytest
+
+import config
+import context
+import download_data
+
+corpus = "".join(f"Detta är mening nummer {i} .\n" for i in range(5000))
+compressed = lzma.compress(corpus.encode("utf-8"))
+
+
+@pytest.fixture
+def europarl(local_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "europarl_data_url", local_server.url + "/")
+    monkeypatch.setattr(config, "europarl_checksums", {})
+    download_data.data_ready.clear()
+    local_server.files["/sv.xz"] = compressed
+    return local_server
+
+
+def ranges(server):
+    return [
+        request["headers"].get("Range") for request in server.requests
+        if request["method"] == "GET"
+    ]
+
+
+def test_parallel_ranges(europarl, monkeypatch):
+    monkeypatch.setattr(config, "download_segments", 4)
+    download_data.download(europarl.url + "/sv.xz", "data_sv.xz")
+    with open("data_sv.xz", "rb") as f:
+        assert f.read() == compressed
+    assert len(ranges(europarl)) == 4
+    assert all(value.startswith("bytes=") for value in ranges(europarl))
+    assert not os.path.exists("data_sv.xz.part0")
+
+
+def test_resume(europarl):
+    with open("data_sv.xz.part", "wb") as f:
+        f.write(compressed[:1000])
+    download_data.download(europarl.url + "/sv.xz", "data_sv.xz")
+    with open("data_sv.xz", "rb") as f:
+        assert f.read() == compressed
+    assert ranges(europarl) == ["bytes=1000-"]
+
+
+def test_resume_complete_part(europarl):
+    # The server answers 416 because nothing is left
+    with open("data_sv.xz.part", "wb") as f:
+        f.write(compressed)
+    download_data.download(europarl.url + "/sv.xz", "data_sv.xz")
+    with open("data_sv.xz", "rb") as f:
+        assert f.read() == compressed
+
+
+def test_fetch_verifies_published_digest(europarl):
+    digest = base64.b64encode(hashlib.sha256(compressed).digest()).decode()
+    europarl.headers["/sv.xz"] = {"Repr-Digest": f"sha-256=:{digest}:"}
+    download_data.fetch(context.for_language("sv"))
+    with open("data_sv.txt", encoding="utf-8") as f:
+        assert f.read() == corpus
+
+
+def test_fetch_rejects_wrong_digest(europarl):
+    digest = base64.b64encode(hashlib.sha256(b"other").digest()).decode()
+    europarl.headers["/sv.xz"] = {"Repr-Digest": f"sha-256=:{digest}:"}
+    with pytest.raises(ValueError):
+        download_data.fetch(context.for_language("sv"))
+    assert not os.path.exists("data_sv.xz")
+    assert not os.path.exists("data_sv.txt")
+
+
+def test_fetch_rejects_configured_checksum(europarl, monkeypatch):
+    monkeypatch.setattr(config, "europarl_checksums", {"sv": "0" * 64})
+    with pytest.raises(ValueError):
+        download_data.fetch(context.for_language("sv"))
+    assert not os.path.exists("data_sv.txt")
+
+
+def test_fetch_rejects_corrupt_file(europarl):
+    corrupt = bytearray(compressed)
+    corrupt[len(corrupt) // 2] ^= 0xFF
+    europarl.files["/sv.xz"] = bytes(corrupt)
+    with pytest.raises(ValueError):
+        download_data.fetch(context.for_language("sv"))
+    assert not os.path.exists("data_sv.txt")
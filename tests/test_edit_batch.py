@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+import config
+import context
+import edit_batch
+import entity_cache
+import checkpoint
+import util
+from records import Form
+
+
+class Claim:
+    def __init__(self, sentence):
+        self.sentence = sentence
+
+    def get_value(self):
+        return self.sentence, "sv"
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """Records the uploads and fails them while uploads.failing is True"""
+    class Uploads(list):
+        failing = False
+
+    uploads = Uploads()
+
+    def write_usage_examples(language, lid, claims):
+        if uploads.failing:
+            return False
+        uploads.append((lid, [claim.sentence for claim in claims]))
+        return lid
+
+    monkeypatch.setattr(util, "write_usage_examples", write_usage_examples)
+    monkeypatch.setattr(util, "add_to_watchlist", lambda language, lid: None)
+    monkeypatch.setattr(entity_cache, "invalidate",
+                        lambda language, lid: None)
+    monkeypatch.setattr(config, "edit_batch_size", 5)
+    monkeypatch.setattr(config, "edit_batch_timeout", 300)
+    monkeypatch.setattr(config, "checkpoint", False)
+    monkeypatch.chdir(tmp_path)
+    return uploads
+
+
+def test_failed_upload_keeps_claims(uploads, capsys):
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    edit_batch.add(language, "L1", Claim("En mening ."))
+    edit_batch.add(language, "L1", Claim("En annan mening ."))
+    uploads.failing = True
+    assert not util.flush_edits(language, "L1")
+    assert "'En annan mening .'" in capsys.readouterr().out
+    assert edit_batch.count(language, "L1") == 2
+    uploads.failing = False
+    assert util.flush_edits(language, "L1") == "L1"
+    assert uploads == [("L1", ["En mening .", "En annan mening ."])]
+    assert edit_batch.count(language, "L1") == 0
+
+
+def test_expired_batches_are_flushed(uploads):
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    edit_batch.add(language, "L1", Claim("En mening ."))
+    edit_batch.add(language, "L2", Claim("En annan mening ."))
+    language.pending_edits["L1"]["started"] = time.time() - 301
+    util.flush_expired_edits(language)
+    assert uploads == [("L1", ["En mening ."])]
+    assert edit_batch.count(language, "L2") == 1
+
+
+def test_failed_batch_is_postponed(uploads):
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    edit_batch.add(language, "L1", Claim("En mening ."))
+    language.pending_edits["L1"]["started"] = time.time() - 301
+    uploads.failing = True
+    util.flush_expired_edits(language)
+    assert edit_batch.expired(language) == []
+    assert edit_batch.count(language, "L1") == 1
+
+
+def test_forms_are_excluded_after_the_upload(uploads, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "checkpoint", True)
+    monkeypatch.setattr(
+        config, "session_database", str(tmp_path / "session.sqlite")
+    )
+    monkeypatch.setattr(checkpoint, "connection", None)
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    data = Form("L1", "L1-F1", "hus", "noun")
+    edit_batch.add(language, "L1", Claim("Ett hus ."), data)
+    uploads.failing = True
+    util.flush_edits(language, "L1")
+    # Lost if the session ends now, so the form is presented again later
+    assert not util.in_exclude_list(language, data)
+    assert checkpoint.finished_forms(language, "L1") == set()
+    uploads.failing = False
+    util.flush_edits(language, "L1")
+    assert util.in_exclude_list(language, data)
+    assert checkpoint.finished_forms(language, "L1") == {"L1-F1"}
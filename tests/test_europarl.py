@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+import config
+import context
+import europarl
+import features
+import suffix_array
+import token_corpus
+
+# The first line has a stray carriage return which must not start a new line
+corpus = (
+    "Det här är en mening\r utan slut .\n"
+    "Vi bor i ett gammalt hus i staden .\n"
+    "Kort .\n"
+    "Huset där vi bor är mycket gammalt .\n"
+)
+
+
+@pytest.fixture
+def swedish(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    with open(language.data_filename, "w", encoding="utf-8",
+              newline="") as f:
+        f.write(corpus)
+    return language
+
+
+def line_numbers(records):
+    return sorted(
+        candidate.line for candidate in records["bor"].values()
+    )
+
+
+@pytest.mark.parametrize("index", [None, "suffix_array", "token_index"])
+def test_line_numbers_match_the_feature_table(swedish, monkeypatch, index):
+    monkeypatch.setattr(config, "europarl_suffix_array",
+                        index == "suffix_array")
+    monkeypatch.setattr(config, "europarl_token_index",
+                        index == "token_index")
+    if index == "suffix_array":
+        suffix_array.build(swedish.data_filename)
+    elif index == "token_index":
+        token_corpus.build(swedish.data_filename)
+    table = features.load_table(swedish.data_filename)
+    assert len(table["word_count"]) == 4
+    records = europarl.find_lines(swedish, ["bor"])
+    assert line_numbers(records) == [2, 4]
+    lines = sorted(records["bor"])
+    assert lines[0].startswith("Huset där vi bor")
+    assert lines[1].startswith("Vi bor i ett")
+
+
+@pytest.mark.parametrize("index", [None, "suffix_array", "token_index"])
+def test_search_stops_at_the_deadline(swedish, monkeypatch, index):
+    monkeypatch.setattr(config, "europarl_suffix_array",
+                        index == "suffix_array")
+    monkeypatch.setattr(config, "europarl_token_index",
+                        index == "token_index")
+    # Checked every 50000 lines when scanning
+    with open(swedish.data_filename, "a", encoding="utf-8") as f:
+        f.write("Vi bor här nu .\n" * 50000)
+    if index == "suffix_array":
+        suffix_array.build(swedish.data_filename)
+    elif index == "token_index":
+        token_corpus.build(swedish.data_filename)
+    with pytest.raises(TimeoutError):
+        europarl.find_lines(swedish, ["bor"], deadline=time.time() - 1)
@@ -0,0 +1,28 @@
+import config
+import features
+
+# Greek and Bulgarian lines, one of each starting with a lower case letter
+corpus = (
+    "Σήμερα συζητούμε την έκθεση για το νερό .\n"
+    "σήμερα συζητούμε την έκθεση για το νερό .\n"
+    "България подкрепя предложението на Комисията днес .\n"
+    "днес България подкрепя предложението на Комисията .\n"
+    "Øresund forbinder Danmark og Sverige i dag .\n"
+    "Über diesen Bericht stimmen wir morgen ab .\n"
+)
+
+
+def test_quality_of_non_latin_corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "require_quality_sentences", True)
+    monkeypatch.setattr(config, "min_word_count", 5)
+    monkeypatch.setattr(config, "max_word_count", 15)
+    filename = str(tmp_path / "data_el.txt")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(corpus)
+    table = features.build_table(filename)
+    assert table["quality"].tolist() == [
+        True, False, True, False, True, True
+    ]
+    assert features.eligible_mask(table).tolist() == [
+        True, False, True, False, True, True
+    ]
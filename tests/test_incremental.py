@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import checkpoint
+import config
+import context
+import coordination
+import incremental
+from records import Form
+
+dump = os.path.join(os.path.dirname(__file__), "data", "lexemes.json")
+
+
+def entities():
+    """Returns the entities of the fixture dump by lid"""
+    with open(dump, encoding="utf-8") as f:
+        lines = [line.strip().rstrip(",") for line in f]
+    return {
+        entity["id"]: entity for entity in
+        (json.loads(line) for line in lines if line not in ("[", "]"))
+    }
+
+
+class Daemon:
+    """Records what the client asks the daemon to invalidate"""
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, language, lid):
+        self.invalidated.append(lid)
+
+
+@pytest.fixture
+def api(local_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "snapshot_database", str(tmp_path / "snapshot.sqlite")
+    )
+    monkeypatch.setattr(
+        config, "coordination_database", str(tmp_path / "shared.sqlite")
+    )
+    monkeypatch.setattr(
+        config, "session_database", str(tmp_path / "session.sqlite")
+    )
+    monkeypatch.setattr(config, "checkpoint", True)
+    monkeypatch.setattr(config, "mediawiki_api_url",
+                        local_server.url + "/w/api.php")
+    monkeypatch.setattr(incremental, "connection", None)
+    monkeypatch.setattr(coordination, "local", threading.local())
+    monkeypatch.setattr(checkpoint, "connection", None)
+    fixture = entities()
+
+    def api_php(query):
+        if query["action"] == "query":
+            # Two pages of recent changes
+            if "rccontinue" not in query:
+                return 200, json.dumps(dict(
+                    query=dict(recentchanges=[dict(title="Lexeme:L1")]),
+                    **{"continue": dict(rccontinue="2", **{"continue": "-||"})}
+                )).encode("utf-8")
+            return 200, json.dumps(dict(query=dict(recentchanges=[
+                dict(title="Lexeme:L2"), dict(title="Lexeme:L5"),
+            ]))).encode("utf-8")
+        assert query["action"] == "wbgetentities"
+        # L2 was deleted
+        return 200, json.dumps(dict(entities={
+            lid: fixture.get(lid, dict(id=lid, missing=""))
+            for lid in query["ids"].split("|")
+        }), ensure_ascii=False).encode("utf-8")
+
+    local_server.callbacks["/w/api.php"] = api_php
+    return local_server
+
+
+def test_refresh_with_recent_changes(api):
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    language.daemon = Daemon()
+    last_run = datetime.now(timezone.utc) - timedelta(hours=1)
+    incremental.replace_forms(language, "L1", [
+        Form("L1", "L1-F9", "gammal", "noun"),
+    ])
+    incremental.replace_forms(language, "L2", [
+        Form("L2", "L2-F1", "borttagen", "noun"),
+    ])
+    incremental.replace_forms(language, "L7", [
+        Form("L7", "L7-F1", "orörd", "noun"),
+    ])
+    incremental.set_last_run(language, last_run)
+    incremental.get_connection().commit()
+    language.entity_cache["L1"] = dict(lastrevid=1)
+    language.senses_cache["L1"] = {}
+    coordination.save_candidates(language, "L1", {"L1-F9": {}})
+    checkpoint.save_lexeme(language, "L1", {"L1-F9": {}})
+
+    forms = incremental.fetch_lexeme_forms(language)
+
+    assert forms == [
+        Form("L1", "L1-F1", "hus", "noun"),
+        Form("L1", "L1-F2", "huset", "noun"),
+        Form("L7", "L7-F1", "orörd", "noun"),
+    ]
+    queries = [request["query"] for request in api.requests]
+    assert queries[0]["rcstart"] == (
+        last_run - incremental.overlap
+    ).strftime(incremental.timestamp_format)
+    assert queries[1]["rccontinue"] == "2"
+    assert queries[2]["ids"] == "L1|L2|L5"
+    assert language.daemon.invalidated == ["L1", "L2", "L5"]
+    assert "L1" not in language.entity_cache
+    assert "L1" not in language.senses_cache
+    assert coordination.load_candidates(language, "L1") is None
+    assert checkpoint.load_lexeme(language, "L1") is None
+    assert incremental.get_last_run(language) > last_run
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import http_client
+import json_stream
+import riksdagen
+
+document = json.dumps(dict(dokumentlista=dict(
+    **{"@traffar": "3"},
+    dokument=[
+        dict(id=f"H{number}", summary=f"Text {number} med å, ä och ö",
+             datum="2020-01-01", titel="Ignoreras")
+        for number in range(3)
+    ],
+)), ensure_ascii=False).encode("utf-8")
+expected = [
+    dict(id=f"H{number}", summary=f"Text {number} med å, ä och ö",
+         datum="2020-01-01")
+    for number in range(3)
+]
+
+
+def byte_chunks(data):
+    # Every byte on its own also cuts the UTF-8 characters in two
+    return [data[i:i + 1] for i in range(len(data))]
+
+
+async def async_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(chunks, path):
+    return [
+        item async for item in json_stream.async_iterate_items(
+            async_chunks(chunks), path, trim=riksdagen.record_fields
+        )
+    ]
+
+
+def test_iterate_items():
+    assert list(json_stream.iterate_items(
+        byte_chunks(document), ("dokumentlista", "dokument"),
+        trim=riksdagen.record_fields
+    )) == expected
+
+
+def test_async_iterate_items():
+    assert http_client.run(collect(
+        byte_chunks(document), ("dokumentlista", "dokument")
+    )) == expected
+
+
+def test_missing_and_truncated_arrays():
+    assert http_client.run(collect(
+        [b'{"dokumentlista": {"@traffar": "0"}}'],
+        ("dokumentlista", "dokument")
+    )) == []
+    with pytest.raises(ValueError):
+        http_client.run(collect(
+            [document[:len(document) // 2]], ("dokumentlista", "dokument")
+        ))
+
+
+def test_riksdagen_page_is_streamed(local_server):
+    local_server.files["/dokumentlista/"] = document
+    assert http_client.run(riksdagen.fetch_page(
+        local_server.url + "/dokumentlista/"
+    )) == expected
+    assert http_client.run(riksdagen.fetch_page(
+        local_server.url + "/saknas"
+    )) == []
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+
+import httpx
+import pytest
+
+import config
+import context
+import ksamsok
+from records import Form
+
+data_directory = os.path.join(os.path.dirname(__file__), "data")
+
+
+def page(name):
+    with open(os.path.join(data_directory, name), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def oai(local_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "ksamsok_database", str(tmp_path / "ksamsok.sqlite")
+    )
+    monkeypatch.setattr(config, "ksamsok_oai_url",
+                        local_server.url + "/oaipmh")
+    local_server.failures = 0
+
+    def list_records(query):
+        if query.get("resumptionToken") == "page2":
+            if local_server.failures > 0:
+                local_server.failures -= 1
+                return 503, b""
+            return 200, page("ksamsok_page2.xml")
+        assert query == dict(verb="ListRecords", metadataPrefix="ksamsok-rdf")
+        return 200, page("ksamsok_page1.xml")
+
+    local_server.callbacks["/oaipmh"] = list_records
+    return local_server
+
+
+def tokens(server):
+    return [
+        request["query"].get("resumptionToken") for request in server.requests
+    ]
+
+
+def test_harvest_keeps_cc0_records(oai):
+    assert ksamsok.harvest() == 2
+    assert tokens(oai) == [None, "page2"]
+    assert ksamsok.harvest() == 2
+    assert len(oai.requests) == 2
+
+
+def test_interrupted_harvest_resumes(oai):
+    oai.failures = 1
+    with pytest.raises(httpx.HTTPStatusError):
+        ksamsok.harvest()
+    # The first page was committed with its token
+    assert [uri for uri, text in ksamsok.search("vägen")] == [
+        "http://kulturarvsdata.se/raa/fmi/1"
+    ]
+    oai.requests.clear()
+    assert ksamsok.harvest() == 2
+    assert tokens(oai) == ["page2"]
+
+
+def test_search_keeps_diacritics(oai):
+    ksamsok.harvest()
+    assert [uri for uri, text in ksamsok.search("år")] == [
+        "http://kulturarvsdata.se/raa/fmi/1"
+    ]
+    assert [uri for uri, text in ksamsok.search("ar")] == [
+        "http://kulturarvsdata.se/raa/fmi/4"
+    ]
+    records = ksamsok.get_records(
+        context.LanguageContext("swedish", "sv", "Q9027"),
+        [Form("L1", "L1-F1", "år", "noun")]
+    )
+    assert list(records["L1-F1"]) == [
+        "Stenen restes för många år sedan vid den gamla vägen."
+    ]
+
+
+def test_old_index_is_rebuilt(oai):
+    ksamsok.harvest()
+    connection = sqlite3.connect(config.ksamsok_database)
+    connection.execute("DROP TABLE descriptions")
+    connection.execute(
+        "CREATE VIRTUAL TABLE descriptions USING fts5(text, content='')"
+    )
+    connection.commit()
+    connection.close()
+    assert len(ksamsok.search("år")) == 1
+    assert ksamsok.version().endswith("remove_diacritics 0")
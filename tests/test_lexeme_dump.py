@@ -0,0 +1,48 @@
+import os
+import threading
+
+import pytest
+
+import config
+import context
+import lexeme_dump
+from records import Form, Sense
+
+dump = os.path.join(os.path.dirname(__file__), "data", "lexemes.json")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "lexeme_dump_database", str(tmp_path / "lexemes.sqlite")
+    )
+    monkeypatch.setattr(config, "sparql_results_size", 1000)
+    monkeypatch.setattr(config, "sparql_offset", 0)
+    monkeypatch.setattr(lexeme_dump, "local", threading.local())
+    assert lexeme_dump.import_dump(dump) == 5
+    return config.lexeme_dump_database
+
+
+def swedish():
+    return context.LanguageContext("swedish", "sv", "Q9027")
+
+
+def test_fetch_lexeme_forms(database):
+    assert lexeme_dump.fetch_lexeme_forms(swedish()) == [
+        Form(lid="L1", form_id="L1-F1", word="hus", category="noun"),
+        Form(lid="L1", form_id="L1-F2", word="huset", category="noun"),
+    ]
+
+
+def test_fetch_senses(database):
+    assert lexeme_dump.fetch_senses(swedish(), "L1") == {
+        1: Sense(sense_id="L1-S1", gloss="byggnad"),
+        2: Sense(sense_id="L1-S2", gloss="släkt"),
+    }
+
+
+def test_count_senses_with_glosses_in_several_languages(database):
+    assert lexeme_dump.count_number_of_senses_with_P5137(swedish(), "L1") == 2
+    danish = context.LanguageContext("danish", "da", "Q9035")
+    assert lexeme_dump.count_number_of_senses_with_P5137(danish, "L1") == 0
+    assert lexeme_dump.count_number_of_senses_with_P5137(danish, "L5") == 1
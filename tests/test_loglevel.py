@@ -0,0 +1,19 @@
+import sys
+
+import config
+import loglevel
+
+
+def test_help_is_left_to_the_script(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["token_corpus.py", "--help"])
+    monkeypatch.setattr(config, "loglevel", None)
+    # Would exit with the usage of the loglevel parser
+    loglevel.set_loglevel()
+    assert config.loglevel == 40
+
+
+def test_log_option_is_parsed(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["suffix_array.py", "sv", "-l", "info"])
+    monkeypatch.setattr(config, "loglevel", None)
+    loglevel.set_loglevel()
+    assert config.loglevel == 20
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+import config
+import context
+import planner
+from records import Form
+
+forms = [Form("L1", "L1-F1", "hus", "noun")]
+
+
+@pytest.fixture
+def swedish(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "planner", True)
+    monkeypatch.setattr(config, "planner_target_candidates", 3)
+    monkeypatch.setattr(config, "planner_max_seconds", 20)
+    monkeypatch.setattr(config, "riksdagen_max_results_size", 200)
+    monkeypatch.setattr(config, "europarl_suffix_array", False)
+    monkeypatch.setattr(config, "europarl_token_index", False)
+    monkeypatch.setattr(
+        config, "planner_stats", str(tmp_path / "planner_stats.sqlite")
+    )
+    monkeypatch.setattr(planner, "local", threading.local())
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    monkeypatch.setattr(planner, "frequencies", {})
+    return language
+
+
+def set_frequency(language, count):
+    planner.frequencies[language.data_filename] = {"hus": count}
+
+
+def test_riksdagen_is_skipped_when_europarl_is_enough(swedish):
+    # 10 lines accepted half of the time without statistics
+    set_frequency(swedish, 10)
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "europarl": (forms, None)
+    }
+
+
+def test_pages_are_derived_from_the_statistics(swedish):
+    set_frequency(swedish, 0)
+    planner.add_stats("riksdagen", pages=10, candidates=40, seconds=10.0,
+                      presented=10, accepted=4)
+    # 3 / (5 / 12 * 4) pages
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "riksdagen": (forms, 2)
+    }
+
+
+def test_pages_are_limited_by_the_latency(swedish):
+    set_frequency(swedish, 0)
+    planner.add_stats("riksdagen", pages=10, candidates=10, seconds=100.0)
+    # 3 / (1 / 2 * 1) pages but only 20 seconds at 10 seconds a page
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "riksdagen": (forms, 2)
+    }
+
+
+def test_slow_riksdagen_is_skipped_if_europarl_gives_one(swedish):
+    # One accepted line is expected
+    set_frequency(swedish, 2)
+    planner.add_stats("riksdagen", pages=10, candidates=10, seconds=300.0)
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "europarl": (forms, None)
+    }
+    # Without anything from Europarl one page is downloaded anyway
+    set_frequency(swedish, 0)
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "riksdagen": (forms, 1)
+    }
+
+
+def test_unknown_forms_ask_riksdagen_for_the_whole_target(
+        swedish, monkeypatch
+):
+    # Not in the frequency table, but the suffix array might find it
+    set_frequency(swedish, 0)
+    monkeypatch.setattr(config, "europarl_suffix_array", True)
+    assert planner.plan(swedish, forms, ["europarl", "riksdagen"]) == {
+        "europarl": (forms, None),
+        "riksdagen": (forms, 3),
+    }
@@ -0,0 +1,58 @@
+import pytest
+
+import config
+import context
+import ranker
+import util
+from records import EUROPARL, Form
+
+
+def quality(sentence):
+    return ranker.features(sentence, "ord", EUROPARL)[6]
+
+
+def test_quality_in_other_alphabets():
+    assert quality("Ett ord här.") == 1.0
+    assert quality("Łatwe ord tutaj.") == 1.0
+    assert quality("Σήμερα ord εδώ!") == 1.0
+    assert quality("ett ord här.") == 0.0
+    assert quality("Ett ord här") == 0.0
+
+
+@pytest.fixture
+def decisions(monkeypatch):
+    """Records the answers passed to the ranker"""
+    decisions = []
+    monkeypatch.setattr(config, "ranker", True)
+    monkeypatch.setattr(config, "entity_cache", False)
+    monkeypatch.setattr(util, "flush_expired_edits", lambda language: None)
+    monkeypatch.setattr(
+        ranker, "record_decision",
+        lambda language, data, sentence, source, answer:
+        decisions.append(answer)
+    )
+    return decisions
+
+
+def present(monkeypatch, answer, sense):
+    monkeypatch.setattr(util, "yes_no_skip_question", lambda message: answer)
+    monkeypatch.setattr(util, "prompt_sense_approval",
+                        lambda context, sentence, data: sense)
+    return util.present_sentence(
+        context=context.LanguageContext("swedish", "sv", "Q9027"),
+        data=Form(lid="L1", form_id="L1-F1", word="ord", category="noun"),
+        sentence="Ett ord här.",
+        source=EUROPARL,
+    )
+
+
+def test_declined_sense_is_recorded_as_no(monkeypatch, decisions):
+    # The reviewer said yes but then cancelled the sense
+    assert present(monkeypatch, True, False) is None
+    assert decisions == [False]
+
+
+def test_no_and_skip_are_recorded(monkeypatch, decisions):
+    assert present(monkeypatch, False, None) is False
+    assert present(monkeypatch, None, None) is None
+    assert decisions == [False, None]
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import context
+import ksamsok
+import planner
+import retrieval_cache
+import riksdagen
+import sources
+from records import Form
+
+forms = [
+    Form("L1", "L1-F1", "hus", "noun"),
+    Form("L1", "L1-F2", "huset", "noun"),
+]
+
+
+def test_europarl_version_covers_settings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    with open(language.data_filename, "w", encoding="utf-8") as f:
+        f.write("Ett hus .\n")
+    source = sources.sources["europarl"]
+    versions = {source.version(language, forms)}
+    for name, value in [
+            ("min_word_count", 1), ("max_word_count", 40),
+            ("require_quality_sentences", False),
+            ("europarl_suffix_array", True), ("europarl_token_index", True),
+    ]:
+        monkeypatch.setattr(config, name, value)
+        versions.add(source.version(language, forms))
+    assert len(versions) == 6
+
+
+def test_riksdagen_version_is_the_same_for_every_word():
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    source = sources.sources["riksdagen"]
+    assert source.version(language, forms) == source.version(
+        language, forms[:1]
+    )
+
+
+def test_riksdagen_records_are_reused_by_other_lexemes(
+        tmp_path, monkeypatch
+):
+    queries = []
+
+    async def process_async_responses(query, pages=None):
+        queries.append(query)
+        return [dict(
+            id=f"H{len(queries)}", datum="2012-05-12",
+            summary=f"Vi tittar på ett {query} som är mycket gammalt idag.",
+        )]
+
+    monkeypatch.setattr(riksdagen, "process_async_responses",
+                        process_async_responses)
+    monkeypatch.setattr(config, "retrieval_cache", True)
+    monkeypatch.setattr(config, "riksdagen_full_text", False)
+    monkeypatch.setattr(config, "retrieval_cache_database",
+                        str(tmp_path / "retrieval_cache.sqlite"))
+    monkeypatch.setattr(retrieval_cache, "local", threading.local())
+    monkeypatch.setattr(retrieval_cache, "memory", OrderedDict())
+    monkeypatch.setattr(config, "planner_stats",
+                        str(tmp_path / "planner_stats.sqlite"))
+    monkeypatch.setattr(planner, "local", threading.local())
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    source = sources.sources["riksdagen"]
+    source, first = asyncio.run(sources.run_source(source, language, forms))
+    assert sorted(queries) == ["hus", "huset"]
+    # Another lexeme with the form "huset"
+    other = [Form("L2", "L2-F1", "huset", "noun"),
+             Form("L2", "L2-F2", "husets", "noun")]
+    source, second = asyncio.run(sources.run_source(source, language, other))
+    assert sorted(queries) == ["hus", "huset", "husets"]
+    assert second["L2-F1"] == first["L1-F2"]
+    assert len(second["L2-F1"]) == 1
+
+
+def test_timed_out_source_stops_in_the_executor(monkeypatch):
+    searched = []
+    stopped = threading.Event()
+
+    def search(word):
+        # An endless, slow search
+        try:
+            while True:
+                time.sleep(0.01)
+                searched.append(word)
+                yield "http://kulturarvsdata.se/1", "Ett hus ."
+        finally:
+            stopped.set()
+
+    monkeypatch.setattr(ksamsok, "search", search)
+    monkeypatch.setattr(config, "retrieval_cache", False)
+    monkeypatch.setattr(config, "source_timeouts", {"ksamsok": 0.1})
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    source, records = asyncio.run(
+        sources.run_source(sources.sources["ksamsok"], language, forms)
+    )
+    assert records == {}
+    assert stopped.wait(5)
+    count = len(searched)
+    time.sleep(0.05)
+    assert len(searched) == count
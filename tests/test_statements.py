@@ -0,0 +1,116 @@
+import datetime
+import json
+import os
+
+import pytest
+
+import context
+import http_client
+import statements
+import util
+from records import EUROPARL, FORMAL, RIKSDAGEN, WRITTEN
+
+wbi_core = pytest.importorskip("wikibaseintegrator.wbi_core")
+
+data_directory = os.path.join(os.path.dirname(__file__), "data")
+
+
+class FrozenDatetime(datetime.datetime):
+    """The retrieval date of the references is always the same"""
+    @classmethod
+    def utcnow(cls):
+        return cls(2026, 10, 18, 12, 30)
+
+
+def usage_example(language, sentence, form_id, sense_id, source):
+    """Returns the claim the way present_sentence() builds it"""
+    return util.build_usage_example_claim(
+        context=language,
+        document_id="H901123",
+        sentence=sentence,
+        form_id=form_id,
+        sense_id=sense_id,
+        publication_date="2012-05-12",
+        language_style=FORMAL,
+        type_of_reference=WRITTEN,
+        source=source,
+        line=42,
+    )
+
+
+def lexeme(lid):
+    """A lexeme without usage examples as returned by wbgetentities"""
+    return dict(
+        type="lexeme", id=lid, lastrevid=42, language="Q9027",
+        lexicalCategory="Q1084", lemmas=dict(sv=dict(language="sv",
+                                                     value="hus")),
+        claims={}, forms=[], senses=[],
+    )
+
+
+class Login:
+    class Session:
+        cookies = {"session": "abc"}
+
+    def get_session(self):
+        return self.Session()
+
+    def get_edit_token(self):
+        return "token+\\"
+
+
+class Response:
+    def json(self):
+        return {"success": 1}
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    posted = []
+
+    def post(url, **kwargs):
+        posted.append(kwargs)
+        return Response()
+
+    monkeypatch.setattr(http_client, "post", post)
+    monkeypatch.setattr(util, "datetime", FrozenDatetime)
+    return posted
+
+
+def golden(name):
+    with open(os.path.join(data_directory, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("name, claims", [
+    ("wbeditentity_one_claim.json", [
+        ("Huset är rött .", "L1-F1", "L1-S1", RIKSDAGEN),
+    ]),
+    ("wbeditentity_several_claims.json", [
+        ("Huset är rött .", "L1-F1", "L1-S1", RIKSDAGEN),
+        ("Husen är blå .", "L1-F2", "L1-S1", EUROPARL),
+    ]),
+])
+def test_add_claims_payload(posted, name, claims):
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    language.login_instance = Login()
+    claims = [usage_example(language, *claim) for claim in claims]
+    assert statements.add_claims(
+        language, "L1", claims, baserevid=42
+    ) == "L1"
+    expected = golden(name)
+    assert statements.edit_data(claims) == expected["data"]
+    params = dict(posted[0]["data"])
+    data = json.loads(params.pop("data"))
+    assert data == expected.pop("data")
+    assert params == expected
+    assert posted[0]["headers"] == {"Cookie": "session=abc"}
+    # The same statements as the ones ItemEngine writes in
+    # util.write_usage_examples(). The lexeme is given so nothing is fetched.
+    item = wbi_core.ItemEngine(
+        data=claims, append_value=["P5831"], item_id="L1",
+        item_data=lexeme("L1"), core_props=set(),
+    )
+    assert data["claims"] == (
+        item.get_json_representation()["claims"]["P5831"]
+    )
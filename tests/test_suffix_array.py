@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+import pytest
+
+import config
+import context
+import planner
+import suffix_array
+from records import Form
+
+corpus = (
+    "Huset är rött .\n"
+    "Vi bor i huset .\n"
+    "Husets tak är nytt , men huset är gammalt .\n"
+    "Ett lagerhuset står tomt .\n"
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 2**22])
+def test_build_suffix_array(monkeypatch, chunk_size):
+    monkeypatch.setattr(suffix_array, "sort_chunk_size", chunk_size)
+    rng = np.random.default_rng(0)
+    for size in [1, 2, 17, 200]:
+        for alphabet in [1, 2, 4]:
+            data = rng.integers(0, alphabet, size).astype(np.uint8)
+            text = bytes(data)
+            assert suffix_array.build_suffix_array(data).tolist() == sorted(
+                range(size), key=lambda position: text[position:]
+            )
+
+
+@pytest.fixture
+def swedish(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    language = context.LanguageContext("swedish", "sv", "Q9027")
+    with open(language.data_filename, "w", encoding="utf-8") as f:
+        f.write(corpus)
+    return language
+
+
+def test_occurrences_respect_word_boundaries(swedish):
+    suffix_array.build(swedish.data_filename)
+    index = suffix_array.SuffixArray(swedish.data_filename)
+    # Also in "Husets" and "lagerhuset"
+    assert index.count("huset", boundary=False) == 5
+    assert index.count("huset") == 3
+    assert index.line_numbers("huset").tolist() == [1, 2, 3]
+    assert index.line_numbers("hus").tolist() == []
+    assert index.occurrences("saknas").tolist() == []
+
+
+def test_planner_asks_europarl_for_indexed_forms(
+        swedish, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config, "planner", True)
+    monkeypatch.setattr(
+        config, "planner_stats", str(tmp_path / "planner_stats.sqlite")
+    )
+    monkeypatch.setattr(planner, "local", threading.local())
+    monkeypatch.setattr(planner, "frequencies", {})
+    # Only first in a line, so it is not in the frequency table
+    forms = [Form("L1", "L1-F1", "Huset", "noun")]
+    monkeypatch.setattr(config, "europarl_suffix_array", False)
+    monkeypatch.setattr(config, "europarl_token_index", False)
+    assert "europarl" not in planner.plan(swedish, forms, ["europarl"])
+    monkeypatch.setattr(config, "europarl_suffix_array", True)
+    assert planner.plan(swedish, forms, ["europarl"]) == {
+        "europarl": (forms, None)
+    }
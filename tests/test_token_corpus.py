@@ -0,0 +1,68 @@
+import pytest
+
+import token_corpus
+
+corpus = (
+    "Vi bor i huset .\n"
+    "Huset är rött och vi bor\n"
+    "i huset är det kallt .\n"
+    "Kort .\n"
+    "Ett mycket långt sammanhang med många ord i huset här nu .\n"
+)
+
+
+@pytest.fixture
+def corpus_index(tmp_path):
+    filename = str(tmp_path / "data_sv.txt")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(corpus)
+    token_corpus.build(filename)
+    return token_corpus.TokenCorpus(filename)
+
+
+def lines(index, phrases, **window):
+    return {
+        phrase: numbers.tolist()
+        for phrase, numbers in index.search(phrases, **window).items()
+    }
+
+
+def test_multi_token_phrases(corpus_index):
+    assert lines(corpus_index, ["i huset", "vi bor", "huset"]) == {
+        "i huset": [1, 3, 5],
+        # Case sensitive like the scan of the corpus
+        "vi bor": [2],
+        "huset": [1, 3, 5],
+    }
+    assert corpus_index.find("i huset").tolist() == [2, 11, 26]
+
+
+def test_phrases_do_not_cross_lines(corpus_index):
+    # "bor" ends line 2 and "i" starts line 3
+    assert lines(corpus_index, ["bor i"]) == {"bor i": [1]}
+    assert corpus_index.find("bor i").tolist() == [1]
+
+
+def test_token_window(corpus_index):
+    assert lines(
+        corpus_index, ["i huset", "huset", "Kort"], min_tokens=5,
+        max_tokens=6
+    ) == {"i huset": [1, 3], "huset": [1, 3], "Kort": []}
+    assert lines(corpus_index, ["Kort"], max_tokens=2) == {"Kort": [4]}
+    assert corpus_index.window_mask(
+        corpus_index.line_indexes(corpus_index.find("huset")), min_tokens=12
+    ).tolist() == [False, False, True]
+
+
+def test_unknown_tokens(corpus_index):
+    assert lines(corpus_index, ["slott", "i slott", "huset"]) == {
+        "slott": [], "i slott": [], "huset": [1, 3, 5]
+    }
+    assert corpus_index.encode("i slott") is None
+    assert corpus_index.find("slott").tolist() == []
+
+
+def test_read_lines(corpus_index):
+    assert corpus_index.read_lines([4, 2]) == {
+        4: "Kort .\n", 2: "Huset är rött och vi bor\n"
+    }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import argparse
+from array import array
+import json
+import os.path
+
+import numpy as np
+
+import context
+import loglevel
+
+# Optional pre-tokenized binary copy of a Europarl corpus. The corpus is
+# already tokenized with single spaces, so every line is split on space and
+# the tokens are replaced with their ids in a vocabulary. A search is then a
+# few vectorized passes over one uint32 array instead of decoding and
+# splitting every line in Python:
+#
+#   data_sv.tok.ids.npy     token ids of the whole corpus (uint32)
+#   data_sv.tok.starts.npy  index of the first token of every line followed
+#                           by the total number of tokens
+#   data_sv.tok.vocab.json  the tokens in id order and the size and mtime of
+#                           the corpus it was built from
+#
+# Matching is case sensitive like the scan in europarl.py. Lines are
+# rebuilt from their tokens, so the corpus itself is never read.
+#
+# Build it with: ./token_corpus.py sv
+
+logger = loglevel.get_logger(__name__)
+
+
+def index_filenames(txt_filename):
+    base = txt_filename.replace(".txt", ".tok")
+    return dict(
+        ids=base + ".ids.npy",
+        starts=base + ".starts.npy",
+        vocab=base + ".vocab.json",
+    )
+
+
+def source_of(txt_filename):
+    stat = os.stat(txt_filename)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def tokenize(line):
+    return line.rstrip("\n").split(" ")
+
+
+def build(txt_filename):
+    """Tokenizes the corpus and saves the index"""
+    filenames = index_filenames(txt_filename)
+    print(f"Tokenizing {txt_filename}")
+    vocab = {}
+    ids = array("I")
+    starts = array("Q", [0])
+    # Split on \n only so the line numbers match the feature table
+    with open(txt_filename, 'r', encoding='utf-8', newline='\n') as f:
+        for number, line in enumerate(f, start=1):
+            if number % 500000 == 0:
+                logger.info("line %d", number)
+            for token in tokenize(line):
+                token_id = vocab.get(token)
+                if token_id is None:
+                    token_id = vocab[token] = len(vocab)
+                ids.append(token_id)
+            starts.append(len(ids))
+    np.save(filenames["ids"], np.frombuffer(ids, dtype=np.uint32))
+    np.save(filenames["starts"], np.frombuffer(starts, dtype=np.uint64))
+    # The vocabulary is written last so a complete index can be detected by
+    # it. Dicts keep the insertion order which is the id order.
+    with open(filenames["vocab"], 'w', encoding='utf-8') as f:
+        json.dump(dict(source=source_of(txt_filename), tokens=list(vocab)),
+                  f, ensure_ascii=False)
+    print(f"Tokenized {len(starts) - 1} lines with {len(ids)} tokens and " +
+          f"{len(vocab)} distinct tokens")
+
+
+class TokenCorpus:
+    """Memory-mapped token ids of one corpus"""
+    def __init__(self, txt_filename):
+        filenames = index_filenames(txt_filename)
+        with open(filenames["vocab"], 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        self.source = stored["source"]
+        self.tokens = stored["tokens"]
+        self.token_ids = {token: i for i, token in enumerate(self.tokens)}
+        self.ids = np.load(filenames["ids"], mmap_mode="r")
+        self.starts = np.load(filenames["starts"], mmap_mode="r")
+
+    def encode(self, phrase):
+        """Returns the token ids of the phrase or None if one of its tokens
+        is not in the corpus"""
+        ids = [self.token_ids.get(token) for token in phrase.split(" ")]
+        if None in ids:
+            return None
+        return ids
+
+    def find(self, phrase):
+        """Returns the sorted token positions where the phrase starts"""
+        ids = self.encode(phrase)
+        if ids is None:
+            return np.array([], dtype=np.int64)
+        positions = np.flatnonzero(self.ids == ids[0])
+        # One pass per following token over the remaining candidates only
+        for offset, token_id in enumerate(ids[1:], start=1):
+            positions = positions[positions + offset < len(self.ids)]
+            positions = positions[self.ids[positions + offset] == token_id]
+        # Phrases must not continue on the next line
+        lines = self.line_indexes(positions)
+        end = positions + len(ids)
+        return positions[end <= self.starts[lines + 1].astype(np.int64)]
+
+    def line_indexes(self, positions):
+        """Returns the line (starting at 0) of every token position"""
+        return np.searchsorted(
+            self.starts, positions.astype(np.uint64), side="right"
+        ).astype(np.int64) - 1
+
+    def window_mask(self, lines, min_tokens=None, max_tokens=None):
+        """Returns a boolean array with True for the lines (starting at 0)
+        with min_tokens to max_tokens tokens. Only the starts of the given
+        lines are read from the memory map"""
+        lengths = (
+            self.starts[lines + 1].astype(np.int64) -
+            self.starts[lines].astype(np.int64)
+        )
+        mask = np.ones(len(lines), dtype=bool)
+        if min_tokens is not None:
+            mask &= lengths >= min_tokens
+        if max_tokens is not None:
+            mask &= lengths <= max_tokens
+        return mask
+
+    def search(self, phrases, min_tokens=None, max_tokens=None):
+        """Returns a dictionary with phrase as key and the sorted unique line
+        numbers (starting at 1) where it occurs in a line of min_tokens to
+        max_tokens tokens. All single token phrases are found in one pass"""
+        results = {}
+        single = {}
+        for phrase in phrases:
+            ids = self.encode(phrase)
+            if ids is None:
+                results[phrase] = np.array([], dtype=np.int64)
+            elif len(ids) == 1:
+                single[ids[0]] = phrase
+            else:
+                lines = np.unique(self.line_indexes(self.find(phrase)))
+                results[phrase] = lines[
+                    self.window_mask(lines, min_tokens, max_tokens)
+                ] + 1
+        if len(single) > 0:
+            positions = np.flatnonzero(np.isin(self.ids, list(single)))
+            lines = self.line_indexes(positions)
+            keep = self.window_mask(lines, min_tokens, max_tokens)
+            positions, lines = positions[keep], lines[keep]
+            found = self.ids[positions]
+            for token_id, phrase in single.items():
+                results[phrase] = np.unique(lines[found == token_id]) + 1
+        return results
+
+    def read_lines(self, line_numbers):
+        """Returns a dictionary with line number as key and the line rebuilt
+        from its tokens as value"""
+        lines = {}
+        for number in line_numbers:
+            start = int(self.starts[number - 1])
+            end = int(self.starts[number])
+            lines[int(number)] = " ".join(
+                self.tokens[token_id] for token_id in self.ids[start:end]
+            ) + "\n"
+        return lines
+
+
+def exists(txt_filename):
+    return os.path.isfile(index_filenames(txt_filename)["vocab"])
+
+
+# Loaded indexes by corpus filename
+indexes = {}
+
+
+def load(txt_filename):
+    """Returns the TokenCorpus of the corpus or None if it is not built or
+    older than the corpus"""
+    if txt_filename not in indexes:
+        if not exists(txt_filename):
+            return None
+        indexes[txt_filename] = TokenCorpus(txt_filename)
+    if indexes[txt_filename].source != source_of(txt_filename):
+        logger.warning("The token index of %s is older than the corpus",
+                       txt_filename)
+        del indexes[txt_filename]
+        return None
+    return indexes[txt_filename]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a pre-tokenized binary copy of a Europarl corpus"
+    )
+    parser.add_argument("language_code", help="E.g. sv")
+    parser.add_argument("-l", "--log", help="Loglevel")
+    args = parser.parse_args()
+    if args.log:
+        loglevel.set_level(args.log)
+    build(context.for_language(args.language_code).data_filename)
+
+
+if __name__ == "__main__":
+    main()
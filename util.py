@@ -7,14 +7,22 @@ import random
 import sys
 import time
 # import asyncio
-import httpx
-from wikibaseintegrator import wbi_core, wbi_login
 
+import checkpoint
 import config
-import download_data
-import europarl
+from context import LanguageContext
+import coordination
+import edit_batch
+import entity_cache
+import http_client
+import json_stream
+import lexeme_dump
 import loglevel
-import riksdagen
+import planner
+import ranker
+from records import (EUROPARL, FORMAL, INFORMAL, KSAMSOK, ORAL, RIKSDAGEN,
+                     RIKSDAGEN_DOCUMENT_URL, WRITTEN, Form, Sense)
+import statements
 
 # Terminology used
 # record = sentence + data
@@ -32,31 +40,26 @@ except AssertionError:
     exit(0)
 
 # Logging
-logger = logging.getLogger(__name__)
-if config.loglevel is None:
-    # Set loglevel
-    print("Setting loglevel in config")
-    loglevel.set_loglevel()
-logger.setLevel(config.loglevel)
-logger.level = logger.getEffectiveLevel()
-file_handler = logging.FileHandler("util.log")
-logger.addHandler(file_handler)
+logger = loglevel.get_logger(__name__)
 
 # Constants
 wd_prefix = "http://www.wikidata.org/entity/"
 
+
 #
 # Program flow
 #
-# Entry through process_lexeme_data()
+# Entry through process_lexeme_data() with the LanguageContext of the language
+# to work on. It is passed on to every function below.
+# Group the forms by lexeme
 # Call in while loop
-#   if not excluded:
-#     process_result()
-#       Call get_sentences_from_apis()
-#         Call europarl..get_records(data)
-#         Call riksdagen.get_records(data)
-#         Collect records in one big dictionary
-#       for loop
+#   process_lexeme() with the forms that are not excluded
+#     Call get_sentences_from_apis()
+#       Call sources.get_records(forms)
+#         Run get_records(forms) of all enabled sources concurrently
+#         Collect records in one dictionary per form as they arrive
+#     for each form
+#       process_result()
 #         present_sentence()
 #           Sort showing shortest first
 #           call prompt_sense_approval()
@@ -97,17 +100,43 @@ def yes_no_question(message: str):
                 return answer[0].lower() == 'y'
 
 
-def sparql_query(query):
+def trim_binding(binding):
+    """Only the values of a SPARQL result row are used"""
+    return {name: dict(value=value["value"]) for name, value in
+            binding.items()}
+
+
+def iterate_sparql(query):
+    """Yields the result rows one at a time while the response is still
+    being downloaded"""
     # from https://stackoverflow.com/questions/55961615/
     # how-to-integrate-wikidata-query-in-python
     url = 'https://query.wikidata.org/sparql'
-    r = httpx.get(url, params={'format': 'json', 'query': query})
-    data = r.json()
-    # pprint(data)
-    results = data["results"]["bindings"]
-    # pprint(results)
+    params = {'format': 'json', 'query': query}
+    if len(query) > config.sparql_post_threshold:
+        # Long queries do not fit in the URL
+        method, arguments = "POST", dict(data=params)
+    else:
+        method, arguments = "GET", dict(params=params)
+    for attempt in range(config.http_retries + 1):
+        with http_client.stream(method, url, **arguments) as r:
+            delay = http_client.retry_after(r)
+            if delay is not None and attempt < config.http_retries:
+                logger.info("WDQS is busy. Retrying in %s seconds", delay)
+                time.sleep(delay)
+                continue
+            r.raise_for_status()
+            yield from json_stream.iterate_items(
+                r.iter_bytes(), ("results", "bindings"), trim=trim_binding
+            )
+            return
+
+
+def sparql_query(context, query):
+    """Returns a list of result rows"""
+    results = list(iterate_sparql(query))
     if len(results) == 0:
-        print(f"No {config.language} lexemes containing " +
+        print(f"No {context.language} lexemes containing " +
               "both a sense, forms with " +
               "grammatical features and missing a usage example was found")
         exit(0)
@@ -115,29 +144,34 @@ def sparql_query(query):
         return results
 
 
-def count_number_of_senses_with_P5137(lid):
+def count_number_of_senses_with_P5137(context, lid):
     """Returns an int"""
-    result = (sparql_query(f'''
+    if config.query_backend == "dump":
+        return lexeme_dump.count_number_of_senses_with_P5137(context, lid)
+    result = (sparql_query(context, f'''
     SELECT
-    (COUNT(?sense) as ?count)
+    (COUNT(DISTINCT ?sense) as ?count)
     WHERE {{
       VALUES ?l {{wd:{lid}}}.
       ?l ontolex:sense ?sense.
       ?sense skos:definition ?gloss.
+      # Only count the senses that fetch_senses() returns
+      FILTER(LANG(?gloss) = "{context.language_code}")
       # Exclude lexemes without a linked QID from at least one sense
       ?sense wdt:P5137 [].
     }}'''))
     count = int(result[0]["count"]["value"])
-    logging.debug(f"count:{count}")
+    logger.debug("count:%d", count)
     return count
 
 
-def fetch_senses(lid):
-    """Returns dictionary with numbers as keys and a dictionary as value with
-    sense id and gloss"""
+def fetch_senses(context, lid):
+    """Returns dictionary with numbers as keys and a Sense as value"""
+    if config.query_backend == "dump":
+        return lexeme_dump.fetch_senses(context, lid)
     # Thanks to Lucas Werkmeister https://www.wikidata.org/wiki/Q57387675 for
     # helping with this query.
-    result = (sparql_query(f'''
+    result = (sparql_query(context, f'''
     SELECT
     ?sense ?gloss
     WHERE {{
@@ -145,28 +179,49 @@ def fetch_senses(lid):
       ?l ontolex:sense ?sense.
       ?sense skos:definition ?gloss.
       # Get only the swedish gloss, exclude otherwise
-      FILTER(LANG(?gloss) = "{config.language_code}")
+      FILTER(LANG(?gloss) = "{context.language_code}")
       # Exclude lexemes without a linked QID from at least one sense
       ?sense wdt:P5137 [].
     }}'''))
     senses = {}
     number = 1
     for row in result:
-        senses[number] = {
-            "sense_id": row["sense"]["value"].replace(wd_prefix, ""),
-            "gloss": row["gloss"]["value"]
-        }
+        senses[number] = Sense(
+            sense_id=row["sense"]["value"].replace(wd_prefix, ""),
+            gloss=row["gloss"]["value"]
+        )
         number += 1
-    logging.debug(f"senses:{senses}")
+    logger.debug("senses:%s", senses)
     return senses
 
 
-def fetch_lexeme_forms():
-    return sparql_query(f'''
+def fetch_lexeme_forms(context):
+    """Returns a list of Form"""
+    if context.daemon is not None:
+        forms = context.daemon.fetch_lexeme_forms(context)
+        if len(forms) == 0:
+            print(f"No {context.language} lexemes containing " +
+                  "both a sense, forms with " +
+                  "grammatical features and missing a usage example was " +
+                  "found by the daemon")
+            exit(0)
+        return forms
+    if config.query_backend == "dump":
+        forms = lexeme_dump.fetch_lexeme_forms(context)
+        if len(forms) == 0:
+            print(f"No {context.language} lexemes containing " +
+                  "both a sense, forms with " +
+                  "grammatical features and missing a usage example was " +
+                  "found in the local lexeme dump")
+            exit(0)
+        return forms
+    # Convert every row as it is parsed so we don't keep the nested JSON
+    # bindings around
+    forms = [extract_data(result) for result in iterate_sparql(f'''
     SELECT DISTINCT
     ?l ?form ?word ?catLabel
     WHERE {{
-      ?l a ontolex:LexicalEntry; dct:language wd:{config.language_qid}.
+      ?l a ontolex:LexicalEntry; dct:language wd:{context.language_qid}.
       VALUES ?excluded {{
         # exclude affixes and interfix
         wd:Q62155 # affix
@@ -195,50 +250,68 @@ def fetch_lexeme_forms():
     }}
     limit {config.sparql_results_size}
     offset {config.sparql_offset}
-    ''')
+    ''')]
+    if len(forms) == 0:
+        print(f"No {context.language} lexemes containing " +
+              "both a sense, forms with " +
+              "grammatical features and missing a usage example was found")
+        exit(0)
+    return forms
+
+
+def get_senses(context, lid):
+    """Returns the senses of the lexeme and only asks WDQS the first time"""
+    if lid not in context.senses_cache:
+        if context.daemon is not None:
+            context.senses_cache[lid] = context.daemon.get_senses(context, lid)
+        elif config.entity_cache:
+            # No SPARQL round trip needed
+            context.senses_cache[lid] = entity_cache.get_senses(context, lid)
+        else:
+            context.senses_cache[lid] = fetch_senses(context, lid)
+    return context.senses_cache[lid]
 
 
 def extract_data(result):
-    lid = result["l"]["value"].replace(
+    """Returns a Form from a SPARQL result row"""
+    # Intern the strings that are repeated over many rows
+    lid = sys.intern(result["l"]["value"].replace(
         wd_prefix, ""
-    )
+    ))
     form_id = result["form"]["value"].replace(
         wd_prefix, ""
     )
     word = result["word"]["value"]
-    word_spaces = " " + word + " "
-    word_angle_parens = ">" + word + "<"
-    category = result["catLabel"]["value"]
-    return dict(
+    category = sys.intern(result["catLabel"]["value"])
+    return Form(
         lid=lid,
         form_id=form_id,
         word=word,
-        word_spaces=word_spaces,
-        word_angle_parens=word_angle_parens,
         category=category
     )
 
 
 async def async_fetch_from_url(url):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        return response
+    return await http_client.async_get(url)
 
 
-def add_usage_example(
+def build_usage_example_claim(
+        context=None,
         document_id=None,
         sentence=None,
-        lid=None,
         form_id=None,
         sense_id=None,
-        word=None,
         publication_date=None,
         language_style=None,
         type_of_reference=None,
         source=None,
         line=None,
 ):
-    # Use WikibaseIntegrator aka wbi to upload the changes in one edit
+    """Returns the usage example statement as a WBI MonolingualText or None
+    if it cannot be made"""
+    # Imported here because WikibaseIntegrator loads pandas which makes the
+    # start slow
+    from wikibaseintegrator import wbi_core
     link_to_form = wbi_core.Form(
         prop_nr="P5830",
         value=form_id,
@@ -249,47 +322,45 @@ def add_usage_example(
         value=sense_id,
         is_qualifier=True
     )
-    if language_style == "formal":
+    if language_style == FORMAL:
         style = "Q104597585"
     else:
-        if language_style == "informal":
+        if language_style == INFORMAL:
             style = "Q901711"
         else:
             print(f"Error. Language style {language_style} " +
                   "not one of (formal,informal)")
             exit(1)
-    logging.debug("Generating qualifier language_style " +
-                  f"with {style}")
+    logger.debug("Generating qualifier language_style with %s", style)
     language_style_qualifier = wbi_core.ItemID(
         prop_nr="P6191",
         value=style,
         is_qualifier=True
     )
     # oral or written
-    if type_of_reference == "written":
+    if type_of_reference == WRITTEN:
         medium = "Q47461344"
     else:
-        if type_of_reference == "oral":
+        if type_of_reference == ORAL:
             medium = "Q52946"
         else:
             print(f"Error. Type of reference {type_of_reference} " +
                   "not one of (written,oral)")
             exit(1)
-    logging.debug("Generating qualifier type of reference " +
-                  f"with {medium}")
+    logger.debug("Generating qualifier type of reference with %s", medium)
     type_of_reference_qualifier = wbi_core.ItemID(
         prop_nr="P3865",
         value=medium,
         is_qualifier=True
     )
-    if source == "riksdagen":
+    if source == RIKSDAGEN:
         if publication_date is not None:
             publication_date = datetime.fromisoformat(publication_date)
         else:
             print("Publication date of document {document_id} " +
                   "is missing. We have no fallback for that at the moment. " +
                   "Abort adding usage example.")
-            return False
+            return None
         stated_in = wbi_core.ItemID(
             prop_nr="P248",
             value="Q21592569",
@@ -321,7 +392,7 @@ def add_usage_example(
             ),
             type_of_reference_qualifier,
         ]
-    if source == "europarl":
+    if source == EUROPARL:
         stated_in = wbi_core.ItemID(
             prop_nr="P248",
             value="Q5412081",
@@ -347,13 +418,14 @@ def add_usage_example(
             ),
             wbi_core.Url(
                 prop_nr="P854",  # reference url
-                value="http://www.statmt.org/europarl/v7/sv-en.tgz",
+                value=("http://www.statmt.org/europarl/v7/" +
+                       f"{context.language_code}-en.tgz"),
                 is_reference=True,
             ),
             # filename in archive
             wbi_core.String(
-                (f"europarl-v7.{config.language_code}" +
-                 f"-en.{config.language_code}"),
+                (f"europarl-v7.{context.language_code}" +
+                 f"-en.{context.language_code}"),
                 "P7793",
                 is_reference=True,
             ),
@@ -365,11 +437,33 @@ def add_usage_example(
             ),
             type_of_reference_qualifier,
         ]
+    if source == KSAMSOK:
+        # The record URI is the reference. K-samsök records have no
+        # publication date.
+        reference = [
+            wbi_core.Url(
+                prop_nr="P854",  # reference url
+                value=document_id,
+                is_reference=True,
+            ),
+            wbi_core.Time(
+                prop_nr="P813",  # Fetched today
+                time=datetime.utcnow().replace(
+                    tzinfo=timezone.utc
+                ).replace(
+                    hour=0,
+                    minute=0,
+                    second=0,
+                ).strftime("+%Y-%m-%dT%H:%M:%SZ"),
+                is_reference=True,
+            ),
+            type_of_reference_qualifier,
+        ]
     # This is the usage example statement
     claim = wbi_core.MonolingualText(
         sentence,
         "P5831",
-        language=config.language_code,
+        language=context.language_code,
         # Add qualifiers
         qualifiers=[
             link_to_form,
@@ -380,35 +474,132 @@ def add_usage_example(
         references=[reference],
     )
     if config.debug_json:
-        logging.debug(f"claim:{claim.get_json_representation()}")
-    item = wbi_core.ItemEngine(
-        data=[claim], append_value=["P5831"], item_id=lid,
+        logger.debug("claim:%s", claim.get_json_representation())
+    return claim
+
+
+def add_usage_example(
+        context=None,
+        document_id=None,
+        sentence=None,
+        lid=None,
+        form_id=None,
+        sense_id=None,
+        word=None,
+        publication_date=None,
+        language_style=None,
+        type_of_reference=None,
+        source=None,
+        line=None,
+):
+    """Returns the lid if the usage example was added and False otherwise"""
+    claim = build_usage_example_claim(
+        context=context,
+        document_id=document_id,
+        sentence=sentence,
+        form_id=form_id,
+        sense_id=sense_id,
+        publication_date=publication_date,
+        language_style=language_style,
+        type_of_reference=type_of_reference,
+        source=source,
+        line=line,
     )
-    # if config.debug_json:
-    #     print(item.get_json_representation())
-    if config.login_instance is None:
+    if claim is None:
+        return False
+    return write_usage_examples(context, lid, [claim])
+
+
+def write_usage_examples(context, lid, claims):
+    """Adds the claims to the lexeme in one edit. Returns the lid if they
+    were added and False otherwise"""
+    # Imported here because WikibaseIntegrator loads pandas which makes the
+    # start slow
+    from wikibaseintegrator import wbi_core, wbi_login
+    if context.login_instance is None:
         # Authenticate with WikibaseIntegrator
         print("Logging in with Wikibase Integrator")
-        config.login_instance = wbi_login.Login(
+        context.login_instance = wbi_login.Login(
             user=config.username, pwd=config.password
         )
+    if config.claim_upload == "direct":
+        # Only the new statements are sent
+        baserevid = None
+        if config.entity_cache:
+            entity = entity_cache.get_entity(context, lid)
+            if entity is not None:
+                baserevid = entity["lastrevid"]
+        return statements.add_claims(
+            context, lid, claims, baserevid=baserevid
+        )
+    # Use WikibaseIntegrator aka wbi to load the lexeme and upload the
+    # changes in one edit
+    item = wbi_core.ItemEngine(
+        data=claims, append_value=["P5831"], item_id=lid,
+    )
+    # if config.debug_json:
+    #     print(item.get_json_representation())
     result = item.write(
-        config.login_instance,
-        edit_summary="Added usage example with [[Wikidata:LexUse]]"
+        context.login_instance,
+        edit_summary=statements.get_edit_summary(claims)
     )
     if config.debug_json:
-        logging.debug(f"result from WBI:{result}")
+        logger.debug("result from WBI:%s", result)
+    return result
+
+
+def flush_edits(context, lid):
+    """Uploads the queued usage examples of the lexeme. Returns the lid if
+    they were added, False if that failed and None if none were queued. The
+    examples stay queued if the upload failed"""
+    claims = edit_batch.claims(context, lid)
+    if len(claims) == 0:
+        return None
+    try:
+        result = write_usage_examples(context, lid, claims)
+    except Exception as error:
+        logger.exception(error)
+        result = False
+    if result:
+        print(f"Successfully added {len(claims)} usage example(s) " +
+              f"to {wd_prefix + lid}")
+        for data in edit_batch.remove(context, lid, claims):
+            # Only now the forms are done. An example that is never uploaded
+            # is presented again in a later session.
+            save_to_exclude_list(context, data)
+            if config.checkpoint:
+                checkpoint.finish_form(context, lid, data.form_id)
+            if coordination.enabled():
+                # So the other reviewers skip them too
+                coordination.record_form(context, data.form_id)
+        if config.checkpoint:
+            checkpoint.save_pending_edits(context, lid)
+        entity_cache.invalidate(context, lid)
+        if context.daemon is not None:
+            context.daemon.invalidate(context, lid)
+        add_to_watchlist(context, lid)
+    else:
+        edit_batch.postpone(context, lid)
+        print(f"Error. These usage examples were not added to {lid} and " +
+              "will be tried again later:")
+        for claim in claims:
+            print(f"'{claim.get_value()[0]}'")
     return result
 
 
+def flush_expired_edits(context):
+    """Uploads the batches that have waited edit_batch_timeout seconds"""
+    for lid in edit_batch.expired(context):
+        flush_edits(context, lid)
+
+
 def count_words(string):
     # from https://www.pythonpool.com/python-count-words-in-string/
     return(len(string.strip().split(" ")))
 
 
 def prompt_choose_sense(senses):
-    """Returns a dictionary with sense_id -> sense_id
-    and gloss -> gloss or False"""
+    """Returns the chosen Sense or False"""
     # from https://stackoverflow.com/questions/23294658/
     # asking-the-user-for-input-until-they-give-a-valid-response
     while True:
@@ -418,9 +609,9 @@ def prompt_choose_sense(senses):
             number = 1
             # Put each key -> value into a new nested dictionary
             for sense in senses:
-                options += f"\n{number}) {senses[number]['gloss']}"
+                options += f"\n{number}) {senses[number].gloss}"
                 if config.show_sense_urls:
-                    options += f" ({wd_prefix + senses[number]['sense_id']} )"
+                    options += f" ({wd_prefix + senses[number].sense_id} )"
                 number += 1
             options += "\nPlease input a number or 0 to cancel: "
             choice = int(input(options))
@@ -429,22 +620,19 @@ def prompt_choose_sense(senses):
             # better try again... Return to the start of the loop
             continue
         else:
-            logging.debug(f"length_of_senses:{len(senses)}")
+            logger.debug("length_of_senses:%d", len(senses))
             if choice > 0 and choice <= len(senses):
-                return {
-                    "sense_id": senses[choice]["sense_id"],
-                    "gloss": senses[choice]["gloss"]
-                }
+                return senses[choice]
             else:
                 print("Cancelled adding this sentence.")
                 return False
 
 
-def add_to_watchlist(lid):
+def add_to_watchlist(context, lid):
     # Get session from WBI, it cannot be None because this comes after adding
     # an
     # usage example with WBI.
-    session = config.login_instance.get_session()
+    session = context.login_instance.get_session()
     # adapted from https://www.mediawiki.org/wiki/API:Watch
     url = "https://www.wikidata.org/w/api.php"
     params_token = {
@@ -454,7 +642,14 @@ def add_to_watchlist(lid):
         "format": "json"
     }
 
-    result = session.get(url=url, params=params_token)
+    # The login cookies of the WBI session are sent along via the pooled
+    # client
+    cookies = "; ".join(
+        f"{name}={value}" for name, value in session.cookies.items()
+    )
+    result = http_client.get(
+        url, params=params_token, headers={"Cookie": cookies}
+    )
     data = result.json()
 
     csrf_token = data["query"]["tokens"]["watchtoken"]
@@ -467,30 +662,30 @@ def add_to_watchlist(lid):
         "token": csrf_token,
     }
 
-    result = session.post(
-        url, data=params_watch
+    result = http_client.post(
+        url, data=params_watch, headers={"Cookie": cookies}
     )
     if config.debug_json:
         print(result.text)
     print(f"Added {lid} to your watchlist")
 
 
-def prompt_sense_approval(sentence=None, data=None):
+def prompt_sense_approval(context=None, sentence=None, data=None):
     """Prompts for validating that we have a sense matching the use example
-    return dictionary with sense_id and sense_gloss if approved else False"""
+    return the Sense if approved else False"""
     # TODO split this up in multiple functions
     # ->prepare_sense_selection()
     # + prompt_single_sense()
     # + prompt_multiple_senses()
-    lid = data["lid"]
+    lid = data.lid
     # This returns a tuple if one sense or a dictionary if multiple senses
-    senses = fetch_senses(lid)
+    senses = get_senses(context, lid)
     number_of_senses = len(senses)
-    logging.debug(f"number_of_senses:{number_of_senses}")
+    logger.debug("number_of_senses:%d", number_of_senses)
     if number_of_senses > 0:
         if number_of_senses == 1:
-            gloss = senses[1]["gloss"]
-            sense_id = senses[1]["sense_id"]
+            gloss = senses[1].gloss
+            sense_id = senses[1].sense_id
             if config.show_sense_urls:
                 question = ("Found only one sense. " +
                             "Does this example fit the following " +
@@ -500,12 +695,9 @@ def prompt_sense_approval(sentence=None, data=None):
                             "Does this example fit the following " +
                             f"gloss?\n'{gloss}'")
             if yes_no_question(question):
-                return {
-                    "sense_id": senses[1]["sense_id"],
-                    "sense_gloss": gloss
-                }
+                return senses[1]
             else:
-                word = data['word']
+                word = data.word
                 print("Cancelled adding sentence as it does not match the " +
                       "only sense currently present. \nLexemes are " +
                       "entirely dependent on good quality QIDs. \n" +
@@ -529,16 +721,13 @@ def prompt_sense_approval(sentence=None, data=None):
             # the example
             sense = prompt_choose_sense(senses)
             if sense:
-                logging.debug("sense was accepted")
-                return {
-                    "sense_id": sense["sense_id"],
-                    "sense_gloss": sense["gloss"]
-                }
+                logger.debug("sense was accepted")
+                return sense
             else:
                 return False
     else:
         # Check if any suitable senses exist
-        count = (count_number_of_senses_with_P5137("L35455"))
+        count = (count_number_of_senses_with_P5137(context, "L35455"))
         if count > 0:
             print("{language.title()} gloss is missing for {count} sense(s)" +
                   ". Please fix it manually here: " +
@@ -546,39 +735,33 @@ def prompt_sense_approval(sentence=None, data=None):
             time.sleep(5)
             return False
         else:
-            logging.debug("no senses this should never be reached " +
-                          "if the sparql result was sane")
+            logger.debug("no senses this should never be reached " +
+                         "if the sparql result was sane")
             return False
 
 
-def get_sentences_from_apis(result):
-    """Returns a dict with sentences as key and id as value"""
-    data = extract_data(result)
-    form_id = data["form_id"]
-    word = data["word"]
-    print(f"Trying to find examples for the {data['category']} lexeme " +
-          f"form: {word} with id: {form_id}")
-    if config.language_code == "sv":
-        records = {}
-        # Europarl corpus
-        # Download first
-        download_data.fetch()
-        europarl_records = europarl.get_records(data)
-        for record in europarl_records:
-            records[record] = europarl_records[record]
-        # Riksdagen API is slow, only use it if we must
-        if len(europarl_records) < 50:
-            riksdagen_records = riksdagen.get_records(data)
-            for record in riksdagen_records:
-                records[record] = riksdagen_records[record]
-        logger.debug(f"returning from apis:{records}")
-        return records
-        # TODO K-samsök
-        # TODO Europarl corpus
+def get_sentences_from_apis(context, forms):
+    """Returns a dict with form_id as key and a dict with sentences as key and
+    result data as value. All forms of the lexeme are searched at once in all
+    enabled sources concurrently"""
+    for data in forms:
+        print(f"Trying to find examples for the {data.category} lexeme " +
+              f"form: {data.word} with id: {data.form_id}")
+    if context.daemon is not None:
+        records = context.daemon.get_records(context, forms)
+    else:
+        # Imported here so a client of the daemon does not load the sources,
+        # the corpora indexes and numpy
+        import sources
+        records = sources.get_records(context, forms)
+    if config.debug_json:
+        logger.debug("returning from apis:%s", records)
+    return records
 
 
 def present_sentence(
-        data: dict = None,
+        context: LanguageContext = None,
+        data: Form = None,
         sentence: str = None,
         document_id: str = None,
         date: str = None,
@@ -588,134 +771,195 @@ def present_sentence(
         line: str = None
 ):
     """Return True, False or None (skip)"""
+    if context.daemon is not None:
+        present = context.daemon.has_usage_example(
+            context, data.lid, sentence
+        )
+    else:
+        present = (
+            config.entity_cache and
+            entity_cache.has_usage_example(context, data.lid, sentence)
+        )
+    if present:
+        print(f"Skipping sentence already present on {data.lid}: " +
+              f"'{sentence}'")
+        return False
+    # Do not keep approved examples waiting while the reviewer thinks
+    flush_expired_edits(context)
     word_count = count_words(sentence)
     result = yes_no_skip_question(
             f"Found the following sentence with {word_count} " +
             "words. Is it suitable as a usage example " +
-            f"for the {data['category']} form '{data['word']}'? \n" +
+            f"for the {data.category} form '{data.word}'? \n" +
             f"'{sentence}'"
     )
     if result:
-        selected_sense = prompt_sense_approval(
+        outcome = add_approved_sentence(
+            context=context,
+            data=data,
             sentence=sentence,
-            data=data
+            document_id=document_id,
+            date=date,
+            language_style=language_style,
+            type_of_reference=type_of_reference,
+            source=source,
+            line=line,
         )
-        if selected_sense is not False:
-            lid = data["lid"]
-            sense_id = selected_sense["sense_id"]
-            sense_gloss = selected_sense["sense_gloss"]
-            if (sense_id is not None and sense_gloss is not None):
-                result = False
-                result = add_usage_example(
-                    document_id=document_id,
-                    sentence=sentence,
-                    lid=lid,
-                    form_id=data["form_id"],
-                    sense_id=sense_id,
-                    word=data["word"],
-                    publication_date=date,
-                    language_style=language_style,
-                    type_of_reference=type_of_reference,
-                    source=source,
-                    line=line,
-                )
-                if result:
-                    print("Successfully added usage example " +
-                          f"to {wd_prefix + lid}")
-                    add_to_watchlist(lid)
-                    save_to_exclude_list(data)
-                    return True
-                else:
-                    return False
-            else:
-                return False
-    elif result is None:
+    else:
         # None means skip
+        outcome = result
+    if config.ranker:
+        # Learn from the final outcome, so a yes that did not end with a
+        # queued example, e.g. because no sense was chosen, counts as a no
+        ranker.record_decision(
+            context, data, sentence, source,
+            outcome is True if result else result
+        )
+    return outcome
+
+
+def add_approved_sentence(
+        context: LanguageContext = None,
+        data: Form = None,
+        sentence: str = None,
+        document_id: str = None,
+        date: str = None,
+        language_style: str = None,
+        type_of_reference: str = None,
+        source: str = None,
+        line: str = None
+):
+    """Asks for the sense and queues the usage example. Returns True if it
+    was queued, None if the reviewer cancelled and False otherwise"""
+    selected_sense = prompt_sense_approval(
+        context=context,
+        sentence=sentence,
+        data=data
+    )
+    if selected_sense is False:
         return None
-    else:
+    lid = data.lid
+    sense_id = selected_sense.sense_id
+    sense_gloss = selected_sense.gloss
+    if sense_id is None or sense_gloss is None:
+        return False
+    claim = build_usage_example_claim(
+        context=context,
+        document_id=document_id,
+        sentence=sentence,
+        form_id=data.form_id,
+        sense_id=sense_id,
+        publication_date=date,
+        language_style=language_style,
+        type_of_reference=type_of_reference,
+        source=source,
+        line=line,
+    )
+    if claim is None:
         return False
+    # The examples of a lexeme are uploaded together when the batch is full,
+    # has waited too long or the lexeme is done
+    if edit_batch.add(context, lid, claim, data):
+        # A failed upload stays queued and is tried again
+        flush_edits(context, lid)
+    else:
+        print("Queued the usage example. It will be added " +
+              "together with the others for this lexeme.")
+    if config.checkpoint:
+        # Queued again if the session is killed before the upload
+        checkpoint.save_pending_edits(context, lid)
+    return True
 
 
-def save_to_exclude_list(data: dict):
+def save_to_exclude_list(context: LanguageContext, data: Form):
     # date, lid and lang
     if data is None:
         print("Error. Data was None")
         exit(1)
-    form_id = data["form_id"]
-    word = data["word"]
-    print(f"Adding {word} to local exclude list '{config.exclude_list}'")
+    form_id = data.form_id
+    word = data.word
+    print(f"Adding {word} to local exclude list '{context.exclude_list}'")
     if config.debug_exclude_list:
-        logging.debug(f"data to exclude:{data}")
+        logger.debug("data to exclude:%s", data)
     form_data = dict(
         word=word,
         date=datetime.now().isoformat(),
-        lang=config.language_code,
+        lang=context.language_code,
     )
     if config.debug_exclude_list:
-        logging.debug(f"adding:{form_id}:{form_data}")
-    if os.path.isfile('exclude_list.json'):
+        logger.debug("adding:%s:%s", form_id, form_data)
+    if os.path.isfile(context.exclude_list):
         # Read the file
-        with open(config.exclude_list, 'r', encoding='utf-8') as myfile:
+        with open(context.exclude_list, 'r', encoding='utf-8') as myfile:
             json_data = myfile.read()
         if len(json_data) > 0:
-            with open(config.exclude_list, 'w', encoding='utf-8') as myfile:
+            with open(context.exclude_list, 'w', encoding='utf-8') as myfile:
                 # parse file
                 exclude_list = json.loads(json_data)
                 exclude_list[form_id] = form_data
                 if config.debug_exclude_list:
-                    logging.debug(f"dumping altered list:{exclude_list}")
+                    logger.debug("dumping altered list:%s", exclude_list)
                 json.dump(exclude_list, myfile, ensure_ascii=False)
         else:
             print("Error. json data is null.")
             exit(1)
     else:
         # Create the file
-        with open(config.exclude_list, "w", encoding='utf-8') as outfile:
+        with open(context.exclude_list, "w", encoding='utf-8') as outfile:
             # Create new file with dict and item
             exclude_list = {}
             exclude_list[form_id] = form_data
             if config.debug_exclude_list:
-                logging.debug(f"dumping:{exclude_list}")
+                logger.debug("dumping:%s", exclude_list)
             json.dump(exclude_list, outfile, ensure_ascii=False)
 
 
-def process_result(result, data):
+def process_result(context, data, sentences_and_result_data):
+    """Presents the sentences until one is approved or the form is skipped.
+    Returns True if a usage example was queued for the form"""
     # ask to continue
-    # if yes_no_question(f"\nWork on {data['word']}?"):
-    # This dict holds the sentence as key and
+    # if yes_no_question(f"\nWork on {data.word}?"):
+    # sentences_and_result_data holds the sentence as key and
     # riksdagen_document_id or other id as value
-    sentences_and_result_data = get_sentences_from_apis(result)
     if sentences_and_result_data is not None:
-        # Sort so that the shortest sentence is first
-        sorted_sentences = sorted(
-            sentences_and_result_data, key=len,
-        )
+        if config.ranker:
+            # Most likely to be accepted first
+            sorted_sentences = ranker.order(data, sentences_and_result_data)
+        else:
+            # Sort so that the shortest sentence is first
+            sorted_sentences = sorted(
+                sentences_and_result_data, key=len,
+            )
         count = 1
         # Loop through sentence list (that has no result data)
         for sentence in sorted_sentences:
             # We lookup the sentence in the original dict to get the
             # result_data
             result_data = sentences_and_result_data[sentence]
-            document_id = result_data["document_id"]
-            date = result_data["date"]
-            style = result_data["language_style"]
-            medium = result_data["type_of_reference"]
-            source = result_data["source"]
-            line = result_data["line"]
-            if source == "riksdagen":
+            document_id = result_data.document_id
+            date = result_data.date
+            style = result_data.language_style
+            medium = result_data.type_of_reference
+            source = result_data.source
+            line = result_data.line
+            if source == RIKSDAGEN:
                 print("Presenting sentence " +
                       f"{count}/{len(sorted_sentences)} from {date} from " +
-                      f"{riksdagen.baseurl + document_id}")
-            elif source == "europarl":
+                      f"{RIKSDAGEN_DOCUMENT_URL + document_id}")
+            elif source == EUROPARL:
                 print("Presenting sentence " +
                       f"{count}/{len(sorted_sentences)} " +
                       "from europarl")
+            elif source == KSAMSOK:
+                print("Presenting sentence " +
+                      f"{count}/{len(sorted_sentences)} from K-samsök " +
+                      f"record {document_id}")
             else:
                 print("Presenting sentence " +
                       f"{count}/{len(sorted_sentences)} from {date}")
-            logging.info(f"with style: {style} " +
-                         f"and medium: {medium}")
+            logger.info("with style: %s and medium: %s", style, medium)
             result = present_sentence(
+                context=context,
                 data=data,
                 # Trim sentence
                 sentence=sentence.strip(),
@@ -726,45 +970,52 @@ def process_result(result, data):
                 source=source,
                 line=line,
             )
+            planner.record_review(source, result is True)
+            if result is None and coordination.enabled():
+                # Skipped, so the other reviewers skip it too. Approved
+                # forms are recorded when their example is uploaded.
+                coordination.record_form(context, data.form_id)
             count += 1
             # Break out of the for loop by returning early because one
             # example was already choosen for this result or if the form
             # was skipped. False means that we could not find a sentence, it
             # could be related to low number of records being fetched so we
             # don't excude it.
+            if result is True:
+                # Excluded by flush_edits() once the example is uploaded
+                return True
             if result is not False:
                 # Add to temporary exclude_list
-                logging.debug("adding to exclude list after presentation")
-                save_to_exclude_list(data)
+                logger.debug("adding to exclude list after presentation")
+                save_to_exclude_list(context, data)
                 # break
-                return
+                return False
     # else:
     #     print("Added to excludelist because of no " +
     #           "suitable sentences were found")
     #     save_to_exclude_list(data)
 
 
-def in_exclude_list(data: dict):
+def in_exclude_list(context: LanguageContext, data: Form):
     # Check if in exclude_list
-    if os.path.isfile('exclude_list.json'):
+    if os.path.isfile(context.exclude_list):
         if config.debug_exclude_list:
-            logging.debug("Looking up in exclude list")
+            logger.debug("Looking up in exclude list")
         # Read the file
-        with open('exclude_list.json', 'r', encoding='utf-8') as myfile:
+        with open(context.exclude_list, 'r', encoding='utf-8') as myfile:
             json_data = myfile.read()
             # parse file
             exclude_list = json.loads(json_data)
-            lid = data["lid"]
             for form_id in exclude_list:
                 form_data = exclude_list[form_id]
                 if config.debug_exclude_list:
-                    logging.debug(f"found:{form_data}")
+                    logger.debug("found:%s", form_data)
                 if (
                         # TODO check the date also
-                        lid == form_id
-                        and config.language_code == form_data["lang"]
+                        data.form_id == form_id
+                        and context.language_code == form_data["lang"]
                 ):
-                    logging.debug("Match found")
+                    logger.debug("Match found")
                     return True
         # Not found in exclude_list
         return False
@@ -773,42 +1024,136 @@ def in_exclude_list(data: dict):
         return False
 
 
-def process_lexeme_data(results):
-    """Go through the SPARQL results randomly"""
-    words = []
-    for result in results:
-        data = extract_data(result)
-        words.append(data["word"])
-    print(f"Got {len(words)} suitable forms from Wikidata")
-    logging.debug(f"words:{words}")
+def group_by_lexeme(forms):
+    """Returns a dictionary with lid as key and a list of Form as value"""
+    lexemes = {}
+    for data in forms:
+        if data.lid not in lexemes:
+            lexemes[data.lid] = []
+        lexemes[data.lid].append(data)
+    return lexemes
+
+
+def process_lexeme(context, forms):
+    """Search for all the forms of a lexeme at once and present the
+    candidates grouped by form"""
+    lid = forms[0].lid
+    sentences_by_form = None
+    if config.checkpoint:
+        sentences_by_form = checkpoint.load_lexeme(context, lid)
+        # Resume at the first form that was not finished and has no queued
+        # example
+        finished = (
+            checkpoint.finished_forms(context, lid) |
+            edit_batch.form_ids(context, lid)
+        )
+        forms = [data for data in forms if data.form_id not in finished]
+        if len(forms) == 0:
+            return
+    if sentences_by_form is None and coordination.enabled():
+        sentences_by_form = coordination.load_candidates(context, lid)
+    if sentences_by_form is None:
+        sentences_by_form = get_sentences_from_apis(context, forms)
+        if sentences_by_form is not None:
+            if config.checkpoint or coordination.enabled():
+                # Look up the senses now so they are saved too
+                get_senses(context, lid)
+            if config.checkpoint:
+                checkpoint.save_lexeme(context, lid, sentences_by_form)
+            if coordination.enabled():
+                coordination.save_candidates(context, lid, sentences_by_form)
+    try:
+        if sentences_by_form is not None:
+            for data in forms:
+                logger.debug("processing:%s", data.word)
+                if coordination.enabled():
+                    coordination.renew(context, lid)
+                queued = process_result(
+                    context, data, sentences_by_form.get(data.form_id, {})
+                )
+                if config.checkpoint and not queued:
+                    # Forms with a queued example are finished by
+                    # flush_edits() after the upload
+                    checkpoint.finish_form(context, lid, data.form_id)
+    finally:
+        # Also upload what was approved if the session is interrupted
+        flush_edits(context, lid)
+
+
+def process_lexeme_data(context, forms, lids=None, position=0):
+    """Go through the SPARQL results randomly one lexeme at a time. Give the
+    order of the lexemes and the position to resume a session"""
+    lexemes = group_by_lexeme(forms)
+    print(f"Got {len(forms)} suitable forms of {len(lexemes)} lexemes " +
+          "from Wikidata")
+    if config.debug and logger.isEnabledFor(logging.DEBUG):
+        words = [data.word for lid in lexemes for data in lexemes[lid]]
+        logger.debug("words:%s", words)
     # Go through the results at random
-    print("Going through the list of forms at random.")
-    # from http://stackoverflow.com/questions/306400/ddg#306417
-    earlier_choices = []
-    while (True):
-        if len(earlier_choices) == config.sparql_results_size:
-            # We have gone checked all results now
-            # TODO offer to fetch more
-            print("No more results. Run the script again to continue")
-            exit(0)
-        else:
-            result = random.choice(results)
-            # Prevent running more than once for each result
-            if result not in earlier_choices:
-                earlier_choices.append(result)
-                data = extract_data(result)
-                word = data['word']
-                logging.debug(f"random choice:{word}")
-                if in_exclude_list(data):
-                    # Skip if found in the exclude_list
-                    logging.debug(
-                        f"Skipping result {word} found in exclude_list",
-                    )
-                    continue
-                else:
-                    # not in exclude_list
-                    logging.debug(f"processing:{word}")
-                    process_result(result, data)
+    print("Going through the list of lexemes at random.")
+    if lids is None:
+        lids = list(lexemes)
+        # Shuffle once so every lexeme is visited exactly once
+        random.shuffle(lids)
+        if config.checkpoint:
+            checkpoint.save_session(context, forms, lids)
+    else:
+        print(f"Resuming at lexeme {position + 1} of {len(lids)}")
+        if config.checkpoint:
+            count = checkpoint.restore_pending_edits(context)
+            if count > 0:
+                print(f"Queued {count} approved usage example(s) again " +
+                      "that were not uploaded before the interruption")
+    for number in range(position, len(lids)):
+        lid = lids[number]
+        if config.checkpoint:
+            checkpoint.set_position(context, number)
+        if coordination.enabled() and not coordination.acquire(context, lid):
+            # Another reviewer has it
+            continue
+        if config.entity_cache and lid not in context.entity_cache:
+            # Fetch the entities of the next lexemes in one call. A resumed
+            # lexeme is already in the cache.
+            batch = lids[number:number + entity_cache.batch_size]
+            if context.daemon is not None:
+                context.daemon.prefetch(context, batch)
+            else:
+                entity_cache.prefetch(context, batch)
+        logger.debug("random choice:%s", lid)
+        forms = []
+        for data in lexemes[lid]:
+            if in_exclude_list(context, data):
+                # Skip if found in the exclude_list
+                logger.debug(
+                    "Skipping form %s found in exclude_list",
+                    data.word
+                )
+            elif (coordination.enabled() and
+                  coordination.is_form_done(context, data.form_id)):
+                logger.debug(
+                    "Skipping form %s done by another reviewer", data.word
+                )
+            else:
+                forms.append(data)
+        try:
+            if len(forms) > 0:
+                process_lexeme(context, forms)
+        except BaseException:
+            # Let another reviewer take over right away
+            if coordination.enabled():
+                coordination.release(context, lid)
+            raise
+        if coordination.enabled():
+            coordination.complete(context, lid)
+    # We have gone checked all results now
+    # Try the uploads that failed once more
+    for lid in list(context.pending_edits):
+        flush_edits(context, lid)
+    # TODO offer to fetch more
+    if config.checkpoint:
+        checkpoint.clear(context)
+    print("No more results. Run the script again to continue")
+    exit(0)
 
 
 def introduction():